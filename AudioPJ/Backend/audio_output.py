@@ -0,0 +1,94 @@
+"""
+Audio Output
+Writing of finished songs and progressive fragments under outputs/ (the
+directory FastAPI serves), shared by both pipelines and the API process
+"""
+import logging
+import os
+import shutil
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from generation_cache import get_generation_cache
+from metrics import timed
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_DIR = os.path.join(os.path.dirname(__file__), "outputs")
+FRAGMENT_DIR = os.path.join(OUTPUT_DIR, "fragments")
+
+
+def output_filename(prefix: str, genre: str, mood: str) -> str:
+    """
+    Name of a finished song under OUTPUT_DIR. Unique per job: concurrent jobs
+    with the same genre and mood must never write the same file
+    """
+    safe_genre = "".join(c for c in genre if c.isalnum() or c in (' ', '-', '_'))[:20]
+    safe_mood = "".join(c for c in mood if c.isalnum() or c in (' ', '-', '_'))[:20]
+    return f"{prefix}_{safe_genre}_{safe_mood}_{uuid.uuid4().hex[:12]}.wav".replace(" ", "_")
+
+
+def write_wav(filename: str, sample_rate: int, audio_int16: np.ndarray) -> Optional[str]:
+    """Write 16-bit PCM audio to OUTPUT_DIR. Returns the filename or None on failure"""
+    # Imported on first use: scipy.io takes a noticeable part of the server start-up
+    import scipy.io.wavfile
+
+    try:
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+        path = os.path.join(OUTPUT_DIR, filename)
+        with span("audio.write_wav", filename=filename), timed("yue_wav_write_seconds"):
+            # Written to a new file and renamed over the old one, so an existing
+            # file with this name (and anything sharing its inode) is left intact
+            scipy.io.wavfile.write(path + ".tmp", sample_rate, audio_int16)
+            os.replace(path + ".tmp", path)
+        logger.info(f"Audio saved: {filename}")
+        return filename
+    except Exception as e:
+        logger.error(f"Failed to save audio file: {e}", exc_info=True)
+        return None
+
+
+def encode_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Final pipeline stage: write job["audio_int16"] as job["audio_filename"] and
+    store it in the generation cache under job["cache_key"] (when set)
+    """
+    filename = write_wav(job["audio_filename"], job["sample_rate"], job.pop("audio_int16"))
+    if filename and job.get("cache_key"):
+        get_generation_cache().store_audio(job["cache_key"], os.path.join(OUTPUT_DIR, filename))
+    job["result"] = filename
+    return job
+
+
+def sweep_outputs(max_age: float) -> int:
+    """Delete finished songs older than max_age seconds. Returns how many were removed"""
+    if not os.path.isdir(OUTPUT_DIR):
+        return 0
+    cutoff = time.time() - max_age
+    removed = 0
+    for entry in os.scandir(OUTPUT_DIR):
+        if entry.is_file() and entry.name.endswith(".wav") and entry.stat().st_mtime < cutoff:
+            try:
+                os.remove(entry.path)
+                removed += 1
+            except OSError:
+                continue
+    return removed
+
+
+def sweep_fragments(max_age: float) -> int:
+    """Delete fragment directories older than max_age seconds. Returns how many were removed"""
+    if not os.path.isdir(FRAGMENT_DIR):
+        return 0
+    cutoff = time.time() - max_age
+    removed = 0
+    for name in os.listdir(FRAGMENT_DIR):
+        path = os.path.join(FRAGMENT_DIR, name)
+        if os.path.isdir(path) and os.path.getmtime(path) < cutoff:
+            shutil.rmtree(path, ignore_errors=True)
+            removed += 1
+    return removed
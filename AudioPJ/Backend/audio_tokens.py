@@ -0,0 +1,151 @@
+"""
+Audio Token Extraction
+Maps Stage 1 vocabulary ids straight to XCodec codes through a precomputed
+lookup table, so generated sequences never go through text decoding
+"""
+import logging
+import math
+import threading
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from config import CODEC_FRAME_RATE, DEFAULT_DURATION_SECONDS, STAGE1_TOKEN_HEADROOM
+
+logger = logging.getLogger(__name__)
+
+XCODEC_TOKEN_PREFIX = "<xcodec/0/"
+XCODEC_TOKEN_SUFFIX = ">"
+END_OF_AUDIO_TOKEN = "<EOA>"
+
+# Lookup tables are built once per vocabulary
+_lookups: Dict[Any, np.ndarray] = {}
+_lookups_lock = threading.Lock()
+
+
+def frames_for_duration(duration: Optional[float]) -> int:
+    """Number of codec frames (= Stage 1 audio tokens) for a target duration in seconds"""
+    return int(math.ceil((duration or DEFAULT_DURATION_SECONDS) * CODEC_FRAME_RATE))
+
+
+def token_budget(duration: Optional[float]) -> int:
+    """Stage 1 generation budget for a target duration, including control-token headroom"""
+    return frames_for_duration(duration) + STAGE1_TOKEN_HEADROOM
+
+
+def _parse_codec_piece(piece: str) -> Optional[int]:
+    """Return the codec code of a '<xcodec/0/N>' vocabulary piece, else None"""
+    if piece.startswith(XCODEC_TOKEN_PREFIX) and piece.endswith(XCODEC_TOKEN_SUFFIX):
+        digits = piece[len(XCODEC_TOKEN_PREFIX):-len(XCODEC_TOKEN_SUFFIX)]
+        if digits.isdigit():
+            return int(digits)
+    return None
+
+
+def build_codec_lookup(vocab: Dict[str, int]) -> np.ndarray:
+    """
+    Build the id -> codec code table from a {piece: id} vocabulary
+    Non-codec ids map to -1
+    """
+    size = max(vocab.values()) + 1 if vocab else 0
+    lookup = np.full(size, -1, dtype=np.int32)
+    for piece, token_id in vocab.items():
+        code = _parse_codec_piece(piece)
+        if code is not None:
+            lookup[token_id] = code
+    logger.info(f"Codec lookup table: {int((lookup >= 0).sum())} codec tokens in a vocabulary of {size}")
+    return lookup
+
+
+def get_tokenizer_lookup(tokenizer) -> np.ndarray:
+    """Lookup table for a HuggingFace tokenizer (cached per vocabulary)"""
+    key = ("hf", getattr(tokenizer, "name_or_path", None), len(tokenizer))
+    with _lookups_lock:
+        lookup = _lookups.get(key)
+        if lookup is None:
+            lookup = build_codec_lookup(tokenizer.get_vocab())
+            _lookups[key] = lookup
+        return lookup
+
+
+def get_llama_lookup(llm, model_key: str) -> np.ndarray:
+    """Lookup table for a llama.cpp model (cached per model)"""
+    key = ("gguf", model_key)
+    with _lookups_lock:
+        lookup = _lookups.get(key)
+        if lookup is None:
+            vocab = {}
+            for token_id in range(llm.n_vocab()):
+                piece = llm.detokenize([token_id], special=True).decode("utf-8", errors="ignore")
+                vocab[piece] = token_id
+            lookup = build_codec_lookup(vocab)
+            _lookups[key] = lookup
+        return lookup
+
+
+def allowed_token_mask(lookup: np.ndarray, control_ids, size: Optional[int] = None) -> np.ndarray:
+    """
+    Boolean mask over the vocabulary of the tokens Stage 1 may emit after <SOA>:
+    codec tokens plus the given control token ids. `size` pads the mask to the
+    model's output dimension, which can exceed the tokenizer vocabulary
+    """
+    size = max(size or 0, len(lookup))
+    mask = np.zeros(size, dtype=bool)
+    mask[:len(lookup)] = lookup >= 0
+    for token_id in control_ids:
+        if token_id is not None and 0 <= token_id < size:
+            mask[token_id] = True
+    return mask
+
+
+def codes_from_ids(token_ids: Any, lookup: np.ndarray) -> np.ndarray:
+    """
+    Convert Stage 1 token ids (list, array or tensor of any shape) to XCodec codes
+    Non-codec tokens (text, control tokens, padding) are dropped
+    """
+    if hasattr(token_ids, "detach"):
+        token_ids = token_ids.detach().cpu().numpy()
+    ids = np.asarray(token_ids, dtype=np.int64).reshape(-1)
+    ids = ids[(ids >= 0) & (ids < len(lookup))]
+    codes = lookup[ids]
+    return codes[codes >= 0]
+
+
+def extract_audio_tokens(text: str) -> np.ndarray:
+    """
+    Extract xcodec codes from Stage 1 text output (format: <xcodec/0/NUMBER>)
+    Only for outputs that are already text; token ids should use codes_from_ids
+    """
+    parts = text.split(XCODEC_TOKEN_PREFIX)[1:]
+    codes = []
+    for part in parts:
+        end = part.find(XCODEC_TOKEN_SUFFIX)
+        digits = part[:end]
+        if end > 0 and digits.isdigit():
+            codes.append(int(digits))
+
+    if not codes:
+        logger.warning("No xcodec tokens found in output")
+    return np.asarray(codes, dtype=np.int32)
+
+
+def token_stats(codes: np.ndarray) -> Dict[str, int]:
+    """Count, unique count, most common code and range, in O(n) via bincount"""
+    if len(codes) == 0:
+        return {"count": 0, "unique": 0, "most_common": -1, "min": -1, "max": -1}
+    counts = np.bincount(codes)
+    return {
+        "count": int(len(codes)),
+        "unique": int(np.count_nonzero(counts)),
+        "most_common": int(counts.argmax()),
+        "min": int(codes.min()),
+        "max": int(codes.max()),
+    }
+
+
+def log_token_stats(codes: np.ndarray):
+    stats = token_stats(codes)
+    logger.info(
+        f"Token statistics: count={stats['count']} unique={stats['unique']} "
+        f"most_common={stats['most_common']} range={stats['min']}-{stats['max']}"
+    )
@@ -0,0 +1,68 @@
+"""
+Token -> Audio Benchmarks
+Each bench_* function does its setup and returns the callable that is timed
+"""
+import atexit
+import os
+
+import numpy as np
+
+from audio_tokens import build_codec_lookup, codes_from_ids, extract_audio_tokens
+
+SAMPLE_RATE = 44100
+DURATION = 30.0
+# 30 s of Stage 1 output at 50 frames per second
+FRAMES = 1500
+
+
+def _codes() -> np.ndarray:
+    return np.random.default_rng(0).integers(0, 1024, FRAMES)
+
+
+def bench_extract_audio_tokens():
+    text = "<SOA>" + "".join(f"<xcodec/0/{code}>" for code in _codes()) + "<EOA>"
+    return lambda: extract_audio_tokens(text)
+
+
+def bench_codes_from_ids():
+    lookup = build_codec_lookup({f"<xcodec/0/{code}>": code + 32 for code in range(1024)})
+    ids = _codes() + 32
+    return lambda: codes_from_ids(ids, lookup)
+
+
+def bench_tokens_to_audio_simple():
+    from xcodec_decoder import tokens_to_audio_simple
+
+    codes = _codes()
+    return lambda: tokens_to_audio_simple(codes, SAMPLE_RATE, DURATION)
+
+
+def bench_resample_16k_to_44k():
+    from resampler import resample
+
+    audio = np.random.default_rng(0).standard_normal(int(16000 * DURATION)).astype(np.float32)
+    return lambda: resample(audio, 16000, SAMPLE_RATE)
+
+
+def bench_write_wav():
+    from audio_output import OUTPUT_DIR, write_wav
+
+    path = os.path.join(OUTPUT_DIR, "benchmark_write_wav.wav")
+
+    def cleanup():
+        if os.path.exists(path):
+            os.remove(path)
+    atexit.register(cleanup)
+    audio = np.random.default_rng(0).integers(-32768, 32767, int(SAMPLE_RATE * DURATION), dtype=np.int16)
+    return lambda: write_wav(os.path.basename(path), SAMPLE_RATE, audio)
+
+
+def bench_decode_with_xcodec_tiny():
+    """Chunked XCodec decode (windows, crossfade, resampling) around a tiny codec"""
+    from tiny_models import install_tiny_codec
+
+    install_tiny_codec()
+    from xcodec_real_decoder import decode_with_xcodec
+
+    codes = _codes()
+    return lambda: decode_with_xcodec(codes, SAMPLE_RATE)
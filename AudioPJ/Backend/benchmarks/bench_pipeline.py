@@ -0,0 +1,40 @@
+"""
+End-to-end Pipeline Benchmark
+The HF run_pipeline with tiny random-init Stage 1 / Stage 2 LMs and a tiny
+codec, so the measured time is the pipeline's own overhead and plumbing
+"""
+import atexit
+import os
+import shutil
+
+# Short songs keep the tiny models fast; the code path is the same
+DURATION = 4.0
+
+
+def bench_run_pipeline_tiny():
+    from audio_output import FRAGMENT_DIR, OUTPUT_DIR
+    from tiny_models import TinyYuEPipeline, install_tiny_codec
+
+    install_tiny_codec()
+    pipeline = TinyYuEPipeline()
+    written = set()
+    # Progressive preview fragments are written too; remove the ones made here
+    existing = set(os.listdir(FRAGMENT_DIR)) if os.path.isdir(FRAGMENT_DIR) else set()
+
+    def cleanup():
+        for filename in written:
+            path = os.path.join(OUTPUT_DIR, filename)
+            if os.path.exists(path):
+                os.remove(path)
+        if os.path.isdir(FRAGMENT_DIR):
+            for name in set(os.listdir(FRAGMENT_DIR)) - existing:
+                shutil.rmtree(os.path.join(FRAGMENT_DIR, name), ignore_errors=True)
+    atexit.register(cleanup)
+
+    def run():
+        # Unseeded, so the generation cache is never hit
+        filename = pipeline.run_pipeline("[verse]\nla la la", "benchmark", "tiny", duration=DURATION)
+        if filename is None:
+            raise RuntimeError("pipeline returned no audio")
+        written.add(filename)
+    return run
@@ -0,0 +1,141 @@
+"""
+Benchmark Runner
+Times the token -> audio path and the end-to-end pipeline on CPU, with tiny
+stand-in models, and compares every result with the stored baseline. Exits
+with status 1 when a benchmark is slower than its baseline by more than the
+tolerance, so a regression fails the run.
+
+Benchmarks needing torch / transformers are skipped when those are missing.
+Baselines are machine specific: record them on the machine that runs the
+comparison.
+
+Usage (from AudioPJ/Backend):
+    python benchmarks/run_benchmarks.py              # compare with baselines
+    python benchmarks/run_benchmarks.py --update     # record new baselines
+    python benchmarks/run_benchmarks.py -k resample  # only matching benchmarks
+"""
+import argparse
+import importlib
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+# Forced before anything imports torch: benchmarks always run on CPU
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "")
+
+BENCH_MODULES = ["bench_audio", "bench_pipeline"]
+DEFAULT_BASELINES = os.path.join(HERE, "baselines.json")
+# Allowed slowdown over the baseline median before a run fails
+DEFAULT_TOLERANCE = 0.25
+
+
+class Skipped(Exception):
+    pass
+
+
+def collect(pattern: Optional[str]) -> Iterator[Tuple[str, Callable]]:
+    """(name, setup) of every bench_* function, in definition order"""
+    for module_name in BENCH_MODULES:
+        for name, fn in list(vars(importlib.import_module(module_name)).items()):
+            if not name.startswith("bench_") or not callable(fn):
+                continue
+            full_name = f"{module_name}.{name[len('bench_'):]}"
+            if pattern is None or pattern in full_name:
+                yield full_name, fn
+
+
+def measure(setup: Callable, repeats: int) -> float:
+    """Median wall time of the callable returned by setup (setup itself is not timed)"""
+    try:
+        run = setup()
+    except ImportError as e:
+        raise Skipped(f"missing dependency: {e.name or e}")
+    run()  # warm-up: lazy loading, caches, thread start-up
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def machine() -> str:
+    return f"{platform.machine()} {platform.processor() or platform.system()}, {os.cpu_count()} CPUs"
+
+
+def load_baselines(path: str) -> Dict:
+    if not os.path.exists(path):
+        return {"machine": None, "results": {}}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_baselines(path: str, baselines: Dict):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Run the AudioPJ benchmarks")
+    parser.add_argument("-k", dest="pattern", help="only run benchmarks whose name contains this")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed slowdown, as a fraction of the baseline")
+    parser.add_argument("--baselines", default=DEFAULT_BASELINES)
+    parser.add_argument("--update", action="store_true", help="store the results as the new baselines")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    baselines = load_baselines(args.baselines)
+    if baselines["machine"] not in (None, machine()) and not args.update:
+        print(f"Warning: baselines were recorded on {baselines['machine']}, this is {machine()}")
+
+    regressions = []
+    print(f"{'benchmark':<40} {'median':>10} {'baseline':>10} {'ratio':>7}  status")
+    for name, setup in collect(args.pattern):
+        try:
+            seconds = measure(setup, args.repeats)
+        except Skipped as e:
+            print(f"{name:<40} {'-':>10} {'-':>10} {'-':>7}  skipped ({e})")
+            continue
+
+        baseline = baselines["results"].get(name)
+        if args.update or baseline is None:
+            status = "recorded" if args.update else "new (no baseline)"
+            ratio = "-"
+            if args.update:
+                baselines["results"][name] = seconds
+        else:
+            ratio = f"{seconds / baseline:.2f}"
+            if seconds > baseline * (1 + args.tolerance):
+                status = "REGRESSION"
+                regressions.append(name)
+            else:
+                status = "ok"
+        shown_baseline = f"{baseline * 1000:.1f}ms" if baseline is not None else "-"
+        print(f"{name:<40} {seconds * 1000:>8.1f}ms {shown_baseline:>10} {ratio:>7}  {status}")
+
+    if args.update:
+        baselines["machine"] = machine()
+        save_baselines(args.baselines, baselines)
+        print(f"Baselines written to {args.baselines}")
+        return 0
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) slower than baseline by more than "
+              f"{args.tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""
+Tiny Stand-in Models
+Random-init models with the interfaces of the real ones, small enough to run
+the pipeline on CPU in seconds: a codec exposing decode_code() like XCodec2,
+and small causal LMs with a YuE-style tokenizer for Stage 1 and Stage 2
+"""
+import torch
+
+from audio_tokens import END_OF_AUDIO_TOKEN, XCODEC_TOKEN_PREFIX, XCODEC_TOKEN_SUFFIX
+from model_manager import get_model_manager
+from yue_hf_client import YuEPipeline
+
+# Codes the stand-ins understand; the real XCodec2 codebook is much larger
+TINY_CODEBOOK_SIZE = 1024
+# XCodec2 produces 320 samples (16 kHz) per code frame
+SAMPLES_PER_FRAME = 320
+
+
+class TinyCodec(torch.nn.Module):
+    """Embedding + two transposed convolutions: 1 code frame -> 320 samples"""
+
+    def __init__(self):
+        super().__init__()
+        self.embed = torch.nn.Embedding(TINY_CODEBOOK_SIZE, 32)
+        self.up1 = torch.nn.ConvTranspose1d(32, 16, kernel_size=20, stride=20)
+        self.up2 = torch.nn.ConvTranspose1d(16, 1, kernel_size=16, stride=16)
+
+    def decode_code(self, codes: torch.Tensor) -> torch.Tensor:
+        """(batch, 1, frames) codes -> (batch, 1, frames * 320) audio"""
+        hidden = self.embed(codes[:, 0].clamp(0, TINY_CODEBOOK_SIZE - 1)).transpose(1, 2)
+        return torch.tanh(self.up2(torch.relu(self.up1(hidden))))
+
+
+def _tiny_codec() -> TinyCodec:
+    torch.manual_seed(0)
+    return TinyCodec().eval()
+
+
+def install_tiny_codec():
+    """Make the model manager hand out TinyCodec wherever XCodec2 is loaded"""
+    get_model_manager().register("xcodec", _tiny_codec, 0.01)
+
+
+def tiny_tokenizer():
+    """Word-level tokenizer with the YuE control tokens and codec pieces"""
+    from tokenizers import Tokenizer, models, pre_tokenizers
+    from transformers import PreTrainedTokenizerFast
+
+    specials = ["<unk>", "<pad>", "<s>", "</s>", "<SOA>", END_OF_AUDIO_TOKEN]
+    codec = [f"{XCODEC_TOKEN_PREFIX}{code}{XCODEC_TOKEN_SUFFIX}" for code in range(TINY_CODEBOOK_SIZE)]
+    vocab = {piece: i for i, piece in enumerate(specials + codec)}
+
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token="<unk>"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    tokenizer.add_special_tokens(specials + codec)
+    return PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer, unk_token="<unk>", pad_token="<pad>",
+        bos_token="<s>", eos_token="</s>"
+    )
+
+
+def tiny_causal_lm(vocab_size: int, seed: int = 0):
+    """Two-layer Llama with a 64-wide hidden state"""
+    from transformers import LlamaConfig, LlamaForCausalLM
+
+    torch.manual_seed(seed)
+    config = LlamaConfig(
+        vocab_size=vocab_size, hidden_size=64, intermediate_size=128,
+        num_hidden_layers=2, num_attention_heads=4, num_key_value_heads=4,
+        max_position_embeddings=4096
+    )
+    return LlamaForCausalLM(config).eval()
+
+
+class TinyYuEPipeline(YuEPipeline):
+    """The HF pipeline with its Stage 1 / Stage 2 weights replaced by tiny LMs"""
+
+    def _load_stage1_weights(self):
+        tokenizer = tiny_tokenizer()
+        return tiny_causal_lm(len(tokenizer), seed=1), tokenizer
+
+    def _load_stage2_weights(self):
+        return tiny_causal_lm(len(tiny_tokenizer()), seed=2)
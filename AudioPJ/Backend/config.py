@@ -10,6 +10,13 @@ PIPELINE_MODE = "huggingface"  # Change to "huggingface" for best quality
 # GGUF Configuration (for fast inference)
 GGUF_MODEL_STAGE1 = "./models/YuE-s1-7B-anneal-en-cot-Q4_K_S.gguf"
 GGUF_MODEL_STAGE2 = "./models/yue-s2-1b-general-q8_0.gguf"
+GGUF_N_CTX = 2048          # Minimum context size of cached llama.cpp engines
+# Longest Stage 1 prompt (header + lyrics); longer ones are rejected. The Stage 1 engine is
+# loaded once with this plus the token budget of MAX_DURATION_SECONDS as its context, so
+# no request reloads it: lower MAX_DURATION_SECONDS to shrink the KV cache
+GGUF_MAX_PROMPT_TOKENS = 1024
+GGUF_N_GPU_LAYERS = -1     # Offload every layer to the GPU when possible
+GGUF_USE_MLOCK = False     # Pin memory-mapped weights in RAM (avoids paging under pressure)
 
 # HuggingFace Configuration (for high quality)
 HF_MODEL_STAGE1 = "m-a-p/YuE-s1-7B-anneal-en-cot"
@@ -18,3 +25,146 @@ HF_CACHE_DIR = "./models/huggingface_cache"
 
 # Output directory
 OUTPUT_DIR = "./outputs"
+
+# Model residency: keep models loaded between jobs and evict least-recently-used
+# ones only when loading another model would exceed these budgets
+MODEL_VRAM_BUDGET_GB = 22.0
+MODEL_RAM_BUDGET_GB = 32.0
+
+# Estimated footprints used to make room before a model is loaded
+STAGE1_SIZE_GB = 14.0
+STAGE2_SIZE_GB = 2.5
+XCODEC_SIZE_GB = 1.5
+
+# Job scheduling
+MAX_CONCURRENT_JOBS = 3                  # Jobs in flight across the pipeline stages (see below)
+JOB_PRIORITIES = ["high", "normal", "low"]  # Dispatch order of the priority queues
+
+# Job progress push (SSE) and long-polling
+SSE_HEARTBEAT_SECONDS = 15.0
+LONG_POLL_MAX_SECONDS = 30.0
+PROGRESS_TOKEN_INTERVAL = 32   # Publish Stage 1 progress every N generated tokens
+
+# Job store: "sqlite" keeps jobs across restarts, "memory" is process-local
+JOB_STORE_BACKEND = "sqlite"
+JOB_STORE_PATH = "./jobs.db"
+JOB_TTL_SECONDS = 7 * 24 * 3600   # Finished jobs are deleted after this long
+JOB_STORE_SWEEP_SECONDS = 600
+MAX_BATCH_STATUS_IDS = 100      # Upper bound of ids accepted by /api/status?ids=
+
+# Generation cache: seeded requests reuse Stage 1 outputs and final audio
+GENERATION_CACHE_ENABLED = True
+GENERATION_CACHE_DIR = "./cache/generations"
+GENERATION_CACHE_MAX_GB = 10.0
+
+# Stage 1 micro-batching (HuggingFace pipeline, unseeded requests): requests
+# arriving within the window are bucketed by prompt length and generated together.
+# Only useful with MAX_CONCURRENT_JOBS > 1.
+STAGE1_BATCHING_ENABLED = True
+STAGE1_MAX_BATCH_SIZE = 4
+STAGE1_BATCH_WINDOW_MS = 50
+STAGE1_BUCKET_TOKENS = 64
+
+# Prompt header prefix cache (KV state / llama.cpp snapshots per genre+mood header)
+PREFIX_CACHE_MAX_MB = 1024
+
+# Write Stage 1 output as readable text to outputs/ for debugging. Off by default:
+# it detokenizes the whole generation, while decoding works on token ids directly
+SAVE_STAGE1_TEXT = False
+
+# Chunked XCodec decoding: codes are decoded in windows of XCODEC_CHUNK_FRAMES
+# (50 frames = 1 s) overlapping by XCODEC_OVERLAP_FRAMES, stitched with a crossfade,
+# so memory does not grow with song length
+XCODEC_CHUNK_FRAMES = 500
+XCODEC_OVERLAP_FRAMES = 25
+
+# Duration-aware Stage 1 budget: XCodec produces CODEC_FRAME_RATE frames per second and
+# Stage 1 emits one codec token per frame, plus headroom for segment/control tokens
+CODEC_FRAME_RATE = 50
+DEFAULT_DURATION_SECONDS = 30.0
+MAX_DURATION_SECONDS = 300.0
+STAGE1_TOKEN_HEADROOM = 64
+
+# Constrained Stage 1 decoding: after <SOA> only XCodec codes and <EOA> can be sampled
+# (a vocabulary mask applied as a logits processor on both pipelines)
+STAGE1_CONSTRAINED_DECODING = True
+
+# Loop detection on the Stage 1 token stream: a pattern of up to LOOP_MAX_PERIOD tokens
+# repeated LOOP_MIN_REPEATS times (covering at least LOOP_MIN_SPAN tokens) counts as a loop.
+# "stop" ends the generation and drops the repeats, "resample" bans the token that would
+# continue the loop (stopping after LOOP_MAX_RESAMPLES attempts), "off" disables it.
+# Patterns shorter than LOOP_MIN_PERIOD are ignored: a run of one repeated code is
+# silence or a sustained note, not a loop
+LOOP_DETECTION_ACTION = "stop"
+LOOP_MIN_PERIOD = 2
+LOOP_MAX_PERIOD = 250
+LOOP_MIN_REPEATS = 4
+LOOP_MIN_SPAN = 250
+LOOP_MAX_RESAMPLES = 3
+
+# Progressive audio (real XCodec only): codes are decoded while Stage 1 generates and
+# published as WAV fragments of at least PROGRESSIVE_FRAGMENT_SECONDS. Windows of
+# PROGRESSIVE_CHUNK_FRAMES (hop = chunk - XCODEC_OVERLAP_FRAMES) keep latency low at the
+# cost of more crossfade seams, so fragments are a preview only and the delivered song is
+# decoded again with XCODEC_CHUNK_FRAMES windows: XCodec runs twice per job, roughly
+# doubling codec time and GPU load. Set PROGRESSIVE_CHUNK_FRAMES = XCODEC_CHUNK_FRAMES to
+# decode once (the preview becomes the song when its codes are unchanged) at the cost of a
+# later first fragment. Off by default. Fragments are deleted after FRAGMENT_TTL_SECONDS
+PROGRESSIVE_AUDIO_ENABLED = False
+PROGRESSIVE_FRAGMENT_SECONDS = 2.5
+PROGRESSIVE_CHUNK_FRAMES = 175
+FRAGMENT_TTL_SECONDS = 3600
+
+# Staged pipeline: Stage 1, codec decode, post-processing and WAV encoding run as separate
+# stages connected by bounded queues, so with MAX_CONCURRENT_JOBS > 1 one job generates
+# while earlier ones decode and save. Stage 1 keeps a single worker (one micro-batch on HF)
+PIPELINE_STAGE_QUEUE_SIZE = 2
+PIPELINE_DECODE_WORKERS = 1
+PIPELINE_ENCODE_WORKERS = 1
+
+# Inference runs in INFERENCE_WORKERS separate processes (0 = inside the API process).
+# Each worker loads the pipeline once and serves several jobs through its stages;
+# a worker that dies is restarted after WORKER_RESTART_DELAY_SECONDS
+INFERENCE_WORKERS = 1
+WORKER_RESTART_DELAY_SECONDS = 2.0
+
+# Batched XCodec decoding: windows from concurrent jobs arriving within XCODEC_BATCH_WINDOW_MS
+# are decoded in one forward pass. Windows are grouped by length // XCODEC_BATCH_BUCKET_FRAMES;
+# the default of 1 only batches equal lengths, so no window is ever padded
+XCODEC_BATCHING_ENABLED = True
+XCODEC_MAX_BATCH_SIZE = 8
+XCODEC_BATCH_WINDOW_MS = 10
+XCODEC_BATCH_BUCKET_FRAMES = 1
+
+# XCodec on CPU-only nodes: "auto" runs the exported decoder (python xcodec_export.py) on
+# ONNX Runtime, or TorchScript if only that export exists, and eager PyTorch otherwise.
+# "onnx" / "torchscript" pick one engine, "eager" disables them. XCODEC_ONNX_THREADS sets
+# ONNX Runtime intra-op threads (0 = its default); the optimized graph is cached on disk
+XCODEC_CPU_ENGINE = "auto"
+XCODEC_EXPORT_DIR = "./models/xcodec_export"
+XCODEC_ONNX_THREADS = 0
+
+# Metrics: how often inference workers report their gauges (queues, models, memory)
+METRICS_PUSH_SECONDS = 5.0
+
+# Tracing: where finished spans go ("jsonl" file, "otlp" HTTP/JSON collector, or "off")
+TRACE_EXPORTER = "jsonl"
+TRACE_FILE = "./traces/traces.jsonl"
+TRACE_COLLECTOR_URL = "http://127.0.0.1:4318/v1/traces"
+# Traces kept in memory for the status summary
+TRACE_MEMORY_TRACES = 200
+# Stage 1 adds a timing event to its span every N decoding steps
+TRACE_TOKEN_SAMPLE_INTERVAL = 50
+
+# Startup: load the models in the background when the server starts, so the
+# first job does not pay for it (/readyz reports 200 once this is done)
+WARMUP_ON_STARTUP = True
+
+# Warm-up pass at startup (after the models load): a short dummy Stage 1
+# generation and a codec decode, so the first real job is not the slow one
+WARMUP_DUMMY_JOB = True
+WARMUP_DURATION_SECONDS = 2.0
+# torch.compile the XCodec decoder and Stage 2 (eager PyTorch models only); the
+# compile caches are kept in TORCH_COMPILE_CACHE_DIR so restarts reuse them
+WARMUP_TORCH_COMPILE = False
+TORCH_COMPILE_CACHE_DIR = "./cache/torch_compile"
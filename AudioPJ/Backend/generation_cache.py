@@ -0,0 +1,141 @@
+"""
+Generation Cache
+Content-addressed store of Stage 1 outputs and final audio, keyed on the
+request and the model configuration, with LRU eviction under a disk quota
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from typing import Any, Optional
+
+import numpy as np
+
+from config import GENERATION_CACHE_DIR, GENERATION_CACHE_MAX_GB
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(**parts: Any) -> str:
+    """Stable hash of the inputs that determine an output"""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class GenerationCache:
+    """
+    Two-level cache:
+      - stage1/<key>.npy  Stage 1 output (token array, or text for the GGUF path)
+      - audio/<key>.wav   final audio, keyed on the Stage 1 key plus decoder settings
+    A decoder change therefore misses the audio level but still reuses Stage 1.
+    """
+
+    def __init__(self, root: str = GENERATION_CACHE_DIR, max_gb: float = GENERATION_CACHE_MAX_GB):
+        if not os.path.isabs(root):
+            root = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), root))
+        self.root = root
+        self.quota_bytes = int(max_gb * 1024 ** 3)
+        self._lock = threading.Lock()
+        for sub in ("stage1", "audio"):
+            os.makedirs(os.path.join(root, sub), exist_ok=True)
+
+    def _path(self, kind: str, key: str) -> str:
+        ext = ".npy" if kind == "stage1" else ".wav"
+        return os.path.join(self.root, kind, key + ext)
+
+    def _hit(self, path: str) -> bool:
+        if not os.path.exists(path):
+            return False
+        # mtime doubles as the LRU clock
+        os.utime(path, None)
+        return True
+
+    def load_stage1(self, key: str) -> Optional[np.ndarray]:
+        path = self._path("stage1", key)
+        try:
+            if self._hit(path):
+                logger.info(f"Generation cache hit (Stage 1): {key[:12]}")
+                return np.load(path, allow_pickle=False)
+        except Exception as e:
+            logger.warning(f"Could not read cached Stage 1 output {key[:12]}: {e}")
+        return None
+
+    def store_stage1(self, key: str, value: Any):
+        path = self._path("stage1", key)
+        try:
+            tmp_path = path + ".tmp.npy"
+            np.save(tmp_path, np.asarray(value), allow_pickle=False)
+            os.replace(tmp_path, path)
+            self._enforce_quota()
+        except Exception as e:
+            logger.warning(f"Could not cache Stage 1 output {key[:12]}: {e}")
+
+    def fetch_audio(self, key: str, dest_path: str) -> bool:
+        """Materialise cached audio at dest_path. Returns False on a miss"""
+        path = self._path("audio", key)
+        try:
+            if not self._hit(path):
+                return False
+            with span("cache.fetch_audio"):
+                # Copied, never hard-linked: output names are reused, and writing the
+                # next job's WAV in place would overwrite the cached entry
+                tmp_path = dest_path + ".tmp"
+                shutil.copyfile(path, tmp_path)
+                os.replace(tmp_path, dest_path)
+            logger.info(f"Generation cache hit (audio): {key[:12]}")
+            return True
+        except Exception as e:
+            logger.warning(f"Could not read cached audio {key[:12]}: {e}")
+            return False
+
+    def store_audio(self, key: str, src_path: str):
+        path = self._path("audio", key)
+        try:
+            with span("cache.store_audio"):
+                tmp_path = path + ".tmp"
+                shutil.copyfile(src_path, tmp_path)
+                os.replace(tmp_path, path)
+                self._enforce_quota()
+        except Exception as e:
+            logger.warning(f"Could not cache audio {key[:12]}: {e}")
+
+    def _enforce_quota(self):
+        """Delete least-recently-used entries until the cache fits its quota"""
+        with self._lock:
+            entries = []
+            for kind in ("stage1", "audio"):
+                directory = os.path.join(self.root, kind)
+                for entry in os.scandir(directory):
+                    if entry.is_file() and ".tmp" not in entry.name:
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+            total = sum(size for _, size, _ in entries)
+            if total <= self.quota_bytes:
+                return
+            for _, size, path in sorted(entries):
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                logger.info(f"Generation cache evicted {os.path.basename(path)}")
+                if total <= self.quota_bytes:
+                    break
+
+
+# Global cache instance shared by both pipelines
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_generation_cache() -> GenerationCache:
+    global _cache
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = GenerationCache()
+        return _cache
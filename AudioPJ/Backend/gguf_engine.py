@@ -0,0 +1,134 @@
+"""
+GGUF Engine Cache
+Process-wide cache of llama.cpp instances so the GGUF pipeline loads each
+model once (memory-mapped) instead of on every request
+"""
+import gc
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+from config import GGUF_N_CTX, GGUF_N_GPU_LAYERS, GGUF_USE_MLOCK
+from metrics import timed
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+
+class _Engine:
+    def __init__(self, llm, model_path: str, n_ctx: int, n_gpu_layers: int):
+        self.llm = llm
+        self.model_path = model_path
+        self.n_ctx = n_ctx
+        self.n_gpu_layers = n_gpu_layers
+        # llama.cpp contexts are not thread-safe
+        self.lock = threading.Lock()
+
+
+class GGUFEngineCache:
+    """Keeps Llama instances loaded, keyed by model path and context settings"""
+
+    def __init__(self):
+        self._engines: Dict[Tuple[str, int, int], _Engine] = {}
+        self._lock = threading.Lock()
+
+    def _find(self, model_path: str, n_ctx: int, n_gpu_layers: int):
+        engine = self._engines.get((model_path, n_ctx, n_gpu_layers))
+        if engine is not None:
+            return engine
+        # A loaded engine with a larger context serves smaller requests as-is,
+        # so changing n_ctx downwards never triggers a reload
+        for (path, ctx, layers), candidate in self._engines.items():
+            if path == model_path and layers == n_gpu_layers and ctx >= n_ctx:
+                return candidate
+        return None
+
+    def get(self, model_path: str, n_ctx: int = GGUF_N_CTX,
+            n_gpu_layers: int = GGUF_N_GPU_LAYERS) -> _Engine:
+        """Return a cached engine, loading the model only on first use"""
+        model_path = os.path.abspath(model_path)
+        with self._lock:
+            engine = self._find(model_path, n_ctx, n_gpu_layers)
+            if engine is not None:
+                logger.info(f"Reusing cached GGUF engine for {os.path.basename(model_path)} (n_ctx={engine.n_ctx})")
+                return engine
+
+            from llama_cpp import Llama
+
+            logger.info(f"Loading GGUF model {model_path} (n_ctx={n_ctx}, n_gpu_layers={n_gpu_layers})...")
+            with span("model.load", model=os.path.basename(model_path)), \
+                    timed("yue_model_load_seconds", model=os.path.basename(model_path)):
+                llm = Llama(
+                    model_path=model_path,
+                    n_ctx=n_ctx,
+                    n_gpu_layers=n_gpu_layers,
+                    use_mmap=True,           # Weights are paged in from the file, not copied
+                    use_mlock=GGUF_USE_MLOCK,
+                    verbose=False
+                )
+            engine = _Engine(llm, model_path, n_ctx, n_gpu_layers)
+
+            # Drop smaller-context engines of the same model: the new one covers them
+            for key in [k for k in self._engines if k[0] == model_path and k[2] == n_gpu_layers]:
+                self._close(self._engines.pop(key))
+
+            self._engines[(model_path, n_ctx, n_gpu_layers)] = engine
+            return engine
+
+    @contextmanager
+    def use(self, model_path: str, n_ctx: int = GGUF_N_CTX,
+            n_gpu_layers: int = GGUF_N_GPU_LAYERS):
+        """Borrow a cached Llama instance exclusively for the duration of the block"""
+        while True:
+            engine = self.get(model_path, n_ctx, n_gpu_layers)
+            with engine.lock:
+                # A larger-context load can close the engine between get() and the
+                # lock: fetch its replacement instead
+                if engine.llm is None:
+                    continue
+                yield engine.llm
+                return
+
+    def evict(self, model_path: str) -> bool:
+        """Unload every cached engine for a model. Returns False if none was loaded"""
+        model_path = os.path.abspath(model_path)
+        with self._lock:
+            keys = [k for k in self._engines if k[0] == model_path]
+            for key in keys:
+                self._close(self._engines.pop(key))
+        if keys:
+            gc.collect()
+        return bool(keys)
+
+    def evict_all(self):
+        with self._lock:
+            for key in list(self._engines):
+                self._close(self._engines.pop(key))
+        gc.collect()
+
+    def loaded(self) -> List[str]:
+        with self._lock:
+            return [f"{os.path.basename(p)} (n_ctx={ctx})" for p, ctx, _ in self._engines]
+
+    def _close(self, engine: _Engine):
+        with engine.lock:
+            if hasattr(engine.llm, "close"):
+                engine.llm.close()
+            engine.llm = None
+        logger.info(f"GGUF engine for {os.path.basename(engine.model_path)} unloaded")
+
+
+# Global engine cache shared by all requests
+_engines = None
+_engines_lock = threading.Lock()
+
+
+def get_engine_cache() -> GGUFEngineCache:
+    global _engines
+
+    with _engines_lock:
+        if _engines is None:
+            _engines = GGUFEngineCache()
+        return _engines
@@ -0,0 +1,79 @@
+"""
+Job Event Bus
+Fans out job state changes from the inference worker threads to the
+asyncio side (SSE streams and long-poll requests)
+"""
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+class JobEventBus:
+    """Versioned per-job snapshots with asyncio subscribers"""
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop):
+        """Remember the server event loop so worker threads can reach it"""
+        self._loop = loop
+
+    def publish(self, job_id: str, snapshot: Dict[str, Any]) -> int:
+        """Record a new job snapshot and push it to every subscriber (thread-safe)"""
+        with self._lock:
+            version = self._versions.get(job_id, 0) + 1
+            self._versions[job_id] = version
+            queues = list(self._subscribers.get(job_id, ()))
+
+        if self._loop is not None and queues:
+            for queue in queues:
+                self._loop.call_soon_threadsafe(queue.put_nowait, snapshot)
+        return version
+
+    def version(self, job_id: str) -> int:
+        with self._lock:
+            return self._versions.get(job_id, 0)
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        """Register a queue receiving every future snapshot (call from the event loop)"""
+        queue: asyncio.Queue = asyncio.Queue()
+        with self._lock:
+            self._subscribers.setdefault(job_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue):
+        with self._lock:
+            queues = self._subscribers.get(job_id)
+            if queues is not None:
+                queues.discard(queue)
+                if not queues:
+                    del self._subscribers[job_id]
+
+    async def wait_for_update(self, job_id: str, version: int, timeout: float) -> bool:
+        """Wait until the job moves past `version`. Returns False on timeout"""
+        queue = self.subscribe(job_id)
+        try:
+            if self.version(job_id) != version:
+                return True
+            await asyncio.wait_for(queue.get(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.unsubscribe(job_id, queue)
+
+    def forget(self, job_id: str):
+        with self._lock:
+            self._versions.pop(job_id, None)
+
+
+# Global event bus shared by the API and the workers
+events = JobEventBus()
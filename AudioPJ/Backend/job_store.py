@@ -0,0 +1,248 @@
+"""
+Job Store
+Persistent job records (SQLite in WAL mode) with TTL eviction, so the job
+table stays bounded and queued work survives a restart
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, List, Optional
+
+from config import JOB_STORE_BACKEND, JOB_STORE_PATH
+from job_events import TERMINAL_STATUSES
+
+logger = logging.getLogger(__name__)
+
+
+class JobRecord:
+    """A job as persisted: the public state plus what is needed to re-run it"""
+
+    def __init__(self, job_id: str, state: Dict[str, Any], request: Dict[str, Any],
+                 priority: str, client_id: str, created_at: float, updated_at: float):
+        self.job_id = job_id
+        self.state = state
+        self.request = request
+        self.priority = priority
+        self.client_id = client_id
+        self.created_at = created_at
+        self.updated_at = updated_at
+
+    @property
+    def status(self) -> str:
+        return self.state.get("status", "unknown")
+
+
+class JobStore(ABC):
+    """
+    Interface shared by the job store backends. Calls block (SQLite I/O):
+    async code runs them through asyncio.to_thread
+    """
+
+    @abstractmethod
+    def create(self, job_id: str, state: Dict[str, Any], request: Dict[str, Any],
+               priority: str = "normal", client_id: str = "anonymous") -> JobRecord:
+        ...
+
+    @abstractmethod
+    def update(self, job_id: str, **fields) -> Optional[JobRecord]:
+        """Merge fields into the job state. Returns None if the job does not exist"""
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[JobRecord]:
+        ...
+
+    @abstractmethod
+    def get_many(self, job_ids: Iterable[str]) -> Dict[str, JobRecord]:
+        ...
+
+    @abstractmethod
+    def unfinished(self) -> List[JobRecord]:
+        """Queued or interrupted jobs, oldest first"""
+
+    @abstractmethod
+    def expire(self, ttl_seconds: float) -> List[str]:
+        """Delete finished jobs not updated for ttl_seconds. Returns the deleted ids"""
+
+    def close(self):
+        pass
+
+
+class MemoryJobStore(JobStore):
+    """Process-local store (nothing survives a restart)"""
+
+    def __init__(self):
+        self._records: Dict[str, JobRecord] = {}
+        self._lock = threading.Lock()
+
+    def create(self, job_id, state, request, priority="normal", client_id="anonymous"):
+        now = time.time()
+        record = JobRecord(job_id, dict(state), request, priority, client_id, now, now)
+        with self._lock:
+            self._records[job_id] = record
+        return record
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            record = self._records.get(job_id)
+            if record is None:
+                return None
+            record.state = {**record.state, **fields}
+            record.updated_at = time.time()
+            return record
+
+    def get(self, job_id):
+        with self._lock:
+            return self._records.get(job_id)
+
+    def get_many(self, job_ids):
+        with self._lock:
+            return {i: self._records[i] for i in job_ids if i in self._records}
+
+    def unfinished(self):
+        with self._lock:
+            records = [r for r in self._records.values() if r.status not in TERMINAL_STATUSES]
+        return sorted(records, key=lambda r: r.created_at)
+
+    def expire(self, ttl_seconds):
+        cutoff = time.time() - ttl_seconds
+        with self._lock:
+            expired = [
+                i for i, r in self._records.items()
+                if r.status in TERMINAL_STATUSES and r.updated_at < cutoff
+            ]
+            for job_id in expired:
+                del self._records[job_id]
+        return expired
+
+
+class SQLiteJobStore(JobStore):
+    """SQLite-backed store using WAL so status reads never block the workers"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            job_id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            state TEXT NOT NULL,
+            request TEXT NOT NULL,
+            priority TEXT NOT NULL,
+            client_id TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_jobs_status_updated ON jobs (status, updated_at);
+        CREATE INDEX IF NOT EXISTS idx_jobs_created ON jobs (created_at);
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # One shared connection guarded by a lock: writes are tiny and serialised anyway
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+        self._lock = threading.Lock()
+        logger.info(f"Job store opened at {path}")
+
+    @staticmethod
+    def _row_to_record(row) -> JobRecord:
+        job_id, state, request, priority, client_id, created_at, updated_at = row
+        return JobRecord(job_id, json.loads(state), json.loads(request),
+                         priority, client_id, created_at, updated_at)
+
+    _COLUMNS = "job_id, state, request, priority, client_id, created_at, updated_at"
+
+    def create(self, job_id, state, request, priority="normal", client_id="anonymous"):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, status, state, request, priority, client_id, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, state.get("status", "queued"), json.dumps(state), json.dumps(request),
+                 priority, client_id, now, now)
+            )
+        return JobRecord(job_id, dict(state), request, priority, client_id, now, now)
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    f"SELECT {self._COLUMNS} FROM jobs WHERE job_id = ?", (job_id,)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("ROLLBACK")
+                    return None
+                record = self._row_to_record(row)
+                record.state = {**record.state, **fields}
+                record.updated_at = time.time()
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, state = ?, updated_at = ? WHERE job_id = ?",
+                    (record.status, json.dumps(record.state), record.updated_at, job_id)
+                )
+                self._conn.execute("COMMIT")
+                return record
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {self._COLUMNS} FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return self._row_to_record(row) if row else None
+
+    def get_many(self, job_ids):
+        job_ids = list(job_ids)
+        if not job_ids:
+            return {}
+        placeholders = ",".join("?" for _ in job_ids)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {self._COLUMNS} FROM jobs WHERE job_id IN ({placeholders})", job_ids
+            ).fetchall()
+        return {row[0]: self._row_to_record(row) for row in rows}
+
+    def unfinished(self):
+        placeholders = ",".join("?" for _ in TERMINAL_STATUSES)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {self._COLUMNS} FROM jobs WHERE status NOT IN ({placeholders}) "
+                "ORDER BY created_at",
+                TERMINAL_STATUSES
+            ).fetchall()
+        return [self._row_to_record(row) for row in rows]
+
+    def expire(self, ttl_seconds):
+        cutoff = time.time() - ttl_seconds
+        placeholders = ",".join("?" for _ in TERMINAL_STATUSES)
+        where = f"status IN ({placeholders}) AND updated_at < ?"
+        params = (*TERMINAL_STATUSES, cutoff)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            rows = self._conn.execute(f"SELECT job_id FROM jobs WHERE {where}", params).fetchall()
+            self._conn.execute(f"DELETE FROM jobs WHERE {where}", params)
+            self._conn.execute("COMMIT")
+        return [row[0] for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def create_job_store(backend: str = JOB_STORE_BACKEND, path: str = JOB_STORE_PATH) -> JobStore:
+    """Build the configured job store ("sqlite" or "memory")"""
+    if backend == "memory":
+        return MemoryJobStore()
+    if backend == "sqlite":
+        if not os.path.isabs(path):
+            path = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), path))
+        return SQLiteJobStore(path)
+    raise ValueError(f"Unknown job store backend: {backend}")
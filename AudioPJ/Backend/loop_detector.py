@@ -0,0 +1,115 @@
+"""
+Stage 1 Loop Detector
+Streaming period detector that spots degenerate repetition in generated
+token streams (one or more rows at a time), so looping generations can be
+stopped or steered away early instead of burning the whole budget
+"""
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from config import (
+    LOOP_DETECTION_ACTION, LOOP_MAX_PERIOD, LOOP_MAX_RESAMPLES, LOOP_MIN_PERIOD, LOOP_MIN_REPEATS, LOOP_MIN_SPAN
+)
+
+logger = logging.getLogger(__name__)
+
+
+class LoopStats:
+    """Process-wide detection counters"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {"detections": 0, "stopped": 0, "resampled": 0}
+
+    def record(self, event: str, count: int = 1):
+        with self._lock:
+            self._counts[event] += count
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+
+loop_stats = LoopStats()
+
+
+def loop_settings() -> Dict[str, Any]:
+    """The loop handling settings, which change the sampled tokens (for cache keys)"""
+    if LOOP_DETECTION_ACTION == "off":
+        return {"action": "off"}
+    return {
+        "action": LOOP_DETECTION_ACTION, "min_period": LOOP_MIN_PERIOD, "max_period": LOOP_MAX_PERIOD,
+        "min_repeats": LOOP_MIN_REPEATS,
+        "min_span": LOOP_MIN_SPAN, "max_resamples": LOOP_MAX_RESAMPLES,
+    }
+
+
+class LoopDetector:
+    """
+    Tracks, for every period p up to max_period, how many consecutive tokens
+    have equalled the token p positions earlier. A row is looping once that
+    run covers (min_repeats - 1) periods and at least min_span tokens, i.e. the
+    tail of the stream is the same p-token pattern repeated min_repeats times.
+    Periods below min_period never count, and neither does a single held code
+    matching a longer period.
+    Each push is O(batch * max_period) with no per-token Python loops.
+    """
+
+    def __init__(self, batch_size: int = 1, max_period: int = LOOP_MAX_PERIOD,
+                 min_repeats: int = LOOP_MIN_REPEATS, min_span: int = LOOP_MIN_SPAN,
+                 min_period: int = LOOP_MIN_PERIOD):
+        self.max_period = max_period
+        self.periods = np.arange(1, max_period + 1)
+        self.thresholds = np.maximum(self.periods * (min_repeats - 1), min_span)
+        # A run can never reach these thresholds
+        self.thresholds[self.periods < min_period] = np.iinfo(np.int64).max
+        # Ring buffer of the last max_period tokens of each row
+        self.history = np.full((batch_size, max_period), -1, dtype=np.int64)
+        self.runs = np.zeros((batch_size, max_period), dtype=np.int64)
+        self.position = 0
+        self.detections = np.zeros(batch_size, dtype=np.int64)
+        self.looping = np.zeros(batch_size, dtype=bool)
+        self.period = np.zeros(batch_size, dtype=np.int64)
+
+    def push(self, tokens) -> np.ndarray:
+        """Feed the next token of every row. Returns which rows just started looping"""
+        tokens = np.asarray(tokens, dtype=np.int64).reshape(-1)
+        # Token p positions back, for every p (index -1 marks "not generated yet")
+        back = self.history[:, (self.position - self.periods) % self.max_period]
+        match = (back == tokens[:, None]) & (back >= 0)
+        self.runs = np.where(match, self.runs + 1, 0)
+        self.history[:, self.position % self.max_period] = tokens
+        self.position += 1
+
+        # A held code repeats with every period: count it only as period 1
+        held = self.runs[:, :1] >= self.runs
+        held[:, 0] = False
+        hits = (self.runs >= self.thresholds) & ~held
+        looping = hits.any(axis=1)
+        started = looping & ~self.looping
+        self.looping = looping
+        # Shortest repeating period for the rows that loop
+        self.period = np.where(looping, hits.argmax(axis=1) + 1, 0)
+        if started.any():
+            self.detections += started
+            loop_stats.record("detections", int(started.sum()))
+        return started
+
+    def repeated_tail(self, row: int = 0) -> int:
+        """Tokens after the first occurrence of the current loop pattern (0 if not looping)"""
+        if not self.looping[row]:
+            return 0
+        return int(self.runs[row, self.period[row] - 1])
+
+    def continuation(self, row: int = 0) -> Optional[int]:
+        """The token that would continue the current loop of a row, if it loops"""
+        if not self.looping[row]:
+            return None
+        return int(self.history[row, (self.position - self.period[row]) % self.max_period])
+
+    def exhausted(self) -> np.ndarray:
+        """Rows still looping after LOOP_MAX_RESAMPLES resampling attempts"""
+        return self.looping & (self.detections > LOOP_MAX_RESAMPLES)
@@ -1,7 +1,11 @@
-from fastapi import FastAPI, BackgroundTasks
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from typing import Optional
+import asyncio
+import json
 import uuid
 import sys
 import os
@@ -22,15 +26,28 @@ logger = logging.getLogger(__name__)
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # Import configuration
-from config import PIPELINE_MODE
+from config import (
+    FRAGMENT_TTL_SECONDS, INFERENCE_WORKERS, JOB_STORE_SWEEP_SECONDS, JOB_TTL_SECONDS, LONG_POLL_MAX_SECONDS,
+    MAX_BATCH_STATUS_IDS, MAX_DURATION_SECONDS, SSE_HEARTBEAT_SECONDS
+)
+from job_events import TERMINAL_STATUSES, events
+from job_store import create_job_store
+from metrics import process_readings, render
+import tracing
+from audio_output import sweep_fragments, sweep_outputs
+from pipeline_factory import Readiness, load_pipeline
+from scheduler import JobScheduler
+from worker_pool import InferenceWorkerPool
 
-# Import the appropriate pipeline based on configuration
-if PIPELINE_MODE == "huggingface":
-    from yue_hf_client import run_pipeline_hq as run_pipeline
-    logger.info("Using HuggingFace pipeline (high quality, slower)")
+# Inference runs in worker processes; the API process never imports torch.
+# With INFERENCE_WORKERS = 0 the pipeline runs in-process, imported and
+# warmed up in the background after startup rather than at import time
+if INFERENCE_WORKERS > 0:
+    worker_pool = InferenceWorkerPool(INFERENCE_WORKERS)
+    readiness = None
 else:
-    from yue_client import run_pipeline
-    logger.info("Using GGUF pipeline (fast, lower quality)")
+    worker_pool = None
+    readiness = Readiness()
 
 app = FastAPI()
 
@@ -43,6 +60,21 @@ async def startup_event():
     logger.info("Backend Server Started! Logging is working.")
     logger.info(f"Outputs directory: {OUTPUT_DIR}")
     print("Backend Server Started! Logging is working.")
+    events.bind_loop(asyncio.get_running_loop())
+    # Workers warm up as they start; the server accepts requests meanwhile
+    if worker_pool is not None:
+        worker_pool.start()
+    else:
+        readiness.start()
+    recover_jobs()
+    scheduler.start()
+    asyncio.create_task(sweep_expired_jobs())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    scheduler.stop()
+    if worker_pool is not None:
+        worker_pool.stop()
 
 app.add_middleware(
     CORSMiddleware,
@@ -58,44 +90,128 @@ class GenRequest(BaseModel):
     genre: str
     prompt: str
     lyrics: str = ""
+    seed: Optional[int] = None
+    # Target length in seconds; sizes the Stage 1 token budget
+    duration: Optional[float] = Field(default=None, gt=0, le=MAX_DURATION_SECONDS)
+    priority: str = "normal"
+    client_id: Optional[str] = None
+
+job_store = create_job_store()
+
+# Snapshots of jobs still in flight; finished jobs are read back from the store
+live_snapshots = {}
+
+def _request_fields(req):
+    return req.model_dump() if hasattr(req, 'model_dump') else req.dict()
+
+# Fields copied from a job record into the public status payload
+PUBLIC_JOB_FIELDS = (
+    'result_url', 'message', 'error', 'stage', 'tokens_generated', 'fragments', 'audio_seconds', 'trace_id'
+)
+
+def _snapshot(job_id, state):
+    """Build the public status payload once per update instead of once per request"""
+    snapshot = {
+        'task_id': job_id,
+        'status': state.get('status', 'unknown'),
+        'progress': state.get('progress', 0.0),
+    }
+    for field in PUBLIC_JOB_FIELDS:
+        if field in state:
+            snapshot[field] = state[field]
+    return snapshot
 
-jobs = {}
+def _publish(record):
+    snapshot = _snapshot(record.job_id, record.state)
+    if record.status in TERMINAL_STATUSES:
+        live_snapshots.pop(record.job_id, None)
+    else:
+        live_snapshots[record.job_id] = snapshot
+    events.publish(record.job_id, snapshot)
+
+def update_job(job_id, **fields):
+    """Persist a state change to a job and push it to every listener"""
+    record = job_store.update(job_id, **fields)
+    if record is not None:
+        _publish(record)
+
+def get_snapshot(job_id):
+    snapshot = live_snapshots.get(job_id)
+    if snapshot is None:
+        record = job_store.get(job_id)
+        if record is None:
+            return None
+        snapshot = _snapshot(job_id, record.state)
+    return snapshot
+
+async def get_snapshot_async(job_id):
+    """get_snapshot for request handlers: a job store read runs off the event loop"""
+    snapshot = live_snapshots.get(job_id)
+    if snapshot is None:
+        snapshot = await asyncio.to_thread(get_snapshot, job_id)
+    return snapshot
 
 def task_wrapper(job_id, req):
     logger.info(f"Starting job {job_id} with prompt: {req.prompt[:50]}...")
+
+    def on_progress(stage, progress, **info):
+        # Audio fragment announcements carry neither a stage nor a progress value
+        if stage is not None:
+            info['stage'] = stage
+        if progress is not None:
+            info['progress'] = progress
+        update_job(job_id, **info)
+
+    trace_id = tracing.new_trace_id()
     try:
-        jobs[job_id]['status'] = 'processing'
-        jobs[job_id]['progress'] = 0.1
+        update_job(job_id, status='processing', progress=0.05, stage='starting', trace_id=trace_id)
         # Chiama la funzione pesante
         # Mappiamo: req.prompt -> mood, req.lyrics -> prompt_text
-        jobs[job_id]['progress'] = 0.3
-        result_path = run_pipeline(req.lyrics, req.genre, req.prompt)
+        args = (req.lyrics, req.genre, req.prompt)
+        kwargs = {'seed': req.seed, 'duration': req.duration}
+        # The root span ends before the final update, so clients that see the
+        # job finish also get the complete trace summary
+        with tracing.span("job", parent=(trace_id, None), job_id=job_id, genre=req.genre,
+                          duration=req.duration, seed=req.seed):
+            if worker_pool is not None:
+                result_path = worker_pool.run(job_id, args, kwargs, on_progress)
+            else:
+                result_path = load_pipeline()(*args, progress_callback=on_progress, **kwargs)
         if result_path:
             logger.info(f"Job {job_id} completed successfully. Result: {result_path}")
-            jobs[job_id]['status'] = 'completed'
-            jobs[job_id]['progress'] = 1.0
-            jobs[job_id]['result_url'] = f"/outputs/{result_path}" if result_path else None
-            jobs[job_id]['message'] = f"Successfully generated: {result_path}"
+            update_job(
+                job_id,
+                status='completed',
+                progress=1.0,
+                stage='done',
+                result_url=f"/outputs/{result_path}",
+                message=f"Successfully generated: {result_path}"
+            )
         else:
             logger.error(f"Job {job_id} failed: Pipeline returned None")
-            jobs[job_id]['status'] = 'failed'
-            jobs[job_id]['progress'] = 0.0
-            jobs[job_id]['error'] = 'Pipeline returned None'
+            update_job(job_id, status='failed', progress=0.0, error='Pipeline returned None')
     except Exception as e:
         logger.error(f"Job {job_id} failed with exception: {e}", exc_info=True)
-        jobs[job_id]['status'] = 'failed'
-        jobs[job_id]['progress'] = 0.0
-        jobs[job_id]['error'] = str(e)
+        update_job(job_id, status='failed', progress=0.0, error=str(e))
+
+# Heavy pipelines run on a bounded worker pool instead of one thread per request
+scheduler = JobScheduler(task_wrapper)
 
 @app.post("/api/generate")
-async def generate(req: GenRequest, bg_tasks: BackgroundTasks):
+async def generate(req: GenRequest, request: Request):
     job_id = str(uuid.uuid4())
-    jobs[job_id] = {
-        'status': 'queued',
-        'progress': 0.0,
-        'task_id': job_id
-    }
-    bg_tasks.add_task(task_wrapper, job_id, req)
+    # Fairness is per client: fall back to the caller address when no id is given
+    client_id = req.client_id or (request.client.host if request.client else "anonymous")
+    record = await asyncio.to_thread(
+        job_store.create,
+        job_id,
+        {'status': 'queued', 'progress': 0.0},
+        _request_fields(req),
+        priority=req.priority,
+        client_id=client_id
+    )
+    _publish(record)
+    scheduler.submit(job_id, req, priority=req.priority, client_id=client_id)
     logger.info(f"Created job {job_id}")
     return {
         "task_id": job_id,
@@ -103,30 +219,156 @@ async def generate(req: GenRequest, bg_tasks: BackgroundTasks):
         "message": "Task created successfully"
     }
 
-@app.get("/api/status/{job_id}")
-async def status(job_id: str):
-    job = jobs.get(job_id, None)
-    if not job:
-        return {
-            'task_id': job_id,
-            'status': 'not_found',
-            'progress': 0.0,
-            'error': 'Task not found'
-        }
-
-    # Ensure all required fields are present
-    response = {
+def recover_jobs():
+    """Re-queue jobs that were queued or running when the server stopped"""
+    records = job_store.unfinished()
+    for record in records:
+        record = job_store.update(record.job_id, status='queued', progress=0.0, stage='recovered')
+        _publish(record)
+        scheduler.submit(record.job_id, GenRequest(**record.request),
+                         priority=record.priority, client_id=record.client_id)
+    if records:
+        logger.info(f"Recovered {len(records)} unfinished job(s) from the job store")
+
+async def sweep_expired_jobs():
+    """Periodically drop finished jobs older than the TTL"""
+    while True:
+        try:
+            expired = await asyncio.to_thread(job_store.expire, JOB_TTL_SECONDS)
+            for job_id in expired:
+                events.forget(job_id)
+            if expired:
+                logger.info(f"Expired {len(expired)} finished job(s)")
+            removed = await asyncio.to_thread(sweep_fragments, FRAGMENT_TTL_SECONDS)
+            if removed:
+                logger.info(f"Removed {removed} expired audio fragment set(s)")
+            # Every job writes its own file: songs go once their jobs have expired
+            removed = await asyncio.to_thread(sweep_outputs, JOB_TTL_SECONDS)
+            if removed:
+                logger.info(f"Removed {removed} expired song(s)")
+        except Exception as e:
+            logger.error(f"Job store sweep failed: {e}", exc_info=True)
+        await asyncio.sleep(JOB_STORE_SWEEP_SECONDS)
+
+def _not_found(job_id):
+    return {
         'task_id': job_id,
-        'status': job.get('status', 'unknown'),
-        'progress': job.get('progress', 0.0),
+        'status': 'not_found',
+        'progress': 0.0,
+        'error': 'Task not found'
     }
 
-    if 'result_url' in job:
-        response['result_url'] = job['result_url']
-    if 'message' in job:
-        response['message'] = job['message']
-    if 'error' in job:
-        response['error'] = job['error']
+def _with_trace(response):
+    """Add the trace summary of the job (time per span name) when there is one"""
+    trace = tracing.summary(response['trace_id']) if 'trace_id' in response else None
+    if trace is None:
+        return response
+    return dict(response, trace=trace)
 
-    logger.info(f"Status check for {job_id}: {response['status']} ({response['progress']*100}%)")
+def _with_queue_info(job_id, snapshot):
+    """Add the live queue position/ETA, which change without a job update"""
+    if snapshot['status'] not in ('queued', 'processing'):
+        return snapshot
+    response = dict(snapshot)
+    position = scheduler.position(job_id)
+    if position is not None:
+        response['queue_position'] = position
+    eta = scheduler.eta(job_id)
+    if eta is not None:
+        response['eta_seconds'] = round(eta, 1)
     return response
+
+@app.get("/api/status")
+async def status_batch(ids: str):
+    """Status of several jobs at once: /api/status?ids=<id1>,<id2>,..."""
+    job_ids = [i for i in ids.split(',') if i][:MAX_BATCH_STATUS_IDS]
+    missing = [i for i in job_ids if i not in live_snapshots]
+    stored = await asyncio.to_thread(job_store.get_many, missing) if missing else {}
+    tasks = []
+    for job_id in job_ids:
+        snapshot = live_snapshots.get(job_id)
+        if snapshot is None and job_id in stored:
+            snapshot = _snapshot(job_id, stored[job_id].state)
+        tasks.append(_with_trace(_with_queue_info(job_id, snapshot)) if snapshot else _not_found(job_id))
+    return {'tasks': tasks}
+
+def _etag(job_id):
+    return f'"{job_id}-{events.version(job_id)}"'
+
+@app.get("/api/status/{job_id}")
+async def status(job_id: str, request: Request, wait: float = 0.0):
+    """
+    Current job status. Supports conditional requests: with If-None-Match set to
+    the last ETag, `wait` seconds of long-polling are spent waiting for a change
+    before answering 304 Not Modified.
+    """
+    snapshot = await get_snapshot_async(job_id)
+    if snapshot is None:
+        return _not_found(job_id)
+
+    version = events.version(job_id)
+    if request.headers.get('if-none-match') == _etag(job_id):
+        if wait <= 0 or snapshot['status'] in TERMINAL_STATUSES:
+            return Response(status_code=304, headers={'ETag': _etag(job_id)})
+        changed = await events.wait_for_update(job_id, version, min(wait, LONG_POLL_MAX_SECONDS))
+        if not changed:
+            return Response(status_code=304, headers={'ETag': _etag(job_id)})
+
+    response = _with_trace(_with_queue_info(job_id, await get_snapshot_async(job_id)))
+    logger.debug(f"Status check for {job_id}: {response['status']} ({response['progress']*100}%)")
+    return JSONResponse(response, headers={'ETag': _etag(job_id)})
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the server is up and answering"""
+    return {'status': 'ok'}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: 200 once the pipeline is imported and its models are warm, 503 before"""
+    state = worker_pool.readiness() if worker_pool is not None else readiness.describe()
+    return JSONResponse(state, status_code=200 if state['status'] == 'ready' else 503)
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus metrics: stage timings, queues, resident models, memory"""
+    readings = [
+        ("yue_scheduler_queue_depth", {}, scheduler.queue_depth()),
+        ("yue_scheduler_running_jobs", {}, scheduler.running_count()),
+    ]
+    readings += [(name, dict(labels, process="api"), value) for name, labels, value in process_readings()]
+    if worker_pool is not None:
+        readings += worker_pool.readings()
+    return Response(render(readings), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/events/{job_id}")
+async def job_events(job_id: str):
+    """Server-Sent Events stream of job updates, closed once the job finishes"""
+    if await get_snapshot_async(job_id) is None:
+        return JSONResponse(_not_found(job_id), status_code=404)
+
+    async def stream():
+        queue = events.subscribe(job_id)
+        try:
+            snapshot = await get_snapshot_async(job_id)
+            yield _sse('status', _with_queue_info(job_id, snapshot))
+            while snapshot['status'] not in TERMINAL_STATUSES:
+                try:
+                    snapshot = await asyncio.wait_for(queue.get(), SSE_HEARTBEAT_SECONDS)
+                    yield _sse('status', snapshot)
+                except asyncio.TimeoutError:
+                    # Heartbeat keeps proxies from closing the stream and
+                    # refreshes the queue position of waiting jobs
+                    snapshot = await get_snapshot_async(job_id) or snapshot
+                    yield _sse('status', _with_queue_info(job_id, snapshot))
+        finally:
+            events.unsubscribe(job_id, queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
@@ -0,0 +1,224 @@
+"""
+Pipeline Metrics
+Histograms of the time spent in each part of the generation pipeline and
+point-in-time gauges (queues, resident models, memory), rendered in the
+Prometheus text format for GET /metrics. Inference worker processes forward
+their observations to the API process, which owns the histograms
+"""
+import bisect
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from config import TRACE_TOKEN_SAMPLE_INTERVAL
+
+# (name, labels, value) of one gauge or counter reading
+Sample = Tuple[str, Dict[str, str], float]
+
+_SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+_LOAD_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+_RATE_BUCKETS = (1.0, 2.5, 5.0, 10.0, 25.0, 50.0, 75.0, 100.0, 150.0, 200.0, 300.0, 500.0)
+
+# name -> (help, buckets)
+HISTOGRAMS = {
+    "yue_model_load_seconds": ("Time to load a model into memory", _LOAD_BUCKETS),
+    "yue_stage1_prefill_seconds": ("Stage 1 time from prompt to the first generated token", _SECONDS_BUCKETS),
+    "yue_stage1_tokens_per_second": ("Stage 1 decoding throughput after the first token", _RATE_BUCKETS),
+    "yue_codec_decode_seconds": ("XCodec decode_code call time (one window batch)", _SECONDS_BUCKETS),
+    "yue_resample_seconds": ("Resampling compute time of one audio stream", _SECONDS_BUCKETS),
+    "yue_wav_write_seconds": ("Time to write a finished WAV file", _SECONDS_BUCKETS),
+    "yue_pipeline_stage_seconds": ("Time a job spends running in a pipeline stage", _SECONDS_BUCKETS),
+    "yue_job_queue_wait_seconds": ("Time a job waits in the scheduler queue", _SECONDS_BUCKETS),
+    "yue_job_seconds": ("Total run time of a job once started", _SECONDS_BUCKETS),
+}
+
+# name -> (type, help) of the values read at scrape time
+READINGS = {
+    "yue_scheduler_queue_depth": ("gauge", "Jobs waiting in the scheduler queue"),
+    "yue_scheduler_running_jobs": ("gauge", "Jobs currently running"),
+    "yue_pipeline_stage_queue_depth": ("gauge", "Jobs waiting for a pipeline stage"),
+    "yue_pipeline_stage_running": ("gauge", "Jobs running in a pipeline stage"),
+    "yue_model_resident": ("gauge", "1 for every model currently loaded"),
+    "yue_model_memory_bytes": ("gauge", "Memory held by resident models"),
+    "yue_process_resident_memory_bytes": ("gauge", "Resident set size of the process"),
+    "yue_stage1_loop_events_total": ("counter", "Stage 1 loop detector events"),
+}
+
+
+class _Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+_histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], _Histogram] = {}
+_lock = threading.Lock()
+_forwarder: Optional[Callable[[str, float, Dict[str, str]], None]] = None
+
+
+def set_forwarder(forward: Optional[Callable[[str, float, Dict[str, str]], None]]):
+    """Send observations to forward(name, value, labels) instead of recording them here"""
+    global _forwarder
+    _forwarder = forward
+
+
+def observe(name: str, value: float, **labels: Any):
+    """Record one observation of the histogram `name`"""
+    labels = {key: str(label) for key, label in labels.items()}
+    if _forwarder is not None:
+        _forwarder(name, value, labels)
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = _Histogram(HISTOGRAMS[name][1])
+        histogram.observe(value)
+
+
+@contextmanager
+def timed(name: str, **labels: Any):
+    """Observe the wall time of the block"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+class GenerationTimer:
+    """
+    Prefill time and decoding throughput of one Stage 1 generate call. Every
+    TRACE_TOKEN_SAMPLE_INTERVAL steps a timing event is added to the trace
+    spans of the jobs in the call
+    """
+
+    def __init__(self, pipeline: str, spans: Sequence[Any] = ()):
+        self.pipeline = pipeline
+        self.spans = [span for span in spans if span is not None]
+        self.start = time.perf_counter()
+        self.first_token: Optional[float] = None
+        self.steps = 0
+        self.tokens = 0
+
+    def tokens_sampled(self, count: int = 1):
+        """Call once per decoding step with the number of tokens it produced"""
+        now = time.perf_counter()
+        self.steps += 1
+        if self.first_token is None:
+            self.first_token = now
+            observe("yue_stage1_prefill_seconds", now - self.start, pipeline=self.pipeline)
+            for span in self.spans:
+                span.add_event("first_token", prefill_ms=round((now - self.start) * 1000, 2))
+            return
+        self.tokens += count
+        if self.spans and self.steps % TRACE_TOKEN_SAMPLE_INTERVAL == 0:
+            for span in self.spans:
+                span.add_event("tokens", steps=self.steps,
+                               elapsed_ms=round((now - self.start) * 1000, 2))
+
+    def finish(self):
+        if self.first_token is None or self.tokens == 0:
+            return
+        elapsed = time.perf_counter() - self.first_token
+        if elapsed > 0:
+            observe("yue_stage1_tokens_per_second", self.tokens / elapsed, pipeline=self.pipeline)
+
+
+def _rss_bytes() -> Optional[int]:
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def process_readings() -> List[Sample]:
+    """Gauges and counters of this process: pipeline stages, models, memory, loops"""
+    # Imported here: these modules record metrics themselves
+    from loop_detector import loop_stats
+    from model_manager import GB, get_model_manager
+    from stage_pipeline import pipeline_stats
+
+    samples: List[Sample] = []
+    for pipeline, stages in pipeline_stats().items():
+        for stage, stats in stages.items():
+            labels = {"pipeline": pipeline, "stage": stage}
+            samples.append(("yue_pipeline_stage_queue_depth", labels, stats["queued"]))
+            samples.append(("yue_pipeline_stage_running", labels, stats["running"]))
+
+    models = get_model_manager().stats()
+    for model in models["resident"]:
+        samples.append(("yue_model_resident", {"model": model}, 1))
+    samples.append(("yue_model_memory_bytes", {"device": "vram"}, models["vram_used_gb"] * GB))
+    samples.append(("yue_model_memory_bytes", {"device": "ram"}, models["ram_used_gb"] * GB))
+
+    rss = _rss_bytes()
+    if rss is not None:
+        samples.append(("yue_process_resident_memory_bytes", {}, rss))
+    for event, count in loop_stats.snapshot().items():
+        samples.append(("yue_stage1_loop_events_total", {"event": event}, count))
+    return samples
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels.items():
+        value = value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    value = float(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value) if value != int(value) else str(int(value))
+
+
+def render(readings: List[Sample]) -> str:
+    """Prometheus text exposition of every histogram plus the given readings"""
+    lines = []
+    with _lock:
+        histograms = sorted(_histograms.items())
+        for name, (help_text, buckets) in HISTOGRAMS.items():
+            series = [(dict(labels), h) for (n, labels), h in histograms if n == name]
+            if not series:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, histogram in series:
+                cumulative = 0
+                for bound, count in zip(buckets + (float("inf"),), histogram.counts):
+                    cumulative += count
+                    le = _format_value(bound)
+                    lines.append(f"{name}_bucket{_format_labels(dict(labels, le=le))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(histogram.sum)}")
+                lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+
+    for name, (kind, help_text) in READINGS.items():
+        series = [(labels, value) for n, labels, value in readings if n == name]
+        if not series:
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in series:
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,300 @@
+"""
+Model Residency Manager
+Keeps YuE Stage 1, Stage 2 and the XCodec model loaded between jobs and
+evicts them least-recently-used first only when a RAM/VRAM budget would be exceeded
+"""
+import gc
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from config import MODEL_RAM_BUDGET_GB, MODEL_VRAM_BUDGET_GB
+from metrics import timed
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+GB = 1024 ** 3
+
+
+def _cuda_available() -> bool:
+    try:
+        import torch
+        return torch.cuda.is_available()
+    except ImportError:
+        return False
+
+
+def _free_memory():
+    """Release Python garbage and cached CUDA blocks after an eviction"""
+    with span("model.free_memory"):
+        gc.collect()
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+
+
+def measure_model_bytes(value: Any) -> Tuple[int, int]:
+    """
+    Measure the memory held by a loaded model (or a tuple of models)
+    Returns: (vram_bytes, ram_bytes)
+    """
+    if isinstance(value, (tuple, list)):
+        vram, ram = 0, 0
+        for item in value:
+            item_vram, item_ram = measure_model_bytes(item)
+            vram += item_vram
+            ram += item_ram
+        return vram, ram
+
+    if not hasattr(value, "parameters"):
+        return 0, 0
+
+    vram, ram = 0, 0
+    tensors = list(value.parameters())
+    if hasattr(value, "buffers"):
+        tensors += list(value.buffers())
+    for tensor in tensors:
+        size = tensor.numel() * tensor.element_size()
+        if tensor.device.type == "cuda":
+            vram += size
+        else:
+            ram += size
+    return vram, ram
+
+
+class _Registration:
+    def __init__(self, loader: Callable[[], Any], size_gb: float,
+                 unloader: Optional[Callable[[Any], None]]):
+        self.loader = loader
+        self.size_gb = size_gb
+        self.unloader = unloader
+
+
+class _Resident:
+    def __init__(self, value: Any, vram_bytes: int, ram_bytes: int):
+        self.value = value
+        self.vram_bytes = vram_bytes
+        self.ram_bytes = ram_bytes
+        self.pins = 0
+
+
+class _Loading:
+    """A load in progress: its budget reservation and the event waiters block on"""
+
+    def __init__(self, vram_bytes: int, ram_bytes: int):
+        self.vram_bytes = vram_bytes
+        self.ram_bytes = ram_bytes
+        self.done = threading.Event()
+        self.error: Optional[BaseException] = None
+
+
+class ModelResidencyManager:
+    """
+    LRU cache of loaded models bounded by a RAM and a VRAM budget
+
+    Loaders run outside the manager lock: a load of several minutes only
+    blocks the callers waiting for that same model. Its estimated size is
+    reserved (and room made for it) before it starts
+    """
+
+    def __init__(self, vram_budget_gb: float = MODEL_VRAM_BUDGET_GB,
+                 ram_budget_gb: float = MODEL_RAM_BUDGET_GB):
+        self.vram_budget = int(vram_budget_gb * GB)
+        self.ram_budget = int(ram_budget_gb * GB)
+        self._registry: Dict[str, _Registration] = {}
+        self._resident: "OrderedDict[str, _Resident]" = OrderedDict()
+        self._loading: Dict[str, _Loading] = {}
+        self._lock = threading.RLock()
+
+    def register(self, name: str, loader: Callable[[], Any], size_gb: float,
+                 unloader: Optional[Callable[[Any], None]] = None):
+        """
+        Register a model loader
+
+        Args:
+            name: Key used to acquire the model
+            loader: Callable returning the loaded model (raises on failure)
+            size_gb: Estimated footprint, used to make room before loading
+            unloader: Optional callable invoked with the model on eviction
+        """
+        with self._lock:
+            self._registry[name] = _Registration(loader, size_gb, unloader)
+
+    def is_registered(self, name: str) -> bool:
+        return name in self._registry
+
+    def is_resident(self, name: str) -> bool:
+        with self._lock:
+            return name in self._resident
+
+    def acquire(self, name: str) -> Any:
+        """Return the model, loading it (and evicting others) if needed"""
+        return self._acquire(name, pin=False)
+
+    def _acquire(self, name: str, pin: bool) -> Any:
+        while True:
+            with self._lock:
+                resident = self._resident.get(name)
+                if resident is not None:
+                    self._resident.move_to_end(name)
+                    if pin:
+                        resident.pins += 1
+                    logger.info(f"Model '{name}' already resident, reusing")
+                    return resident.value
+
+                loading = self._loading.get(name)
+                if loading is None:
+                    registration = self._registry.get(name)
+                    if registration is None:
+                        raise KeyError(f"Model '{name}' is not registered")
+                    estimate = int(registration.size_gb * GB)
+                    if _cuda_available():
+                        self._make_room(vram_needed=estimate, ram_needed=0)
+                        loading = _Loading(estimate, 0)
+                    else:
+                        self._make_room(vram_needed=0, ram_needed=estimate)
+                        loading = _Loading(0, estimate)
+                    self._loading[name] = loading
+                    break
+
+            # Another caller is loading it: wait, then take the resident model
+            loading.done.wait()
+            if loading.error is not None:
+                raise RuntimeError(f"Loading model '{name}' failed: {loading.error}") from loading.error
+
+        try:
+            logger.info(f"Loading model '{name}' (~{registration.size_gb:.1f} GB)...")
+            with span("model.load", model=name), timed("yue_model_load_seconds", model=name):
+                value = registration.loader()
+        except BaseException as e:
+            with self._lock:
+                del self._loading[name]
+            loading.error = e
+            loading.done.set()
+            raise
+
+        vram_bytes, ram_bytes = measure_model_bytes(value)
+        if vram_bytes == 0 and ram_bytes == 0:
+            # Opaque objects (e.g. llama.cpp handles): trust the estimate
+            vram_bytes, ram_bytes = loading.vram_bytes, loading.ram_bytes
+        with self._lock:
+            del self._loading[name]
+            resident = self._resident[name] = _Resident(value, vram_bytes, ram_bytes)
+            if pin:
+                resident.pins += 1
+            logger.info(
+                f"Model '{name}' resident: {vram_bytes / GB:.2f} GB VRAM, "
+                f"{ram_bytes / GB:.2f} GB RAM"
+            )
+            # The estimate may have been too low: settle the budget now
+            self._make_room(vram_needed=0, ram_needed=0, keep=name)
+        loading.done.set()
+        return value
+
+    @contextmanager
+    def use(self, name: str):
+        """Acquire a model and pin it so it cannot be evicted while in use"""
+        value = self._acquire(name, pin=True)
+        try:
+            yield value
+        finally:
+            with self._lock:
+                resident = self._resident.get(name)
+                if resident is not None:
+                    resident.pins -= 1
+
+    def evict(self, name: str) -> bool:
+        """Unload a model explicitly. Returns False if it is not resident or pinned"""
+        with self._lock:
+            resident = self._resident.get(name)
+            if resident is None:
+                return False
+            if resident.pins > 0:
+                logger.warning(f"Model '{name}' is in use, not evicting")
+                return False
+            self._unload(name)
+            _free_memory()
+            return True
+
+    def evict_all(self):
+        with self._lock:
+            for name in list(self._resident):
+                if self._resident[name].pins == 0:
+                    self._unload(name)
+            _free_memory()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            vram_used, ram_used = self._usage()
+            return {
+                "resident": list(self._resident),
+                "vram_used_gb": vram_used / GB,
+                "ram_used_gb": ram_used / GB,
+                "vram_budget_gb": self.vram_budget / GB,
+                "ram_budget_gb": self.ram_budget / GB,
+            }
+
+    def _usage(self) -> Tuple[int, int]:
+        """Memory of the resident models plus the reservations of loads in progress"""
+        entries = list(self._resident.values()) + list(self._loading.values())
+        vram = sum(entry.vram_bytes for entry in entries)
+        ram = sum(entry.ram_bytes for entry in entries)
+        return vram, ram
+
+    def _make_room(self, vram_needed: int, ram_needed: int, keep: Optional[str] = None):
+        """Evict LRU models until the new allocation fits in both budgets"""
+        evicted = False
+        while True:
+            vram_used, ram_used = self._usage()
+            if vram_used + vram_needed <= self.vram_budget and ram_used + ram_needed <= self.ram_budget:
+                break
+            victim = next(
+                (n for n, r in self._resident.items() if r.pins == 0 and n != keep),
+                None
+            )
+            if victim is None:
+                logger.warning(
+                    "Model budget exceeded but every resident model is in use; "
+                    "continuing over budget"
+                )
+                break
+            logger.info(f"Evicting model '{victim}' to stay within memory budget")
+            self._unload(victim)
+            evicted = True
+        if evicted:
+            _free_memory()
+
+    def _unload(self, name: str):
+        with span("model.unload", model=name):
+            self._unload_resident(name)
+
+    def _unload_resident(self, name: str):
+        resident = self._resident.pop(name)
+        registration = self._registry.get(name)
+        if registration is not None and registration.unloader is not None:
+            try:
+                registration.unloader(resident.value)
+            except Exception as e:
+                logger.warning(f"Unloader for '{name}' failed: {e}")
+        del resident
+        logger.info(f"Model '{name}' unloaded")
+
+
+# Global manager instance shared by all pipelines
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_model_manager() -> ModelResidencyManager:
+    global _manager
+
+    with _manager_lock:
+        if _manager is None:
+            _manager = ModelResidencyManager()
+        return _manager
@@ -26,5 +26,13 @@ class TaskStatusResponse(BaseModel):
     progress: float
     result_url: Optional[str] = None
     stems_url: Optional[Dict[str, str]] = None
+    # Progressive audio: fragment URLs in playback order and the seconds they cover
+    fragments: Optional[List[str]] = None
+    audio_seconds: Optional[float] = None
     error: Optional[str] = None
     message: Optional[str] = None
+    queue_position: Optional[int] = None
+    eta_seconds: Optional[float] = None
+    # Tracing: the job's trace ID and time per span name (see tracing.summary)
+    trace_id: Optional[str] = None
+    trace: Optional[Dict[str, Any]] = None
@@ -0,0 +1,117 @@
+"""
+Pipeline Factory
+Imports the configured generation pipeline (torch, transformers, llama.cpp)
+on first use instead of when the server module is imported, and warms its
+models up in the background so readiness can be reported separately from
+liveness
+"""
+import glob
+import importlib.util
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from config import PIPELINE_MODE, WARMUP_ON_STARTUP
+from warmup import configure_compile_cache, warm_up
+
+logger = logging.getLogger(__name__)
+
+_pipeline: Optional[Callable[..., Optional[str]]] = None
+_pipeline_lock = threading.Lock()
+_native_libraries_ready = False
+
+
+def prepare_native_libraries():
+    """
+    Windows only: put torch's lib directory and the nvidia/*/bin directories
+    of the CUDA wheels on the DLL search path, so llama.cpp's CUDA build finds
+    cuBLAS/cuDNN. Done once, right before the pipeline is imported
+    """
+    global _native_libraries_ready
+
+    if _native_libraries_ready or not hasattr(os, "add_dll_directory"):
+        return
+    _native_libraries_ready = True
+    try:
+        spec = importlib.util.find_spec("torch")
+        if spec is None or spec.origin is None:
+            return
+        torch_dir = os.path.dirname(spec.origin)
+        nvidia_dir = os.path.join(os.path.dirname(torch_dir), "nvidia")
+        # The CUDA wheels keep their DLLs in nvidia/<library>/bin: no need to walk the tree
+        for path in [os.path.join(torch_dir, "lib")] + sorted(glob.glob(os.path.join(nvidia_dir, "*", "bin"))):
+            if os.path.isdir(path):
+                os.add_dll_directory(path)
+                os.environ["PATH"] = path + os.pathsep + os.environ["PATH"]
+                logger.info(f"Added DLL directory: {path}")
+    except Exception as e:
+        logger.warning(f"Could not add DLL paths: {e}")
+
+
+def load_pipeline() -> Callable[..., Optional[str]]:
+    """The run_pipeline function of the configured PIPELINE_MODE (imported on first call)"""
+    global _pipeline
+
+    with _pipeline_lock:
+        if _pipeline is None:
+            prepare_native_libraries()
+            configure_compile_cache()
+            if PIPELINE_MODE == "huggingface":
+                from yue_hf_client import run_pipeline_hq as run_pipeline
+                logger.info("Using HuggingFace pipeline (high quality, slower)")
+            else:
+                from yue_client import run_pipeline
+                logger.info("Using GGUF pipeline (fast, lower quality)")
+            _pipeline = run_pipeline
+        return _pipeline
+
+
+def warm_up_pipeline() -> bool:
+    """Import the pipeline and run the warm-up pass (see warmup.py). Returns False on failure"""
+    load_pipeline()
+    return warm_up()
+
+
+class Readiness:
+    """Warm-up state of this process: "cold", "warming", "ready" or "failed" """
+
+    def __init__(self):
+        self.status = "cold"
+        self.error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Warm up on a background thread (no-op if already started)"""
+        with self._lock:
+            if self.status != "cold":
+                return
+            self.status = "warming"
+        threading.Thread(target=self.run, name="pipeline-warm-up", daemon=True).start()
+
+    def run(self):
+        """Warm up on the calling thread"""
+        with self._lock:
+            self.status = "warming"
+        try:
+            # Without warm-up only the import happens here; models load on the first job
+            ok = warm_up_pipeline() if WARMUP_ON_STARTUP else load_pipeline() is not None
+            error = None if ok else "model warm-up failed"
+        except Exception as e:
+            logger.error(f"Pipeline warm-up failed: {e}", exc_info=True)
+            ok, error = False, str(e)
+        with self._lock:
+            self.status = "ready" if ok else "failed"
+            self.error = error
+        logger.info(f"Pipeline warm-up finished: {self.status}")
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    def describe(self) -> Dict[str, Any]:
+        with self._lock:
+            state = {"status": self.status}
+            if self.error:
+                state["error"] = self.error
+            return state
@@ -0,0 +1,77 @@
+"""
+Prompt Prefix Cache
+LRU cache of attention state (HF past_key_values or llama.cpp state
+snapshots) keyed by the tokenized "[Genre] … [Mood] … [Lyrics]" header,
+so requests repeating a header skip its prefill
+"""
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Optional, Sequence, Tuple
+
+from config import PREFIX_CACHE_MAX_MB
+
+logger = logging.getLogger(__name__)
+
+
+def prompt_header(genre: str, mood: str) -> str:
+    """The shared scaffold every YuE Stage 1 prompt starts with"""
+    return f"[Genre] {genre}\n[Mood] {mood}\n[Lyrics]\n"
+
+
+def stage1_prompt(header: str, lyrics: str) -> str:
+    """Full Stage 1 prompt: generation starts right after <SOA>"""
+    return f"{header}{lyrics}\n<SOA>"
+
+
+def tensor_bytes(value: Any) -> int:
+    """Memory held by a KV cache (DynamicCache, legacy tuples or tensors)"""
+    if hasattr(value, "to_legacy_cache"):
+        value = value.to_legacy_cache()
+    if isinstance(value, (tuple, list)):
+        return sum(tensor_bytes(item) for item in value)
+    if hasattr(value, "element_size") and hasattr(value, "numel"):
+        return value.element_size() * value.numel()
+    return 0
+
+
+class PrefixCache:
+    """LRU map from prefix token ids to a reusable attention state, bounded in bytes"""
+
+    def __init__(self, max_mb: float = PREFIX_CACHE_MAX_MB):
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._entries: "OrderedDict[Tuple[int, ...], Tuple[Any, int]]" = OrderedDict()
+        self._used = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, tokens: Sequence[int]) -> Optional[Any]:
+        key = tuple(tokens)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, tokens: Sequence[int], state: Any, nbytes: int):
+        key = tuple(tokens)
+        if nbytes > self.max_bytes:
+            logger.info(f"Prefix state of {nbytes / 1e6:.1f} MB exceeds the cache budget, not cached")
+            return
+        with self._lock:
+            if key in self._entries:
+                self._used -= self._entries.pop(key)[1]
+            while self._entries and self._used + nbytes > self.max_bytes:
+                _, (_, evicted_bytes) = self._entries.popitem(last=False)
+                self._used -= evicted_bytes
+            self._entries[key] = (state, nbytes)
+            self._used += nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._used = 0
@@ -0,0 +1,146 @@
+"""
+Progressive Audio
+Decodes Stage 1 codes with XCodec while Stage 1 is still generating and
+publishes the audio as short WAV fragments, so clients can start playback
+long before the full song exists
+"""
+import logging
+import os
+import queue
+import threading
+import uuid
+from typing import Callable, List, Optional
+
+import numpy as np
+import scipy.io.wavfile
+
+from audio_output import FRAGMENT_DIR
+from config import (
+    PROGRESSIVE_CHUNK_FRAMES, PROGRESSIVE_FRAGMENT_SECONDS, XCODEC_CHUNK_FRAMES, XCODEC_OVERLAP_FRAMES
+)
+from resampler import StreamingResampler
+from tracing import span
+from xcodec_real_decoder import XCodecStreamDecoder, fit_duration, load_xcodec_model, normalize_audio
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class ProgressiveAudio:
+    """
+    Background decoder fed with codes as Stage 1 emits them
+
+    feed() only enqueues, so the generation loop is never slowed down by the
+    codec. Every PROGRESSIVE_FRAGMENT_SECONDS of decoded audio is written as a
+    fragment and announced through on_fragment(urls, audio_seconds), where
+    urls lists every fragment so far in playback order.
+
+    With shorter windows than XCODEC_CHUNK_FRAMES the fragments are a preview
+    only (more crossfade seams) and the song is decoded again. With the same
+    windows, song() hands back the preview audio so XCodec runs once per job.
+    """
+
+    def __init__(self, on_fragment: Callable[[List[str], float], None], sample_rate: int = 44100):
+        self.on_fragment = on_fragment
+        self.sample_rate = sample_rate
+        self.tag = uuid.uuid4().hex
+        self.directory = os.path.join(FRAGMENT_DIR, self.tag)
+        self._queue: "queue.Queue" = queue.Queue()
+        self._urls: List[str] = []
+        self._pending: List[np.ndarray] = []
+        self._pending_samples = 0
+        self._total_samples = 0
+        # Everything decoded so far, kept only when it can become the song
+        self._reusable = PROGRESSIVE_CHUNK_FRAMES == XCODEC_CHUNK_FRAMES
+        self._codes: List[np.ndarray] = []
+        self._blocks: List[np.ndarray] = []
+        self._failed = False
+        self._thread = threading.Thread(target=self._run, name="progressive-decoder", daemon=True)
+        self._thread.start()
+
+    def feed(self, codes):
+        """Queue newly generated codes (a code or an array of codes)"""
+        self._queue.put(np.asarray(codes, dtype=np.int64).reshape(-1))
+
+    def _write_fragment(self):
+        audio = np.concatenate(self._pending)
+        self._pending = []
+        self._pending_samples = 0
+        filename = f"{len(self._urls):04d}.wav"
+        audio_int16 = np.int16(np.clip(audio, -1.0, 1.0) * 32767)
+        scipy.io.wavfile.write(os.path.join(self.directory, filename), self.sample_rate, audio_int16)
+        self._urls.append(f"/outputs/fragments/{self.tag}/{filename}")
+        self.on_fragment(list(self._urls), self._total_samples / self.sample_rate)
+
+    def _add(self, blocks):
+        fragment_samples = int(PROGRESSIVE_FRAGMENT_SECONDS * self.sample_rate)
+        for block in blocks:
+            if not len(block):
+                continue
+            if self._reusable:
+                self._blocks.append(block)
+            self._pending.append(block)
+            self._pending_samples += len(block)
+            self._total_samples += len(block)
+        if self._pending_samples >= fragment_samples:
+            self._write_fragment()
+
+    def _run(self):
+        try:
+            model, processor = load_xcodec_model()
+            if model is None:
+                raise RuntimeError("XCodec model not available")
+            os.makedirs(self.directory, exist_ok=True)
+            decoder = XCodecStreamDecoder(model, PROGRESSIVE_CHUNK_FRAMES, XCODEC_OVERLAP_FRAMES)
+            resampler = StreamingResampler(processor.get('sampling_rate', 16000), self.sample_rate)
+            done = False
+            while not done:
+                # Take everything queued so far: one decode call per window, not per token
+                items = [self._queue.get()]
+                while True:
+                    try:
+                        items.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if items[-1] is _DONE:
+                    items.pop()
+                    done = True
+                if items:
+                    codes = np.concatenate(items)
+                    if self._reusable:
+                        self._codes.append(codes)
+                    blocks = decoder.feed(codes)
+                    self._add([resampler.process(block) for block in blocks])
+            self._add([resampler.process(block) for block in decoder.flush()] + [resampler.flush()])
+            if self._pending:
+                self._write_fragment()
+        except Exception as e:
+            logger.error(f"Progressive decoding failed: {e}", exc_info=True)
+            self._failed = True
+            # Keep draining so producers never block on a dead consumer
+            while self._queue.get() is not _DONE:
+                pass
+
+    def finish(self):
+        """Wait for the decoder to catch up and publish its last fragment"""
+        with span("progressive.wait", fragments=len(self._urls)):
+            self._queue.put(_DONE)
+            self._thread.join()
+        logger.info(f"Progressive decode: {len(self._urls)} fragment(s), "
+                    f"{self._total_samples / self.sample_rate:.2f}s of audio")
+
+    def song(self, codes: np.ndarray, duration: float) -> Optional[np.ndarray]:
+        """
+        After finish(): the decoded audio as decode_codes_real would return it
+        for these codes, or None when it has to be decoded again (different
+        windows, failed decoding, or codes trimmed or cut after they were fed)
+        """
+        if not self._reusable or self._failed or not self._blocks:
+            return None
+        if not np.array_equal(np.concatenate(self._codes), codes):
+            return None
+        logger.info("Reusing the progressive decode as the final audio")
+        audio = normalize_audio(np.concatenate(self._blocks))
+        self._blocks = []
+        return fit_duration(audio, self.sample_rate, duration)
@@ -0,0 +1,145 @@
+"""
+Polyphase Resampler
+Rational-ratio resampling with cached windowed-sinc polyphase filters,
+usable block by block (e.g. 16 kHz codec output -> 44.1 kHz WAV)
+"""
+import functools
+import logging
+import math
+import time
+from typing import Iterable, Iterator, Tuple
+
+import numpy as np
+
+from metrics import observe
+
+logger = logging.getLogger(__name__)
+
+# Filter design: zero crossings of the sinc on each side, Kaiser window shape and
+# cutoff as a fraction of the lower Nyquist frequency
+RESAMPLER_ZERO_CROSSINGS = 16
+RESAMPLER_KAISER_BETA = 8.0
+RESAMPLER_ROLLOFF = 0.95
+
+
+@functools.lru_cache(maxsize=8)
+def _polyphase_matrix(up: int, down: int) -> Tuple[np.ndarray, int, int]:
+    """
+    Filter matrix mapping one input window to `up` consecutive outputs
+
+    Output m = g*up + r interpolates the input at time m*down/up. Its filter
+    taps touch the same input offsets relative to g*down for every group g, so
+    a whole group is one row of a (window, up) matrix product. Returns the
+    matrix, the offset of the window's first sample relative to g*down and the
+    window length.
+    """
+    factor = max(up, down)
+    half = RESAMPLER_ZERO_CROSSINGS * factor
+    cutoff = RESAMPLER_ROLLOFF / factor
+    n = np.arange(2 * half + 1) - half
+    # Lowpass at the upsampled rate, gain `up` to make up for zero stuffing
+    taps = cutoff * np.sinc(cutoff * n) * np.kaiser(2 * half + 1, RESAMPLER_KAISER_BETA) * up
+
+    r = np.arange(up)
+    position = r * down + half           # centre of each output in filter coordinates
+    newest = position // up              # newest input sample feeding output r (relative to g*down)
+    phase = position % up
+    n_taps = -(-len(taps) // up)
+    first = int(newest.min()) - n_taps + 1
+    width = int(newest.max()) - first + 1
+
+    matrix = np.zeros((width, up), dtype=np.float32)
+    for k in range(n_taps):
+        index = phase + k * up
+        valid = index < len(taps)
+        matrix[newest[valid] - k - first, r[valid]] = taps[index[valid]]
+    matrix.setflags(write=False)
+    return matrix, first, width
+
+
+class StreamingResampler:
+    """
+    Resamples a signal delivered in arbitrary blocks
+
+    process() returns every output sample that can already be computed;
+    flush() returns the rest once the input is complete. The concatenated
+    output has ceil(n_in * dst_rate / src_rate) samples and no delay.
+    """
+
+    def __init__(self, src_rate: int, dst_rate: int):
+        g = math.gcd(src_rate, dst_rate)
+        self.up = dst_rate // g
+        self.down = src_rate // g
+        self.matrix, self.first, self.width = _polyphase_matrix(self.up, self.down)
+        # Input history, starting at absolute sample index self._start (zeros before 0)
+        self._start = min(0, self.first)
+        self._buffer = np.zeros(-self._start, dtype=np.float32)
+        self._received = 0
+        self._group = 0  # next group of `up` outputs to produce
+        self._produced = 0
+        # Compute time over the whole stream, reported on flush()
+        self.seconds = 0.0
+
+    def _emit(self, groups_end: int) -> np.ndarray:
+        if groups_end <= self._group:
+            return np.zeros(0, dtype=np.float32)
+        offset = self._group * self.down + self.first - self._start
+        count = groups_end - self._group
+        windows = np.lib.stride_tricks.sliding_window_view(self._buffer, self.width)
+        out = (windows[offset:offset + count * self.down:self.down] @ self.matrix).reshape(-1)
+
+        self._group = groups_end
+        # Drop input no later group can reach
+        keep_from = self._group * self.down + self.first - self._start
+        self._buffer = self._buffer[keep_from:]
+        self._start += keep_from
+        self._produced += len(out)
+        return out
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        start = time.perf_counter()
+        block = np.asarray(block, dtype=np.float32).reshape(-1)
+        self._buffer = np.concatenate([self._buffer, block])
+        self._received += len(block)
+        # Group g is complete once its window's last sample has arrived
+        last_index = self._received - 1
+        groups_end = (last_index - self.first - self.width + 1) // self.down + 1
+        out = self._emit(max(groups_end, self._group))
+        self.seconds += time.perf_counter() - start
+        return out
+
+    def flush(self) -> np.ndarray:
+        start = time.perf_counter()
+        total = -(-self._received * self.up // self.down)
+        groups_end = -(-total // self.up)
+        needed = (groups_end - 1) * self.down + self.first + self.width - self._start
+        if needed > len(self._buffer):
+            self._buffer = np.concatenate([self._buffer, np.zeros(needed - len(self._buffer), dtype=np.float32)])
+        out = self._emit(groups_end)
+        # The last group may run past the end of the signal
+        excess = self._produced - total
+        observe("yue_resample_seconds", self.seconds + time.perf_counter() - start)
+        return out[:len(out) - excess] if excess > 0 else out
+
+
+def resample_blocks(blocks: Iterable[np.ndarray], src_rate: int, dst_rate: int) -> Iterator[np.ndarray]:
+    """Resample a stream of blocks, yielding output blocks as they become available"""
+    if src_rate == dst_rate:
+        yield from blocks
+        return
+    resampler = StreamingResampler(src_rate, dst_rate)
+    for block in blocks:
+        out = resampler.process(block)
+        if len(out):
+            yield out
+    out = resampler.flush()
+    if len(out):
+        yield out
+
+
+def resample(audio: np.ndarray, src_rate: int, dst_rate: int) -> np.ndarray:
+    """Resample a whole signal (float32 output)"""
+    if src_rate == dst_rate:
+        return np.asarray(audio, dtype=np.float32)
+    chunks = list(resample_blocks([audio], src_rate, dst_rate))
+    return np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.float32)
@@ -0,0 +1,189 @@
+"""
+Job Scheduler
+Priority queues with per-client FIFO fairness feeding a bounded pool of
+inference workers, so concurrent requests never race for the same models
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, List, Optional
+
+from config import JOB_PRIORITIES, MAX_CONCURRENT_JOBS
+from metrics import observe
+
+logger = logging.getLogger(__name__)
+
+# Initial guess for a job duration (seconds) before any job has finished
+DEFAULT_JOB_SECONDS = 180.0
+
+
+class _QueuedJob:
+    def __init__(self, job_id: str, payload: Any, priority: int, client_id: str):
+        self.job_id = job_id
+        self.payload = payload
+        self.priority = priority
+        self.client_id = client_id
+        self.enqueued_at = time.time()
+
+
+class JobScheduler:
+    """
+    Runs queued jobs on a fixed number of worker threads
+
+    Jobs are taken from the highest priority level first. Within a level,
+    clients are served round-robin and each client's jobs run in FIFO order,
+    so one client flooding the queue cannot starve the others.
+    """
+
+    def __init__(self, handler: Callable[[str, Any], None], workers: int = MAX_CONCURRENT_JOBS):
+        self.handler = handler
+        self.workers = max(1, workers)
+        # One OrderedDict per priority level: client_id -> deque of jobs.
+        # The dict order is the round-robin order of clients.
+        self._queues: List["OrderedDict[str, deque]"] = [OrderedDict() for _ in JOB_PRIORITIES]
+        self._running: Dict[str, float] = {}
+        self._avg_seconds = DEFAULT_JOB_SECONDS
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._stopping = False
+
+    @staticmethod
+    def priority_level(priority: Optional[str]) -> int:
+        """Map a priority name to its queue index (unknown names map to 'normal')"""
+        if priority in JOB_PRIORITIES:
+            return JOB_PRIORITIES.index(priority)
+        return JOB_PRIORITIES.index("normal")
+
+    def start(self):
+        with self._cond:
+            if self._threads:
+                return
+            self._stopping = False
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"inference-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        logger.info(f"Job scheduler started with {self.workers} worker(s)")
+
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+        self._threads = []
+
+    def submit(self, job_id: str, payload: Any, priority: Optional[str] = "normal",
+               client_id: str = "anonymous"):
+        job = _QueuedJob(job_id, payload, self.priority_level(priority), client_id)
+        with self._cond:
+            clients = self._queues[job.priority]
+            clients.setdefault(client_id, deque()).append(job)
+            self._cond.notify()
+        logger.info(f"Queued job {job_id} (priority={JOB_PRIORITIES[job.priority]}, client={client_id})")
+
+    def cancel(self, job_id: str) -> bool:
+        """Remove a job that has not started yet"""
+        with self._cond:
+            for clients in self._queues:
+                for client_id, jobs in list(clients.items()):
+                    for job in jobs:
+                        if job.job_id == job_id:
+                            jobs.remove(job)
+                            if not jobs:
+                                del clients[client_id]
+                            return True
+        return False
+
+    def queue_depth(self) -> int:
+        with self._cond:
+            return sum(len(jobs) for clients in self._queues for jobs in clients.values())
+
+    def running_count(self) -> int:
+        with self._cond:
+            return len(self._running)
+
+    def position(self, job_id: str) -> Optional[int]:
+        """0-based position in the dispatch order, or None if the job is not queued"""
+        with self._cond:
+            for index, job in enumerate(self._dispatch_order()):
+                if job.job_id == job_id:
+                    return index
+        return None
+
+    def eta(self, job_id: str) -> Optional[float]:
+        """Estimated seconds until the job finishes, from the running average duration"""
+        with self._cond:
+            started = self._running.get(job_id)
+            if started is not None:
+                return max(self._avg_seconds - (time.time() - started), 0.0)
+
+            position = None
+            for index, job in enumerate(self._dispatch_order()):
+                if job.job_id == job_id:
+                    position = index
+                    break
+            if position is None:
+                return None
+
+            # Jobs ahead of us run `workers` at a time; we also wait for the
+            # earliest running job to free a slot
+            if len(self._running) >= self.workers:
+                earliest = min(self._running.values())
+                wait_slot = max(self._avg_seconds - (time.time() - earliest), 0.0)
+            else:
+                wait_slot = 0.0
+            waves = position // self.workers
+            return wait_slot + waves * self._avg_seconds + self._avg_seconds
+
+    def _dispatch_order(self) -> List[_QueuedJob]:
+        """Jobs in the order the workers would pick them up (lock must be held)"""
+        order = []
+        for clients in self._queues:
+            pending = [list(jobs) for jobs in clients.values()]
+            while pending:
+                for jobs in pending:
+                    order.append(jobs.pop(0))
+                pending = [jobs for jobs in pending if jobs]
+        return order
+
+    def _next_job(self) -> Optional[_QueuedJob]:
+        """Pop the next job (lock must be held)"""
+        for clients in self._queues:
+            if not clients:
+                continue
+            client_id, jobs = next(iter(clients.items()))
+            job = jobs.popleft()
+            del clients[client_id]
+            if jobs:
+                # Client goes to the back of the round-robin
+                clients[client_id] = jobs
+            return job
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None:
+                    if self._stopping:
+                        return
+                    self._cond.wait()
+                    job = self._next_job()
+                self._running[job.job_id] = time.time()
+
+            waited = time.time() - job.enqueued_at
+            observe("yue_job_queue_wait_seconds", waited, priority=JOB_PRIORITIES[job.priority])
+            logger.info(f"Worker {threading.current_thread().name} picked job {job.job_id} "
+                        f"(waited {waited:.1f}s)")
+            try:
+                self.handler(job.job_id, job.payload)
+            except Exception as e:
+                logger.error(f"Unhandled error in job {job.job_id}: {e}", exc_info=True)
+            finally:
+                with self._cond:
+                    started = self._running.pop(job.job_id, time.time())
+                    observe("yue_job_seconds", time.time() - started)
+                    # Exponential moving average of job durations for ETAs
+                    self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * (time.time() - started)
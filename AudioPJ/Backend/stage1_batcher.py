@@ -0,0 +1,98 @@
+"""
+Stage 1 Micro-Batcher
+Collects Stage 1 requests that arrive within a short window, buckets them by
+prompt length and runs each bucket as a single batched generate call
+(also used for batched XCodec decoding, with code sequence lengths)
+"""
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List
+
+from config import STAGE1_BATCH_WINDOW_MS, STAGE1_BUCKET_TOKENS, STAGE1_MAX_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+class BatchItem:
+    """One pending request: its payload, prompt length and the future to resolve"""
+
+    def __init__(self, payload: Any, prompt_length: int):
+        self.payload = payload
+        self.prompt_length = prompt_length
+        self.future: Future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class MicroBatcher:
+    """
+    Runs `run_batch(items)` on a background thread for groups of requests
+
+    `run_batch` must resolve every item's future (it may do so early, e.g. as
+    soon as one sequence of the batch reaches EOS). Items it leaves unresolved
+    fail with an error, so no caller waits forever.
+    """
+
+    def __init__(self, run_batch: Callable[[List[BatchItem]], None],
+                 max_batch_size: int = STAGE1_MAX_BATCH_SIZE,
+                 window_ms: float = STAGE1_BATCH_WINDOW_MS,
+                 bucket_tokens: int = STAGE1_BUCKET_TOKENS,
+                 name: str = "Stage 1"):
+        self.run_batch = run_batch
+        self.name = name
+        self.max_batch_size = max(1, max_batch_size)
+        self.window = window_ms / 1000.0
+        self.bucket_tokens = max(1, bucket_tokens)
+        self._pending: List[BatchItem] = []
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._loop, name=f"{name.lower().replace(' ', '')}-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, payload: Any, prompt_length: int) -> Future:
+        item = BatchItem(payload, prompt_length)
+        with self._cond:
+            self._pending.append(item)
+            self._cond.notify()
+        return item.future
+
+    def _bucket(self, item: BatchItem) -> int:
+        return item.prompt_length // self.bucket_tokens
+
+    def _take_batch(self) -> List[BatchItem]:
+        """Oldest request plus the following ones of the same length bucket (lock held)"""
+        bucket = self._bucket(self._pending[0])
+        batch = [item for item in self._pending if self._bucket(item) == bucket][:self.max_batch_size]
+        taken = set(map(id, batch))
+        self._pending = [item for item in self._pending if id(item) not in taken]
+        return batch
+
+    def _ready_count(self) -> int:
+        bucket = self._bucket(self._pending[0])
+        return sum(1 for item in self._pending if self._bucket(item) == bucket)
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                # Give concurrent requests a short window to join the batch
+                deadline = self._pending[0].enqueued_at + self.window
+                while self._ready_count() < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(timeout=remaining)
+                batch = self._take_batch()
+
+            logger.info(f"Running {self.name} batch of {len(batch)} request(s)")
+            try:
+                self.run_batch(batch)
+            except Exception as e:
+                logger.error(f"{self.name} batch failed: {e}", exc_info=True)
+                for item in batch:
+                    if not item.future.done():
+                        item.future.set_exception(e)
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(RuntimeError(f"{self.name} batch produced no result"))
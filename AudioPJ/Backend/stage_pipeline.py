@@ -0,0 +1,143 @@
+"""
+Staged Pipeline Executor
+Runs each job through a chain of stages (Stage 1 generation, codec decode,
+post-processing, file encoding), each with its own worker threads and a
+bounded input queue, so different jobs occupy different stages at once
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List
+
+from config import PIPELINE_STAGE_QUEUE_SIZE
+from metrics import timed
+from tracing import current_context, span
+
+logger = logging.getLogger(__name__)
+
+# A stage function takes the job context and returns it for the next stage.
+# Setting job["result"] ends the job there: later stages are skipped.
+StageFn = Callable[[Dict[str, Any]], Dict[str, Any]]
+
+
+class Stage:
+    """One step of the pipeline: a function and how many threads run it"""
+
+    def __init__(self, name: str, fn: StageFn, workers: int = 1,
+                 queue_size: int = PIPELINE_STAGE_QUEUE_SIZE):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        # Bounded: a full queue blocks the previous stage (backpressure)
+        self.queue: "queue.Queue" = queue.Queue(maxsize=max(1, queue_size))
+        self.busy = 0
+
+
+class StagedPipeline:
+    """
+    Chain of stages connected by bounded queues
+
+    submit() returns a Future resolved with job["result"] once a stage sets
+    it (or with the exception a stage raised). Stage 1 keeps one worker by
+    default so the LLM is never used concurrently, while decoding and
+    encoding of earlier jobs proceed next to it.
+    """
+
+    def __init__(self, name: str, stages: List[Stage]):
+        self.name = name
+        self.stages = stages
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+
+    def _start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for index, stage in enumerate(self.stages):
+                for i in range(stage.workers):
+                    thread = threading.Thread(
+                        target=self._worker, args=(index,), name=f"{self.name}-{stage.name}-{i}", daemon=True
+                    )
+                    thread.start()
+                    self._threads.append(thread)
+        logger.info(f"Pipeline '{self.name}' started: " +
+                    ", ".join(f"{stage.name} x{stage.workers}" for stage in self.stages))
+
+    def submit(self, job: Dict[str, Any]) -> Future:
+        self._start()
+        future: Future = Future()
+        # The trace continues on the stage threads
+        self.stages[0].queue.put((job, future, current_context(), time.monotonic()))
+        return future
+
+    def run(self, job: Dict[str, Any]) -> Any:
+        """Submit a job and wait for its result"""
+        return self.submit(job).result()
+
+    def _worker(self, index: int):
+        stage = self.stages[index]
+        next_stage = self.stages[index + 1] if index + 1 < len(self.stages) else None
+        while True:
+            job, future, trace, enqueued_at = stage.queue.get()
+            with self._lock:
+                stage.busy += 1
+            try:
+                with span(f"stage.{stage.name}", parent=trace, pipeline=self.name,
+                          queue_wait_ms=round((time.monotonic() - enqueued_at) * 1000, 1)), \
+                        timed("yue_pipeline_stage_seconds", pipeline=self.name, stage=stage.name):
+                    job = stage.fn(job)
+            except Exception as e:
+                logger.error(f"Pipeline stage '{stage.name}' failed: {e}", exc_info=True)
+                future.set_exception(e)
+                continue
+            finally:
+                with self._lock:
+                    stage.busy -= 1
+
+            if "result" in job or next_stage is None:
+                future.set_result(job.get("result"))
+            else:
+                next_stage.queue.put((job, future, trace, time.monotonic()))
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Queued and running jobs per stage"""
+        with self._lock:
+            return {
+                stage.name: {"queued": stage.queue.qsize(), "running": stage.busy}
+                for stage in self.stages
+            }
+
+
+_pipelines: Dict[str, StagedPipeline] = {}
+_overrides: Dict[str, StageFn] = {}
+_pipelines_lock = threading.Lock()
+
+
+def set_stage_override(stage_name: str, fn: StageFn):
+    """
+    Replace the function of every stage called stage_name in pipelines built
+    from now on (e.g. inference workers hand the final audio to the API
+    process instead of encoding it themselves)
+    """
+    with _pipelines_lock:
+        _overrides[stage_name] = fn
+
+
+def get_staged_pipeline(name: str, build: Callable[[], List[Stage]]) -> StagedPipeline:
+    """Process-wide pipeline per name, built on first use"""
+    with _pipelines_lock:
+        pipeline = _pipelines.get(name)
+        if pipeline is None:
+            stages = build()
+            for stage in stages:
+                stage.fn = _overrides.get(stage.name, stage.fn)
+            pipeline = StagedPipeline(name, stages)
+            _pipelines[name] = pipeline
+        return pipeline
+
+
+def pipeline_stats() -> Dict[str, Dict[str, Dict[str, int]]]:
+    with _pipelines_lock:
+        return {name: pipeline.stats() for name, pipeline in _pipelines.items()}
@@ -0,0 +1,18 @@
+"""
+Backend modules import each other as top-level modules (`from config import
+...`), so the Backend directory goes on sys.path like when the server runs
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tracing  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def no_trace_export(monkeypatch):
+    """Keep spans finished during tests in memory instead of traces/traces.jsonl"""
+    monkeypatch.setattr(tracing, "TRACE_EXPORTER", "off")
@@ -0,0 +1,87 @@
+import os
+
+import numpy as np
+import pytest
+import scipy.io.wavfile
+
+import audio_output
+from generation_cache import GenerationCache, cache_key
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return GenerationCache(str(tmp_path / "cache"), max_gb=1.0)
+
+
+@pytest.fixture
+def output_dir(tmp_path, monkeypatch):
+    directory = tmp_path / "outputs"
+    monkeypatch.setattr(audio_output, "OUTPUT_DIR", str(directory))
+    return directory
+
+
+def _samples(path):
+    return len(scipy.io.wavfile.read(str(path))[1])
+
+
+def test_cache_key_is_order_independent_and_sensitive():
+    assert cache_key(seed=1, prompt="a") == cache_key(prompt="a", seed=1)
+    assert cache_key(seed=1, prompt="a") != cache_key(seed=2, prompt="a")
+
+
+def test_stage1_round_trip(cache):
+    codes = np.arange(10, dtype=np.int64)
+    assert cache.load_stage1("key") is None
+    cache.store_stage1("key", codes)
+    np.testing.assert_array_equal(cache.load_stage1("key"), codes)
+
+
+def test_writing_a_reused_output_name_keeps_the_cached_audio(cache, output_dir):
+    # Output names repeat for the same genre/mood: the next job's WAV must not
+    # overwrite the cached entry served from that name
+    audio_output.write_wav("song.wav", 16000, np.ones(1000, dtype=np.int16))
+    cache.store_audio("key", str(output_dir / "song.wav"))
+    assert cache.fetch_audio("key", str(output_dir / "song.wav"))
+
+    audio_output.write_wav("song.wav", 16000, np.ones(10, dtype=np.int16))
+    assert _samples(output_dir / "song.wav") == 10
+
+    assert cache.fetch_audio("key", str(output_dir / "other.wav"))
+    assert _samples(output_dir / "other.wav") == 1000
+
+
+def test_fetch_audio_miss(cache, output_dir):
+    assert not cache.fetch_audio("missing", str(output_dir / "song.wav"))
+    assert not os.path.exists(output_dir / "song.wav")
+
+
+def test_quota_evicts_least_recently_used(tmp_path):
+    entry = np.zeros(1000, dtype=np.int64)  # ~8 KB per entry
+    cache = GenerationCache(str(tmp_path / "cache"), max_gb=20_000 / 1024 ** 3)
+    cache.store_stage1("old", entry)
+    cache.store_stage1("used", entry)
+    old_path = os.path.join(cache.root, "stage1", "old.npy")
+    os.utime(old_path, (1, 1))
+    cache.store_stage1("new", entry)
+
+    assert cache.load_stage1("old") is None
+    assert cache.load_stage1("used") is not None
+    assert cache.load_stage1("new") is not None
+
+
+def test_output_filenames_are_unique_and_sanitized():
+    first = audio_output.output_filename("yue_hq", "pop/../rock", "happy mood")
+    second = audio_output.output_filename("yue_hq", "pop/../rock", "happy mood")
+    assert first != second
+    assert first.startswith("yue_hq_poprock_happy_mood_") and first.endswith(".wav")
+    assert "/" not in first
+
+
+def test_sweep_outputs_removes_only_old_songs(output_dir):
+    audio_output.write_wav("old.wav", 16000, np.zeros(10, dtype=np.int16))
+    audio_output.write_wav("new.wav", 16000, np.zeros(10, dtype=np.int16))
+    os.utime(output_dir / "old.wav", (1, 1))
+    (output_dir / "fragments").mkdir()
+
+    assert audio_output.sweep_outputs(3600) == 1
+    assert sorted(os.listdir(output_dir)) == ["fragments", "new.wav"]
@@ -0,0 +1,60 @@
+import time
+
+import pytest
+
+import job_store
+from job_store import MemoryJobStore, SQLiteJobStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    store = MemoryJobStore() if request.param == "memory" else SQLiteJobStore(str(tmp_path / "jobs.db"))
+    yield store
+    store.close()
+
+
+def _later(monkeypatch, seconds):
+    now = time.time()
+    monkeypatch.setattr(job_store.time, "time", lambda: now + seconds)
+
+
+def test_expire_removes_only_finished_jobs_past_ttl(store, monkeypatch):
+    store.create("done", {"status": "queued"}, {"prompt": "x"})
+    store.update("done", status="completed", progress=1.0)
+    store.create("failed", {"status": "failed"}, {})
+    store.create("waiting", {"status": "queued"}, {})
+
+    assert store.expire(60) == []
+
+    _later(monkeypatch, 120)
+    assert sorted(store.expire(60)) == ["done", "failed"]
+    assert store.get("done") is None
+    assert store.get("waiting").status == "queued"
+    assert [r.job_id for r in store.unfinished()] == ["waiting"]
+
+
+def test_update_merges_state(store):
+    store.create("job", {"status": "queued", "progress": 0.0}, {"seed": 1}, priority="high", client_id="c")
+    record = store.update("job", status="processing", stage="stage1")
+    assert record.state == {"status": "processing", "progress": 0.0, "stage": "stage1"}
+    assert store.update("missing", status="failed") is None
+
+    stored = store.get_many(["job", "missing"])
+    assert list(stored) == ["job"]
+    assert stored["job"].request == {"seed": 1}
+    assert (stored["job"].priority, stored["job"].client_id) == ("high", "c")
+
+
+def test_sqlite_unfinished_jobs_survive_reopen(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    store = SQLiteJobStore(path)
+    store.create("first", {"status": "queued"}, {})
+    store.create("second", {"status": "processing"}, {})
+    store.create("finished", {"status": "completed"}, {})
+    store.close()
+
+    reopened = SQLiteJobStore(path)
+    try:
+        assert [r.job_id for r in reopened.unfinished()] == ["first", "second"]
+    finally:
+        reopened.close()
@@ -0,0 +1,62 @@
+from loop_detector import LoopDetector
+
+PREFIX = list(range(100, 110))
+PATTERN = [1, 2, 3, 4, 5]
+
+
+def _push_all(detector, tokens):
+    """Index of the token on which each row started looping, or None"""
+    started_at = None
+    for index, token in enumerate(tokens):
+        if detector.push([token])[0] and started_at is None:
+            started_at = index
+    return started_at
+
+
+def test_detects_repeated_pattern_and_cut_point():
+    detector = LoopDetector(max_period=8, min_repeats=4, min_span=10)
+    generated = []
+    for token in PREFIX + PATTERN * 10:
+        generated.append(token)
+        if detector.push([token])[0]:
+            break
+
+    # Four occurrences of the pattern: the run covers three periods (15 tokens)
+    assert len(generated) == len(PREFIX) + 4 * len(PATTERN)
+    assert detector.period[0] == len(PATTERN)
+    # Cutting the repeated tail keeps the prefix and the first occurrence
+    drop = detector.repeated_tail(0)
+    assert generated[:len(generated) - drop] == PREFIX + PATTERN
+    assert detector.continuation(0) == PATTERN[0]
+
+
+def test_min_span_delays_detection_of_short_periods():
+    detector = LoopDetector(max_period=8, min_repeats=2, min_span=12, min_period=1)
+    # Period 1: two repeats would be enough, but the run must span 12 tokens
+    started_at = _push_all(detector, [7] * 20)
+    assert started_at == 12
+
+
+def test_held_code_is_not_a_loop():
+    # Silence or a sustained note: one code repeated far beyond min_span
+    detector = LoopDetector(max_period=8, min_repeats=4, min_span=10, min_period=2)
+    assert _push_all(detector, PREFIX + [7] * 1000) is None
+    # A period-2 pattern is still caught
+    assert _push_all(detector, [7, 8] * 10) is not None
+    assert detector.period[0] == 2
+
+
+def test_no_detection_without_repetition():
+    detector = LoopDetector(max_period=8, min_repeats=3, min_span=4)
+    assert _push_all(detector, list(range(200))) is None
+    assert detector.repeated_tail(0) == 0
+    assert detector.continuation(0) is None
+
+
+def test_rows_are_independent():
+    detector = LoopDetector(batch_size=2, max_period=4, min_repeats=3, min_span=4)
+    looping_row = [9, 8] * 10
+    for index, token in enumerate(looping_row):
+        detector.push([token, 1000 + index])
+    assert detector.looping.tolist() == [True, False]
+    assert detector.period[0] == 2
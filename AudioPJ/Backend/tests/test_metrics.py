@@ -0,0 +1,55 @@
+import metrics
+
+
+def _lines(text, prefix):
+    return [line for line in text.splitlines() if line.startswith(prefix)]
+
+
+def test_histogram_buckets_are_cumulative():
+    for value in (0.003, 0.2, 0.2, 1000.0):
+        metrics.observe("yue_wav_write_seconds", value, test="render")
+    text = metrics.render([])
+
+    assert "# TYPE yue_wav_write_seconds histogram" in text
+    buckets = _lines(text, 'yue_wav_write_seconds_bucket{test="render"')
+    counts = [int(line.rsplit(" ", 1)[1]) for line in buckets]
+    assert counts == sorted(counts)
+    assert 'yue_wav_write_seconds_bucket{test="render",le="0.005"} 1' in buckets
+    assert 'yue_wav_write_seconds_bucket{test="render",le="0.25"} 3' in buckets
+    assert 'yue_wav_write_seconds_bucket{test="render",le="+Inf"} 4' in buckets
+    assert 'yue_wav_write_seconds_count{test="render"} 4' in text
+    assert 'yue_wav_write_seconds_sum{test="render"} 1000.403' in text
+
+
+def test_readings_and_label_escaping():
+    text = metrics.render([
+        ("yue_scheduler_queue_depth", {}, 3),
+        ("yue_model_resident", {"model": 'st"age\\1'}, 1),
+        ("not_a_declared_reading", {}, 5),
+    ])
+    assert "# TYPE yue_scheduler_queue_depth gauge" in text
+    assert "yue_scheduler_queue_depth 3" in text
+    assert 'yue_model_resident{model="st\\"age\\\\1"} 1' in text
+    assert "not_a_declared_reading" not in text
+
+
+def test_non_finite_values():
+    text = metrics.render([
+        ("yue_scheduler_queue_depth", {"case": "pos"}, float("inf")),
+        ("yue_scheduler_queue_depth", {"case": "neg"}, float("-inf")),
+        ("yue_scheduler_queue_depth", {"case": "nan"}, float("nan")),
+    ])
+    assert 'yue_scheduler_queue_depth{case="pos"} +Inf' in text
+    assert 'yue_scheduler_queue_depth{case="neg"} -Inf' in text
+    assert 'yue_scheduler_queue_depth{case="nan"} NaN' in text
+
+
+def test_forwarder_receives_observations_instead():
+    received = []
+    metrics.set_forwarder(lambda name, value, labels: received.append((name, value, labels)))
+    try:
+        metrics.observe("yue_job_seconds", 2.5, test="forward")
+    finally:
+        metrics.set_forwarder(None)
+    assert received == [("yue_job_seconds", 2.5, {"test": "forward"})]
+    assert 'test="forward"' not in metrics.render([])
@@ -0,0 +1,54 @@
+import threading
+
+import pytest
+
+from model_manager import ModelResidencyManager
+
+
+def test_resident_model_is_served_while_another_loads():
+    manager = ModelResidencyManager(vram_budget_gb=100, ram_budget_gb=100)
+    started, release = threading.Event(), threading.Event()
+    loads = []
+
+    def slow_loader():
+        loads.append("slow")
+        started.set()
+        assert release.wait(5)
+        return "slow-model"
+
+    manager.register("fast", lambda: "fast-model", size_gb=0.1)
+    manager.register("slow", slow_loader, size_gb=0.1)
+    assert manager.acquire("fast") == "fast-model"
+
+    results = []
+    callers = [threading.Thread(target=lambda: results.append(manager.acquire("slow"))) for _ in range(3)]
+    for caller in callers:
+        caller.start()
+    assert started.wait(5)
+    # The loader is blocked, the manager lock is not
+    with manager.use("fast") as fast:
+        assert fast == "fast-model"
+
+    release.set()
+    for caller in callers:
+        caller.join(5)
+    assert results == ["slow-model"] * 3
+    assert loads == ["slow"]
+
+
+def test_failed_load_is_reported_and_can_be_retried():
+    manager = ModelResidencyManager(vram_budget_gb=100, ram_budget_gb=100)
+    attempts = []
+
+    def flaky_loader():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise OSError("weights missing")
+        return "model"
+
+    manager.register("flaky", flaky_loader, size_gb=0.1)
+    with pytest.raises(OSError):
+        manager.acquire("flaky")
+    assert not manager.is_resident("flaky")
+    assert manager.stats()["ram_used_gb"] == 0
+    assert manager.acquire("flaky") == "model"
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+
+import progressive_audio  # noqa: E402
+import xcodec_real_decoder  # noqa: E402
+from progressive_audio import ProgressiveAudio  # noqa: E402
+
+# XCodec2 outputs 16 kHz, the pipelines deliver 44.1 kHz
+CODEC_RATE, SAMPLE_RATE = 16000, 44100
+
+
+class _RepeatCodec:
+    def decode_code(self, codes):
+        return torch.sin(codes.float()).repeat_interleave(4, dim=-1)
+
+
+@pytest.fixture(autouse=True)
+def fake_codec(monkeypatch, tmp_path):
+    def load():
+        return _RepeatCodec(), {"sampling_rate": CODEC_RATE}
+    monkeypatch.setattr(progressive_audio, "load_xcodec_model", load)
+    monkeypatch.setattr(xcodec_real_decoder, "load_xcodec_model", load)
+    monkeypatch.setattr(xcodec_real_decoder, "XCODEC_BATCHING_ENABLED", False)
+    monkeypatch.setattr(progressive_audio, "FRAGMENT_DIR", str(tmp_path))
+
+
+def _decode_progressively(codes, chunk_frames, monkeypatch):
+    monkeypatch.setattr(progressive_audio, "PROGRESSIVE_CHUNK_FRAMES", chunk_frames)
+    progressive = ProgressiveAudio(lambda urls, seconds: None, SAMPLE_RATE)
+    for start in range(0, len(codes), 7):
+        progressive.feed(codes[start:start + 7])
+    progressive.finish()
+    return progressive
+
+
+def test_preview_with_final_windows_becomes_the_song(monkeypatch):
+    codes = np.arange(1, 1200)
+    progressive = _decode_progressively(codes, progressive_audio.XCODEC_CHUNK_FRAMES, monkeypatch)
+    expected = xcodec_real_decoder.decode_codes_real(codes, SAMPLE_RATE, duration=1.0)
+    np.testing.assert_allclose(progressive.song(codes, 1.0), expected, atol=1e-5)
+
+
+def test_preview_is_not_reused_for_other_windows_or_codes(monkeypatch):
+    codes = np.arange(1, 1200)
+    short_windows = _decode_progressively(codes, 175, monkeypatch)
+    assert short_windows.song(codes, 1.0) is None
+
+    final_windows = _decode_progressively(codes, progressive_audio.XCODEC_CHUNK_FRAMES, monkeypatch)
+    # e.g. a looping tail was cut after the codes were fed
+    assert final_windows.song(codes[:-10], 1.0) is None
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from resampler import StreamingResampler, resample
+
+
+@pytest.mark.parametrize("src_rate, dst_rate", [(16000, 44100), (44100, 16000), (16000, 24000)])
+def test_streaming_matches_one_shot(src_rate, dst_rate):
+    rng = np.random.default_rng(0)
+    audio = rng.standard_normal(5003).astype(np.float32)
+    expected = resample(audio, src_rate, dst_rate)
+
+    resampler = StreamingResampler(src_rate, dst_rate)
+    blocks, start = [], 0
+    # Irregular block sizes, including empty and single-sample blocks
+    for size in [0, 1, 7, 320, 1, 999, 64] * 20:
+        blocks.append(resampler.process(audio[start:start + size]))
+        start += size
+    blocks.append(resampler.process(audio[start:]))
+    blocks.append(resampler.flush())
+
+    np.testing.assert_allclose(np.concatenate(blocks), expected, atol=1e-5)
+
+
+@pytest.mark.parametrize("n_in", [0, 1, 160, 4999])
+def test_output_length(n_in):
+    out = resample(np.zeros(n_in, dtype=np.float32), 16000, 44100)
+    assert len(out) == -(-n_in * 441 // 160)
+
+
+def test_preserves_a_low_frequency_tone():
+    t = np.arange(16000) / 16000
+    out = resample(np.sin(2 * np.pi * 440 * t).astype(np.float32), 16000, 44100)
+    expected = np.sin(2 * np.pi * 440 * np.arange(len(out)) / 44100)
+    # Away from the edges, where the filter sees the zero padding
+    np.testing.assert_allclose(out[2000:-2000], expected[2000:-2000], atol=1e-2)
+
+
+def test_same_rate_is_passthrough():
+    audio = np.arange(10, dtype=np.float32)
+    np.testing.assert_array_equal(resample(audio, 16000, 16000), audio)
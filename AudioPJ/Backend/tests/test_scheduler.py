@@ -0,0 +1,57 @@
+import threading
+
+from scheduler import JobScheduler
+
+
+def _run_all(submissions, workers=1):
+    """Submit everything before starting, return the order the handler saw"""
+    order = []
+    done = threading.Event()
+
+    def handler(job_id, payload):
+        order.append(job_id)
+        if len(order) == len(submissions):
+            done.set()
+
+    scheduler = JobScheduler(handler, workers=workers)
+    for job_id, priority, client_id in submissions:
+        scheduler.submit(job_id, None, priority=priority, client_id=client_id)
+    dispatch_order = [job.job_id for job in scheduler._dispatch_order()]
+    scheduler.start()
+    try:
+        assert done.wait(5)
+    finally:
+        scheduler.stop()
+    return order, dispatch_order
+
+
+def test_round_robin_between_clients_fifo_within():
+    submissions = [
+        ("a1", "normal", "a"), ("a2", "normal", "a"), ("a3", "normal", "a"),
+        ("b1", "normal", "b"), ("b2", "normal", "b"),
+        ("c1", "normal", "c"),
+    ]
+    order, dispatch_order = _run_all(submissions)
+    assert order == ["a1", "b1", "c1", "a2", "b2", "a3"]
+    # Queue positions reported to clients follow the same order
+    assert dispatch_order == order
+
+
+def test_higher_priority_first_and_unknown_priority_is_normal():
+    submissions = [
+        ("low", "low", "a"), ("normal", "normal", "a"), ("unknown", "urgent", "b"), ("high", "high", "c"),
+    ]
+    order, _ = _run_all(submissions)
+    assert order == ["high", "normal", "unknown", "low"]
+
+
+def test_position_and_cancel():
+    scheduler = JobScheduler(lambda job_id, payload: None)
+    for job_id, client_id in [("a1", "a"), ("a2", "a"), ("b1", "b")]:
+        scheduler.submit(job_id, None, client_id=client_id)
+    assert [scheduler.position(i) for i in ("a1", "b1", "a2")] == [0, 1, 2]
+
+    assert scheduler.cancel("b1")
+    assert not scheduler.cancel("b1")
+    assert scheduler.position("a2") == 1
+    assert scheduler.queue_depth() == 2
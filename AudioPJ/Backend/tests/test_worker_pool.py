@@ -0,0 +1,25 @@
+from multiprocessing import shared_memory
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from worker_pool import InferenceWorkerPool, attached_array, share_array
+
+
+def test_shared_array_round_trip_unlinks_the_block():
+    audio = np.arange(-5, 5, dtype=np.int16)
+    handle = share_array(audio)
+    with attached_array(handle) as view:
+        np.testing.assert_array_equal(view, audio)
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=handle["name"])
+
+
+def test_result_of_a_forgotten_job_releases_its_audio():
+    handle = share_array(np.ones(16, dtype=np.int16))
+    worker = SimpleNamespace(index=0, jobs={})
+    # The job is no longer pending, e.g. its worker was replaced meanwhile
+    InferenceWorkerPool(size=1)._dispatch(worker, ("done", "gone", {"audio": handle, "audio_filename": "x.wav"}))
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=handle["name"])
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+
+import xcodec_real_decoder  # noqa: E402
+from xcodec_real_decoder import XCodecStreamDecoder  # noqa: E402
+
+SAMPLES_PER_FRAME = 4
+
+
+class _RepeatCodec:
+    """Each code becomes SAMPLES_PER_FRAME samples of its own value, so overlapping
+    windows decode identical audio and any stitching error shows up exactly"""
+
+    def decode_code(self, codes):
+        return codes.float().repeat_interleave(SAMPLES_PER_FRAME, dim=-1)
+
+
+@pytest.fixture(autouse=True)
+def unbatched(monkeypatch):
+    monkeypatch.setattr(xcodec_real_decoder, "XCODEC_BATCHING_ENABLED", False)
+
+
+@pytest.mark.parametrize("n_codes", [1, 9, 10, 24, 100])
+@pytest.mark.parametrize("feed_size", [1, 7, 1000])
+def test_streamed_blocks_equal_one_shot_decode(n_codes, feed_size):
+    codes = np.arange(1, n_codes + 1)
+    decoder = XCodecStreamDecoder(_RepeatCodec(), chunk_frames=10, overlap_frames=3)
+    blocks = []
+    for start in range(0, n_codes, feed_size):
+        blocks += decoder.feed(codes[start:start + feed_size])
+    blocks += decoder.flush()
+
+    np.testing.assert_allclose(np.concatenate(blocks), np.repeat(codes, SAMPLES_PER_FRAME).astype(np.float32))
+
+
+def test_overlap_is_capped_at_half_a_window():
+    decoder = XCodecStreamDecoder(_RepeatCodec(), chunk_frames=10, overlap_frames=8)
+    assert decoder.overlap_frames == 5
+    assert decoder.hop == 5
@@ -0,0 +1,306 @@
+"""
+Job Tracing
+Lightweight spans in the OpenTelemetry data model. Every job gets a trace ID;
+spans nest through a context variable within a thread and are handed over
+explicitly to pipeline stage threads and inference worker processes.
+Finished spans are exported as OTLP/JSON, to a local JSONL file or to a
+collector, and the spans of recent traces are kept in memory for the status
+endpoint's summary
+
+Usage (local collector stand-in, appends received spans to a JSONL file):
+    python tracing.py --collector --port 4318
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import TRACE_COLLECTOR_URL, TRACE_EXPORTER, TRACE_FILE, TRACE_MEMORY_TRACES
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "audiopj-backend"
+
+# (trace_id, span_id) of a span, what is passed across threads and processes.
+# span_id is None for a trace that has no span yet (the root span's parent)
+SpanContext = Tuple[str, Optional[str]]
+
+_STATUS_OK = 1
+_STATUS_ERROR = 2
+
+
+def new_trace_id() -> str:
+    return os.urandom(16).hex()
+
+
+def _attribute(key: str, value: Any) -> Dict[str, Any]:
+    """OTLP/JSON encoding of one attribute"""
+    if isinstance(value, bool):
+        encoded = {"boolValue": value}
+    elif isinstance(value, int):
+        encoded = {"intValue": str(value)}
+    elif isinstance(value, float):
+        encoded = {"doubleValue": value}
+    else:
+        encoded = {"stringValue": str(value)}
+    return {"key": key, "value": encoded}
+
+
+class Span:
+    """One timed operation of a trace"""
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = {key: value for key, value in attributes.items() if value is not None}
+        self.events: List[Dict[str, Any]] = []
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+
+    @property
+    def context(self) -> SpanContext:
+        return self.trace_id, self.span_id
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def add_event(self, name: str, **attributes: Any):
+        self.events.append({
+            "timeUnixNano": str(time.time_ns()),
+            "name": name,
+            "attributes": [_attribute(key, value) for key, value in attributes.items()],
+        })
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or time.time_ns()),
+            "attributes": [_attribute(key, value) for key, value in self.attributes.items()],
+            "events": self.events,
+            "status": {"code": _STATUS_ERROR, "message": self.error} if self.error else {"code": _STATUS_OK},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+_CURRENT = object()
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def current_context() -> Optional[SpanContext]:
+    """Context of the active span, to continue the trace on another thread or process"""
+    span = _current.get()
+    return span.context if span is not None else None
+
+
+@contextmanager
+def span(name: str, parent: Any = _CURRENT, **attributes: Any):
+    """
+    Run the block inside a new span. The parent defaults to the active span
+    of this thread; pass a SpanContext to continue a trace from elsewhere, or
+    None to start a new trace. Exceptions mark the span as failed
+    """
+    if parent is _CURRENT:
+        parent = current_context()
+    trace_id, parent_id = parent if parent is not None else (new_trace_id(), None)
+    current = Span(name, trace_id, parent_id, attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        current.end_ns = time.time_ns()
+        _finish(current.to_otlp())
+
+
+_forwarder: Optional[Callable[[Dict[str, Any]], None]] = None
+
+
+def set_forwarder(forward: Optional[Callable[[Dict[str, Any]], None]]):
+    """Send finished spans to forward(span) instead of recording them here"""
+    global _forwarder
+    _forwarder = forward
+
+
+def _finish(span_data: Dict[str, Any]):
+    if _forwarder is not None:
+        _forwarder(span_data)
+    else:
+        record(span_data)
+
+
+# Finished spans of the most recent traces, for summaries
+_traces: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+_traces_lock = threading.Lock()
+
+
+def record(span_data: Dict[str, Any]):
+    """Keep a finished span (OTLP/JSON) for summaries and queue it for export"""
+    with _traces_lock:
+        spans = _traces.get(span_data["traceId"])
+        if spans is None:
+            spans = _traces[span_data["traceId"]] = []
+            while len(_traces) > TRACE_MEMORY_TRACES:
+                _traces.popitem(last=False)
+        spans.append(span_data)
+    if TRACE_EXPORTER != "off":
+        _get_exporter().put(span_data)
+
+
+def summary(trace_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Time per span name of a trace, in order of first start, e.g.
+    {"trace_id": ..., "duration_ms": 41250.3, "spans": [{"name": "stage.stage1",
+    "duration_ms": 30112.9, "count": 1}, ...]}. duration_ms is None while the
+    root span is still running
+    """
+    with _traces_lock:
+        spans = list(_traces.get(trace_id, ()))
+    if not spans:
+        return None
+
+    def duration_ms(span_data):
+        return (int(span_data["endTimeUnixNano"]) - int(span_data["startTimeUnixNano"])) / 1e6
+
+    totals: Dict[str, Dict[str, Any]] = {}
+    for span_data in sorted(spans, key=lambda s: int(s["startTimeUnixNano"])):
+        entry = totals.setdefault(span_data["name"], {"name": span_data["name"], "duration_ms": 0.0, "count": 0})
+        entry["duration_ms"] += duration_ms(span_data)
+        entry["count"] += 1
+    for entry in totals.values():
+        entry["duration_ms"] = round(entry["duration_ms"], 1)
+    root = next((s for s in spans if "parentSpanId" not in s), None)
+    return {
+        "trace_id": trace_id,
+        "duration_ms": round(duration_ms(root), 1) if root is not None else None,
+        "spans": list(totals.values()),
+    }
+
+
+def _resolve(path: str) -> str:
+    if os.path.isabs(path):
+        return path
+    return os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), path))
+
+
+def _otlp_request(spans: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {"resourceSpans": [{
+        "resource": {"attributes": [_attribute("service.name", SERVICE_NAME)]},
+        "scopeSpans": [{"scope": {"name": "audiopj.tracing"}, "spans": spans}],
+    }]}
+
+
+def _append_jsonl(path: str, spans: List[Dict[str, Any]]):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write("".join(json.dumps(span_data) + "\n" for span_data in spans))
+
+
+class _Exporter:
+    """Background thread writing finished spans in batches, off the job threads"""
+
+    def __init__(self):
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+        threading.Thread(target=self._run, name="trace-exporter", daemon=True).start()
+
+    def put(self, span_data: Dict[str, Any]):
+        self._queue.put(span_data)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # Spans of one job finish close together: give them a moment to batch up
+            time.sleep(0.5)
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                if TRACE_EXPORTER == "otlp":
+                    request = urllib.request.Request(
+                        TRACE_COLLECTOR_URL, data=json.dumps(_otlp_request(batch)).encode("utf-8"),
+                        headers={"Content-Type": "application/json"}, method="POST"
+                    )
+                    urllib.request.urlopen(request, timeout=5).close()
+                else:
+                    _append_jsonl(_resolve(TRACE_FILE), batch)
+            except Exception as e:
+                logger.warning(f"Failed to export {len(batch)} span(s): {e}")
+
+
+_exporter: Optional[_Exporter] = None
+_exporter_lock = threading.Lock()
+
+
+def _get_exporter() -> _Exporter:
+    global _exporter
+
+    with _exporter_lock:
+        if _exporter is None:
+            _exporter = _Exporter()
+        return _exporter
+
+
+def run_collector(port: int, path: str):
+    """Minimal OTLP/HTTP JSON receiver that appends every span to a JSONL file"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            spans = [
+                span_data
+                for resource in body.get("resourceSpans", [])
+                for scope in resource.get("scopeSpans", [])
+                for span_data in scope.get("spans", [])
+            ]
+            _append_jsonl(path, spans)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    print(f"Trace collector listening on http://127.0.0.1:{port}/v1/traces, writing {path}")
+    ThreadingHTTPServer(("127.0.0.1", port), Handler).serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local trace collector stand-in")
+    parser.add_argument("--collector", action="store_true", help="run the OTLP/HTTP JSON collector")
+    parser.add_argument("--port", type=int, default=4318)
+    parser.add_argument("--output", default=_resolve(TRACE_FILE), help="JSONL file the spans are appended to")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if args.collector:
+        run_collector(args.port, args.output)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
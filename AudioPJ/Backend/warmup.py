@@ -0,0 +1,147 @@
+"""
+Warm-up
+Runs once per inference process at startup: loads the models, then runs a
+short dummy Stage 1 generation and a small XCodec decode so allocator
+growth, kernel selection and codec initialization happen before the first
+real job. With WARMUP_TORCH_COMPILE the codec and Stage 2 are compiled with
+torch.compile, and the compile caches are kept on disk so later restarts
+skip most of that work
+"""
+import logging
+import os
+import time
+
+import numpy as np
+
+from config import (
+    PIPELINE_MODE, TORCH_COMPILE_CACHE_DIR, WARMUP_DUMMY_JOB, WARMUP_TORCH_COMPILE, XCODEC_CHUNK_FRAMES
+)
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Portable bundle of the compiled artifacts (torch >= 2.6), next to the inductor caches
+_ARTIFACTS_FILE = "compile_artifacts.bin"
+
+
+def _cache_dir() -> str:
+    root = TORCH_COMPILE_CACHE_DIR
+    if not os.path.isabs(root):
+        root = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), root))
+    return root
+
+
+def configure_compile_cache():
+    """
+    Keep the inductor and Triton caches in TORCH_COMPILE_CACHE_DIR instead of
+    a temporary directory. Must run before torch is imported
+    """
+    if not WARMUP_TORCH_COMPILE:
+        return
+    root = _cache_dir()
+    os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", os.path.join(root, "inductor"))
+    os.environ.setdefault("TRITON_CACHE_DIR", os.path.join(root, "triton"))
+    os.environ.setdefault("TORCHINDUCTOR_FX_GRAPH_CACHE", "1")
+    os.environ.setdefault("TORCHINDUCTOR_AUTOGRAD_CACHE", "1")
+
+
+def maybe_compile(model, method: str):
+    """Replace model.<method> with its torch.compile version when WARMUP_TORCH_COMPILE is on"""
+    if not WARMUP_TORCH_COMPILE:
+        return model
+    import torch
+
+    # Exported engines (ONNX Runtime, TorchScript) are already optimized graphs
+    if not isinstance(model, torch.nn.Module) or not hasattr(torch, "compile"):
+        return model
+    try:
+        # dynamic: decode windows and generation lengths vary between calls
+        setattr(model, method, torch.compile(getattr(model, method), dynamic=True))
+        logger.info(f"torch.compile enabled for {type(model).__name__}.{method}")
+    except Exception as e:
+        logger.warning(f"torch.compile unavailable for {type(model).__name__}: {e}")
+    return model
+
+
+def _compiler():
+    """torch.compiler if it supports cache artifacts, else None"""
+    try:
+        import torch
+    except ImportError:
+        return None
+    compiler = getattr(torch, "compiler", None)
+    if compiler is None or not hasattr(compiler, "load_cache_artifacts"):
+        return None
+    return compiler
+
+
+def _load_compile_artifacts():
+    path = os.path.join(_cache_dir(), _ARTIFACTS_FILE)
+    compiler = _compiler()
+    if compiler is None or not os.path.exists(path):
+        return
+    try:
+        with open(path, 'rb') as f:
+            compiler.load_cache_artifacts(f.read())
+        logger.info(f"Loaded torch.compile cache artifacts from {path}")
+    except Exception as e:
+        logger.warning(f"Could not load torch.compile cache artifacts: {e}")
+
+
+def _save_compile_artifacts():
+    compiler = _compiler()
+    if compiler is None:
+        return
+    try:
+        artifacts = compiler.save_cache_artifacts()
+        if not artifacts:
+            return
+        path = os.path.join(_cache_dir(), _ARTIFACTS_FILE)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", 'wb') as f:
+            f.write(artifacts[0])
+        os.replace(path + ".tmp", path)
+        logger.info(f"Saved torch.compile cache artifacts to {path}")
+    except Exception as e:
+        logger.warning(f"Could not save torch.compile cache artifacts: {e}")
+
+
+def _dummy_decode():
+    """Decode one window of silence codes through the chunked XCodec path"""
+    try:
+        from xcodec_real_decoder import decode_with_xcodec
+    except ImportError:
+        return
+    with span("warmup.decode"):
+        decode_with_xcodec(np.zeros(XCODEC_CHUNK_FRAMES, dtype=np.int64))
+
+
+def warm_up() -> bool:
+    """
+    Load the configured pipeline's models and, with WARMUP_DUMMY_JOB, run the
+    dummy generation and decode. Returns False if the models failed to load
+    (a failing dummy job is only logged)
+    """
+    start = time.perf_counter()
+    if WARMUP_TORCH_COMPILE:
+        _load_compile_artifacts()
+
+    with span("warmup", pipeline=PIPELINE_MODE, dummy_job=WARMUP_DUMMY_JOB):
+        if PIPELINE_MODE == "huggingface":
+            from yue_hf_client import warm_up_hq
+            # Stage 2 only runs in the warm-up when it has something to compile
+            ok = warm_up_hq(dummy_job=WARMUP_DUMMY_JOB, stage2=WARMUP_TORCH_COMPILE)
+        else:
+            from yue_client import warm_up as warm_up_gguf
+            ok = warm_up_gguf(dummy_job=WARMUP_DUMMY_JOB)
+
+        if ok and WARMUP_DUMMY_JOB:
+            try:
+                _dummy_decode()
+            except Exception as e:
+                logger.warning(f"Warm-up decode failed: {e}", exc_info=True)
+
+    if ok and WARMUP_TORCH_COMPILE:
+        _save_compile_artifacts()
+    logger.info(f"Warm-up {'done' if ok else 'failed'} in {time.perf_counter() - start:.1f}s")
+    return ok
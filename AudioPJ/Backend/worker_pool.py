@@ -0,0 +1,292 @@
+"""
+Inference Worker Pool
+Runs the generation pipeline in separate processes, so torch and llama.cpp
+never share the GIL or the address space with the API server. Audio comes
+back through shared memory instead of being pickled, and a worker that dies
+is replaced while its in-flight jobs fail cleanly
+"""
+import contextlib
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import tracing
+from audio_output import encode_job
+from config import INFERENCE_WORKERS, METRICS_PUSH_SECONDS, WORKER_RESTART_DELAY_SECONDS
+from metrics import Sample, observe, process_readings, set_forwarder
+from pipeline_factory import Readiness, load_pipeline
+
+logger = logging.getLogger(__name__)
+
+# How often a monitor checks whether its worker process is still alive
+_POLL_SECONDS = 1.0
+
+
+def share_array(array: np.ndarray) -> Dict[str, Any]:
+    """Copy an array into a new shared memory block. The receiver must unlink it"""
+    array = np.ascontiguousarray(array)
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+    handle = {"name": block.name, "shape": array.shape, "dtype": array.dtype.str}
+    block.close()
+    return handle
+
+
+@contextlib.contextmanager
+def attached_array(handle: Dict[str, Any]):
+    """View of a shared array; the block is released and unlinked on exit"""
+    block = shared_memory.SharedMemory(name=handle["name"])
+    try:
+        yield np.ndarray(handle["shape"], dtype=np.dtype(handle["dtype"]), buffer=block.buf)
+    finally:
+        block.close()
+        block.unlink()
+
+
+def release_shared(payload: Any):
+    """Unlink the shared arrays of a result nobody will read"""
+    if not isinstance(payload, dict):
+        return
+    for value in payload.values():
+        if isinstance(value, dict) and {"name", "shape", "dtype"} <= value.keys():
+            try:
+                with attached_array(value):
+                    pass
+            except FileNotFoundError:
+                pass
+
+
+def _hand_off(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Encode stage inside a worker: pass the PCM audio to the API process to write"""
+    job["result"] = {
+        "audio": share_array(job.pop("audio_int16")),
+        "audio_filename": job["audio_filename"],
+        "sample_rate": job["sample_rate"],
+        "cache_key": job.get("cache_key"),
+    }
+    return job
+
+
+def _worker_main(index: int, tasks, results):
+    """Entry point of a worker process: runs every received job on its own thread"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f'%(asctime)s - worker-{index} - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler("backend.log", encoding='utf-8'),
+            logging.StreamHandler()
+        ]
+    )
+    from stage_pipeline import set_stage_override
+    set_stage_override("encode", _hand_off)
+    # Histograms live in the API process; gauges are sent as periodic snapshots
+    set_forwarder(lambda name, value, labels: results.put(("metric", None, name, value, labels)))
+    tracing.set_forwarder(lambda span_data: results.put(("span", None, span_data)))
+
+    def push_readings():
+        while True:
+            results.put(("readings", None, process_readings()))
+            time.sleep(METRICS_PUSH_SECONDS)
+    threading.Thread(target=push_readings, name="metrics-push", daemon=True).start()
+    # Tasks queued meanwhile wait for the warm-up; the API learns when it is done
+    readiness = Readiness()
+    readiness.run()
+    results.put(("ready", None, readiness.describe()))
+    run_pipeline = load_pipeline()
+
+    def run(job_id: str, args: Tuple, kwargs: Dict[str, Any], trace: Optional[tracing.SpanContext]):
+        def progress(stage, progress, **info):
+            results.put(("progress", job_id, stage, progress, info))
+        try:
+            with tracing.span("worker.pipeline", parent=trace, worker=index):
+                result = run_pipeline(*args, progress_callback=progress, **kwargs)
+            results.put(("done", job_id, result))
+        except Exception as e:
+            logger.error(f"Job {job_id} failed in worker {index}: {e}", exc_info=True)
+            results.put(("error", job_id, str(e)))
+
+    # Several jobs run at once so they can occupy different pipeline stages
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        threading.Thread(target=run, args=task, name=f"job-{task[0][:8]}", daemon=True).start()
+
+
+class _PendingJob:
+    def __init__(self, progress_callback: Callable):
+        self.future: Future = Future()
+        self.progress_callback = progress_callback
+
+
+class _Worker:
+    def __init__(self, index: int, context):
+        self.index = index
+        self.tasks = context.Queue()
+        self.results = context.Queue()
+        self.process = context.Process(
+            target=_worker_main, args=(index, self.tasks, self.results),
+            name=f"inference-{index}", daemon=True
+        )
+        self.jobs: Dict[str, _PendingJob] = {}
+
+
+class InferenceWorkerPool:
+    """
+    Fixed set of worker processes, each loading the pipeline once
+
+    run() blocks the calling thread (a scheduler worker) until the job is
+    done; progress messages are relayed to the job's callback as they arrive.
+    Jobs go to the worker with the fewest jobs in flight.
+    """
+
+    def __init__(self, size: int = INFERENCE_WORKERS):
+        self.size = max(1, size)
+        # spawn: no forked copies of the server's threads and locks
+        self._context = multiprocessing.get_context("spawn")
+        self._workers: List[_Worker] = []
+        # Latest process_readings() snapshot of each worker slot
+        self._readings: Dict[int, List[Sample]] = {}
+        # Warm-up state reported by each worker slot (absent while warming)
+        self._ready: Dict[int, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._stopping = False
+
+    def start(self):
+        with self._lock:
+            if self._workers:
+                return
+            self._stopping = False
+            self._workers = [self._spawn(i) for i in range(self.size)]
+        logger.info(f"Inference worker pool started with {self.size} process(es)")
+
+    def stop(self):
+        with self._lock:
+            self._stopping = True
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.tasks.put(None)
+        for worker in workers:
+            worker.process.join(timeout=5.0)
+            if worker.process.is_alive():
+                worker.process.terminate()
+
+    def _spawn(self, index: int) -> _Worker:
+        worker = _Worker(index, self._context)
+        worker.process.start()
+        threading.Thread(
+            target=self._monitor, args=(worker,), name=f"inference-monitor-{index}", daemon=True
+        ).start()
+        return worker
+
+    def _monitor(self, worker: _Worker):
+        while True:
+            try:
+                message = worker.results.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                if worker.process.is_alive():
+                    continue
+                if not self._stopping:
+                    self._replace(worker)
+                return
+            self._dispatch(worker, message)
+
+    def _dispatch(self, worker: _Worker, message: Tuple):
+        kind, job_id = message[0], message[1]
+        if kind == "metric":
+            _, _, name, value, labels = message
+            observe(name, value, **labels)
+            return
+        if kind == "readings":
+            with self._lock:
+                self._readings[worker.index] = message[2]
+            return
+        if kind == "span":
+            tracing.record(message[2])
+            return
+        if kind == "ready":
+            with self._lock:
+                self._ready[worker.index] = message[2]
+            logger.info(f"Inference worker {worker.index} warm-up: {message[2]['status']}")
+            return
+        with self._lock:
+            pending = worker.jobs.get(job_id) if kind == "progress" else worker.jobs.pop(job_id, None)
+        if pending is None:
+            # e.g. the job was failed when its worker was replaced
+            if kind == "done":
+                release_shared(message[2])
+            return
+        if kind == "progress":
+            _, _, stage, progress, info = message
+            try:
+                pending.progress_callback(stage, progress, **info)
+            except Exception as e:
+                logger.error(f"Progress callback failed for job {job_id}: {e}", exc_info=True)
+        elif kind == "done":
+            pending.future.set_result(message[2])
+        else:
+            pending.future.set_exception(RuntimeError(message[2]))
+
+    def _replace(self, worker: _Worker):
+        """Fail the jobs of a dead worker and start a fresh process in its slot"""
+        exit_code = worker.process.exitcode
+        logger.error(f"Inference worker {worker.index} died (exit code {exit_code}), restarting it")
+        time.sleep(WORKER_RESTART_DELAY_SECONDS)
+        with self._lock:
+            if not self._stopping:
+                self._workers[worker.index] = self._spawn(worker.index)
+            # Also covers jobs routed to the dead process before the swap
+            orphans, worker.jobs = worker.jobs, {}
+            self._readings.pop(worker.index, None)
+            self._ready.pop(worker.index, None)
+        if orphans:
+            logger.error(f"Failing {len(orphans)} job(s) of inference worker {worker.index}")
+        for pending in orphans.values():
+            pending.future.set_exception(RuntimeError(f"Inference worker crashed (exit code {exit_code})"))
+
+    def readiness(self) -> Dict[str, Any]:
+        """Ready once every worker has warmed up; "failed" if any warm-up failed"""
+        with self._lock:
+            workers = {f"worker-{i}": self._ready.get(i, {"status": "warming"}) for i in range(self.size)}
+            if not self._workers:
+                status = "cold"
+            elif any(state["status"] == "failed" for state in workers.values()):
+                status = "failed"
+            elif all(state["status"] == "ready" for state in workers.values()):
+                status = "ready"
+            else:
+                status = "warming"
+        return {"status": status, "workers": workers}
+
+    def readings(self) -> List[Sample]:
+        """Latest gauges reported by the workers, labelled with their process"""
+        with self._lock:
+            return [
+                (name, dict(labels, process=f"worker-{index}"), value)
+                for index, samples in sorted(self._readings.items())
+                for name, labels, value in samples
+            ]
+
+    def run(self, job_id: str, args: Tuple, kwargs: Dict[str, Any],
+            progress_callback: Callable) -> Optional[str]:
+        """Run run_pipeline(*args, **kwargs) in a worker. Returns the output filename"""
+        pending = _PendingJob(progress_callback)
+        with self._lock:
+            worker = min(self._workers, key=lambda w: len(w.jobs))
+            worker.jobs[job_id] = pending
+            worker.tasks.put((job_id, args, kwargs, tracing.current_context()))
+        result = pending.future.result()
+
+        # Cache hits and failures come back as a filename or None
+        if not isinstance(result, dict):
+            return result
+        # Write the WAV straight from the shared block, without an extra copy
+        with attached_array(result.pop("audio")) as audio, tracing.span("api.encode"):
+            return encode_job(dict(result, audio_int16=audio))["result"]
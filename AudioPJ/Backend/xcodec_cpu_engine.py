@@ -0,0 +1,106 @@
+"""
+XCodec CPU Engines
+Runs the exported XCodec2 decode graph (see xcodec_export.py) through ONNX
+Runtime or TorchScript on CPU-only nodes. Engines expose decode_code() like
+the eager model, so the decoding code does not need to know which one it has
+"""
+import logging
+import os
+from typing import Any, Optional, Tuple
+
+import numpy as np
+
+from config import XCODEC_CPU_ENGINE, XCODEC_EXPORT_DIR, XCODEC_ONNX_THREADS
+
+logger = logging.getLogger(__name__)
+
+
+def export_paths() -> Tuple[str, str]:
+    """(ONNX path, TorchScript path) of the exported decoder"""
+    root = XCODEC_EXPORT_DIR
+    if not os.path.isabs(root):
+        root = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), root))
+    return os.path.join(root, "xcodec2_decoder.onnx"), os.path.join(root, "xcodec2_decoder.pt")
+
+
+def _as_numpy_codes(codes: Any) -> np.ndarray:
+    if hasattr(codes, "detach"):
+        codes = codes.detach().cpu().numpy()
+    return np.asarray(codes, dtype=np.int64)
+
+
+class OnnxXCodecEngine:
+    """
+    XCodec2 decoder on ONNX Runtime (CPU)
+
+    The first load applies every graph optimization and saves the optimized
+    graph next to the export; later loads read it back with optimizations
+    off, skipping that work. A new export invalidates the cached graph.
+    """
+
+    def __init__(self, path: str, threads: int = XCODEC_ONNX_THREADS):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        optimized = os.path.splitext(path)[0] + ".optimized.onnx"
+        if os.path.exists(optimized) and os.path.getmtime(optimized) >= os.path.getmtime(path):
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+            model_path = optimized
+            logger.info(f"Loading optimized XCodec ONNX graph from cache: {optimized}")
+        else:
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            options.optimized_model_filepath = optimized
+            model_path = path
+            logger.info(f"Optimizing XCodec ONNX graph (cached to {optimized})")
+
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def decode_code(self, codes: Any) -> np.ndarray:
+        """(batch, 1, frames) codes -> (batch, 1, samples) float32 audio"""
+        return self.session.run(None, {self.input_name: _as_numpy_codes(codes)})[0]
+
+
+class TorchScriptXCodecEngine:
+    """XCodec2 decoder as a frozen TorchScript module (CPU)"""
+
+    def __init__(self, path: str):
+        import torch
+
+        module = torch.jit.load(path, map_location="cpu").eval()
+        self.module = torch.jit.optimize_for_inference(torch.jit.freeze(module))
+
+    def decode_code(self, codes: Any):
+        import torch
+
+        with torch.no_grad():
+            return self.module(torch.as_tensor(_as_numpy_codes(codes)))
+
+
+def load_cpu_engine(engine: str = XCODEC_CPU_ENGINE) -> Optional[Any]:
+    """
+    The exported decoder selected by `engine` ("auto", "onnx", "torchscript"),
+    or None when it is "eager", nothing was exported or the runtime is missing
+    """
+    if engine == "eager":
+        return None
+    onnx_path, torchscript_path = export_paths()
+
+    if engine in ("auto", "onnx") and os.path.exists(onnx_path):
+        try:
+            return OnnxXCodecEngine(onnx_path)
+        except ImportError:
+            logger.warning("XCodec ONNX export found but onnxruntime is not installed")
+        except Exception as e:
+            logger.error(f"Failed to load XCodec ONNX engine: {e}", exc_info=True)
+
+    if engine in ("auto", "torchscript") and os.path.exists(torchscript_path):
+        try:
+            logger.info(f"Loading XCodec TorchScript engine from {torchscript_path}")
+            return TorchScriptXCodecEngine(torchscript_path)
+        except Exception as e:
+            logger.error(f"Failed to load XCodec TorchScript engine: {e}", exc_info=True)
+
+    return None
@@ -2,141 +2,144 @@
 XCodec Token Decoder for YuE
 Extracts and decodes audio tokens from Stage 1 output
 """
-import re
+import functools
 import logging
+import math
 import numpy as np
-import torch
-from typing import List, Optional
+from typing import Iterator, Optional
+
+# Re-exported for callers that still hold Stage 1 output as text
+from audio_tokens import extract_audio_tokens, log_token_stats
 
 logger = logging.getLogger(__name__)
 
+# The placeholder synthesizer works in blocks so memory does not grow with duration
+SYNTH_BLOCK_SAMPLES = 65536
+SYNTH_FADE_SECONDS = 0.1
+SYNTH_HARMONIC_HZ = 880
+
 
-def extract_audio_tokens(text: str) -> List[int]:
+@functools.lru_cache(maxsize=4)
+def _harmonic_table(sample_rate: int, block_samples: int) -> np.ndarray:
     """
-    Extract xcodec tokens from Stage 1 text output
-    Format: <xcodec/0/NUMBER>
-    Returns: List of token IDs
+    One exact period of the octave harmonic plus a block's worth of samples, so
+    every block can take its harmonic as a slice instead of computing sines
     """
-    # Find all xcodec tokens
-    pattern = r'<xcodec/0/(\d+)>'
-    matches = re.findall(pattern, text)
-
-    if not matches:
-        logger.warning("No xcodec tokens found in output")
-        return []
-
-    tokens = [int(match) for match in matches]
-    logger.info(f"Extracted {len(tokens)} audio tokens")
-    logger.info(f"Token range: {min(tokens)} to {max(tokens)}")
-
-    return tokens
+    period = sample_rate // math.gcd(sample_rate, SYNTH_HARMONIC_HZ)
+    index = np.arange(period + block_samples, dtype=np.int64)
+    phase = (index * SYNTH_HARMONIC_HZ % sample_rate) / sample_rate
+    table = (np.sin(2 * np.pi * phase) * 0.01).astype(np.float32)
+    table.setflags(write=False)
+    return table
 
 
-def tokens_to_audio_simple(tokens: List[int], sample_rate: int = 44100, duration: float = 30.0) -> np.ndarray:
+def synthesize_blocks(tokens: np.ndarray, sample_rate: int = 44100, duration: float = 30.0,
+                      block_samples: int = SYNTH_BLOCK_SAMPLES) -> Iterator[np.ndarray]:
     """
-    Simple token-to-audio conversion using token values as frequency modulation
-    This is a placeholder that creates melodic audio based on the token sequence
+    Yield the placeholder waveform as float32 blocks of at most block_samples
 
-    For real decoding, this would use the Stage 2 model or xcodec vocoder
+    Each token holds a frequency for an equal share of the duration. The phase
+    is accumulated across token segments, so frequency changes are continuous
+    and click-free. Memory stays O(block_samples), and the output is
+    bit-identical for a given token array.
     """
-    if not tokens:
-        logger.error("No tokens provided for audio generation")
-        return None
-
-    logger.info(f"Generating audio from {len(tokens)} tokens...")
-
-    # Calculate samples
+    token_array = np.asarray(tokens, dtype=np.float64)
+    n_tokens = len(token_array)
     total_samples = int(sample_rate * duration)
 
-    # Map tokens to frequencies (normalize token range to musical scale)
-    token_array = np.array(tokens, dtype=float)
-
-    # Normalize tokens to 0-1 range
+    # Map tokens to musical frequency range (A3 to A5: 220-880 Hz), in cycles per sample
     token_min = token_array.min()
     token_max = token_array.max()
     if token_max > token_min:
         normalized = (token_array - token_min) / (token_max - token_min)
     else:
         normalized = np.zeros_like(token_array)
+    cycles_per_sample = (220 + normalized * 660) / sample_rate
+
+    # Segment boundaries and the phase (in cycles) each segment starts at, accumulated
+    # in float64 over tokens; per-sample work then only spans one segment and runs in float32
+    bounds = np.arange(n_tokens + 1, dtype=np.int64) * total_samples // n_tokens
+    start_cycles = np.concatenate(([0.0], np.cumsum(cycles_per_sample * np.diff(bounds))[:-1]))
+    start_phase = (start_cycles - np.floor(start_cycles)).astype(np.float32)
+    step = cycles_per_sample.astype(np.float32)
+
+    harmonic = _harmonic_table(sample_rate, block_samples)
+    period = len(harmonic) - block_samples
+    fade_samples = max(1, int(sample_rate * SYNTH_FADE_SECONDS))
+    # Fixed gain: the peak is bounded by 0.91, so no global normalisation pass is needed
+    gain = np.float32(0.8 / 0.91)
+    two_pi = np.float32(2 * np.pi)
+
+    for start in range(0, total_samples, block_samples):
+        end = min(start + block_samples, total_samples)
+        first = np.searchsorted(bounds, start, side="right") - 1
+        last = np.searchsorted(bounds, end - 1, side="right") - 1
+        lengths = np.diff(np.clip(bounds[first:last + 2], start, end))
+
+        # Samples since the start of the active segment, and its phase there
+        offset = np.arange(start, end, dtype=np.int64) - np.repeat(bounds[first:last + 1], lengths)
+        cycles = np.repeat(step[first:last + 1], lengths) * offset.astype(np.float32)
+        cycles += np.repeat(start_phase[first:last + 1], lengths)
+        cycles *= two_pi
+        block = np.sin(cycles)
+        block *= np.float32(0.9)
+
+        # Subtle octave harmonic for richness
+        block += harmonic[start % period:start % period + end - start]
+
+        # Overall fade in/out, applied only where it overlaps the block
+        if start < fade_samples:
+            head = min(end, fade_samples) - start
+            block[:head] *= np.arange(start, start + head, dtype=np.float32) / fade_samples
+        if end > total_samples - fade_samples:
+            tail = max(start, total_samples - fade_samples)
+            block[tail - start:] *= (total_samples - 1 - np.arange(tail, end, dtype=np.float32)) / fade_samples
+
+        block *= gain
+        yield block
+
+
+def tokens_to_audio_simple(tokens: np.ndarray, sample_rate: int = 44100, duration: float = 30.0) -> np.ndarray:
+    """
+    Simple token-to-audio conversion using token values as frequency modulation
+    This is a placeholder that creates melodic audio based on the token sequence
 
-    # Map to musical frequency range (A3 to A5: 220-880 Hz)
-    frequencies = 220 + normalized * 660
-
-    # Create time array
-    t = np.linspace(0, duration, total_samples, False)
-
-    # Generate audio by interpolating between token frequencies
-    audio = np.zeros(total_samples)
-
-    # Each token controls a time segment
-    samples_per_token = total_samples // len(tokens)
-
-    for i, freq in enumerate(frequencies):
-        start_idx = i * samples_per_token
-        end_idx = min((i + 1) * samples_per_token, total_samples)
-
-        if start_idx >= total_samples:
-            break
-
-        segment_t = t[start_idx:end_idx]
-        # Generate sine wave for this segment with smooth transitions
-        phase_offset = 0 if i == 0 else audio[start_idx - 1]
-        audio[start_idx:end_idx] = np.sin(2 * np.pi * freq * segment_t + phase_offset)
-
-        # Apply envelope to smooth transitions between tokens
-        if i > 0:
-            # Crossfade with previous segment
-            fade_samples = min(100, samples_per_token // 4)
-            fade_in = np.linspace(0, 1, fade_samples)
-            audio[start_idx:start_idx + fade_samples] *= fade_in
-
-    # Apply overall envelope (fade in/out)
-    fade_duration = 0.1  # seconds
-    fade_samples = int(sample_rate * fade_duration)
-
-    # Fade in
-    audio[:fade_samples] *= np.linspace(0, 1, fade_samples)
-
-    # Fade out
-    audio[-fade_samples:] *= np.linspace(1, 0, fade_samples)
+    For real decoding, this would use the Stage 2 model or xcodec vocoder
+    """
+    if tokens is None or len(tokens) == 0:
+        logger.error("No tokens provided for audio generation")
+        return None
 
-    # Add subtle harmonics for richness
-    harmonic = np.sin(4 * np.pi * 440 * t) * 0.1  # Octave harmonic
-    audio = audio * 0.9 + harmonic[:len(audio)] * 0.1
+    logger.info(f"Generating audio from {len(tokens)} tokens...")
 
-    # Normalize
-    if audio.max() > 0:
-        audio = audio / np.abs(audio).max() * 0.8
+    audio = np.empty(int(sample_rate * duration), dtype=np.float32)
+    offset = 0
+    for block in synthesize_blocks(tokens, sample_rate, duration):
+        audio[offset:offset + len(block)] = block
+        offset += len(block)
 
     logger.info(f"Generated audio: {len(audio)} samples, {duration:.2f} seconds")
 
     return audio
 
 
-def decode_stage1_output(output_text: str, sample_rate: int = 44100, duration: float = 30.0) -> Optional[np.ndarray]:
+def decode_codes(tokens: np.ndarray, sample_rate: int = 44100, duration: float = 30.0) -> Optional[np.ndarray]:
     """
-    Complete pipeline: extract tokens from text and generate audio
+    Generate audio from XCodec codes (see audio_tokens.codes_from_ids)
 
     Args:
-        output_text: Raw text output from Stage 1 (contains xcodec tokens)
+        tokens: Integer array of codec codes from Stage 1
         sample_rate: Audio sample rate (default 44.1kHz)
         duration: Target duration in seconds
 
     Returns:
         Audio array or None if failed
     """
-    # Extract tokens
-    tokens = extract_audio_tokens(output_text)
-
-    if not tokens:
+    if len(tokens) == 0:
         logger.error("No audio tokens found in Stage 1 output")
         return None
 
-    # Log statistics
-    logger.info(f"Token statistics:")
-    logger.info(f"  Count: {len(tokens)}")
-    logger.info(f"  Unique tokens: {len(set(tokens))}")
-    logger.info(f"  Most common: {max(set(tokens), key=tokens.count)}")
+    log_token_stats(tokens)
 
     # Generate audio from tokens
     audio = tokens_to_audio_simple(tokens, sample_rate, duration)
@@ -147,3 +150,8 @@ def decode_stage1_output(output_text: str, sample_rate: int = 44100, duration: f
         logger.error("❌ Token-to-audio decoding failed")
 
     return audio
+
+
+def decode_stage1_output(output_text: str, sample_rate: int = 44100, duration: float = 30.0) -> Optional[np.ndarray]:
+    """Extract codes from Stage 1 text output and generate audio"""
+    return decode_codes(extract_audio_tokens(output_text), sample_rate, duration)
@@ -0,0 +1,201 @@
+"""
+XCodec Export
+Converts the XCodec2 decode graph to ONNX (falling back to TorchScript when
+the ONNX export fails) for the CPU engines in xcodec_cpu_engine, checks
+the export against eager PyTorch at every input shape the decoders use, and
+benchmarks the exported engine
+
+Usage:
+    python xcodec_export.py                  # export (ONNX, else TorchScript)
+    python xcodec_export.py --format torchscript
+    python xcodec_export.py --benchmark      # compare with eager mode
+"""
+import argparse
+import logging
+import os
+import time
+
+import numpy as np
+import torch
+
+from config import PROGRESSIVE_CHUNK_FRAMES, XCODEC_CHUNK_FRAMES
+from xcodec_cpu_engine import OnnxXCodecEngine, TorchScriptXCodecEngine, export_paths, load_cpu_engine
+from xcodec_real_decoder import load_xcodec_eager
+
+logger = logging.getLogger(__name__)
+
+# XCodec2 uses a single FSQ codebook of 65536 codes
+XCODEC_CODEBOOK_SIZE = 65536
+ONNX_OPSET = 17
+# Odd and shorter than any window, like the tails flushed at the end of a stream
+_TAIL_FRAMES = 37
+# Largest difference from eager output an export may have (float32 audio in [-1, 1])
+_MAX_ABS_DIFFERENCE = 1e-3
+
+
+class _DecodeGraph(torch.nn.Module):
+    """decode_code as a module forward, which is what the exporters trace"""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, codes: torch.Tensor) -> torch.Tensor:
+        return self.model.decode_code(codes)
+
+
+def _example_codes(frames: int, batch: int = 1) -> torch.Tensor:
+    return torch.randint(0, XCODEC_CODEBOOK_SIZE, (batch, 1, frames), dtype=torch.long)
+
+
+def check_shapes(frames: int):
+    """
+    (batch, frames) inputs an export must handle: full chunks, progressive
+    windows, a short flush tail and a decode batch
+    """
+    return sorted({(1, frames), (1, PROGRESSIVE_CHUNK_FRAMES), (1, _TAIL_FRAMES), (2, PROGRESSIVE_CHUNK_FRAMES)})
+
+
+def verify(engine, model, frames: int):
+    """
+    Raise if the engine's output differs from eager decode_code at any of the
+    check_shapes: tracing freezes shape-dependent Python arithmetic, which
+    shows up as a wrong output length or garbage past the traced length
+    """
+    for batch, length in check_shapes(frames):
+        codes = _example_codes(length, batch)
+        with torch.no_grad():
+            expected = model.decode_code(codes).detach().float().cpu().numpy()
+        actual = engine.decode_code(codes)
+        if isinstance(actual, torch.Tensor):
+            actual = actual.detach().float().cpu().numpy()
+        if actual.shape != expected.shape:
+            raise RuntimeError(f"{batch} x {length} frames: output shape {actual.shape}, eager {expected.shape}")
+        difference = float(np.abs(actual - expected).max())
+        if difference > _MAX_ABS_DIFFERENCE:
+            raise RuntimeError(f"{batch} x {length} frames: max abs difference {difference:.2e} from eager")
+        logger.info(f"Export check {batch} x {length} frames: OK (max abs difference {difference:.2e})")
+
+
+def _verify_or_remove(load_engine, model, path: str, frames: int):
+    """Check a fresh export; delete it if it is wrong so it is never loaded"""
+    try:
+        verify(load_engine(path), model, frames)
+    except Exception:
+        os.remove(path)
+        raise
+
+
+def load_eager_cpu():
+    """Eager XCodec2 in float32 on CPU, the reference the exports are made from"""
+    return load_xcodec_eager().float().cpu().eval()
+
+
+def export_onnx(model, path: str, frames: int):
+    with torch.no_grad():
+        torch.onnx.export(
+            _DecodeGraph(model), (_example_codes(frames),), path,
+            input_names=["codes"], output_names=["audio"],
+            # Batch and length vary: chunked decoding and the decode batcher
+            dynamic_axes={"codes": {0: "batch", 2: "frames"}, "audio": {0: "batch", 2: "samples"}},
+            opset_version=ONNX_OPSET,
+        )
+    try:
+        import onnxruntime  # noqa: F401
+    except ImportError:
+        logger.warning("onnxruntime is not installed: the ONNX export was not checked against eager mode")
+        return
+    _verify_or_remove(OnnxXCodecEngine, model, path, frames)
+
+
+def export_torchscript(model, path: str, frames: int):
+    graph = _DecodeGraph(model)
+    with torch.no_grad():
+        # The trace is re-run and compared at every checked shape
+        traced = torch.jit.trace(
+            graph, (_example_codes(frames),),
+            check_inputs=[(_example_codes(length, batch),) for batch, length in check_shapes(frames)]
+        )
+    traced.save(path)
+    # Also checks freezing and optimize_for_inference, which the engine applies on load
+    _verify_or_remove(TorchScriptXCodecEngine, model, path, frames)
+
+
+def export(fmt: str = "auto", frames: int = XCODEC_CHUNK_FRAMES) -> str:
+    """Export the decoder. Returns the path written"""
+    onnx_path, torchscript_path = export_paths()
+    os.makedirs(os.path.dirname(onnx_path), exist_ok=True)
+    model = load_eager_cpu()
+
+    if fmt in ("auto", "onnx"):
+        try:
+            logger.info(f"Exporting XCodec2 decoder to ONNX (opset {ONNX_OPSET}): {onnx_path}")
+            export_onnx(model, onnx_path, frames)
+            return onnx_path
+        except Exception as e:
+            if fmt == "onnx":
+                raise
+            logger.warning(f"ONNX export failed ({e}), falling back to TorchScript")
+
+    logger.info(f"Exporting XCodec2 decoder to TorchScript: {torchscript_path}")
+    export_torchscript(model, torchscript_path, frames)
+    return torchscript_path
+
+
+def _time_decode(decoder, codes: torch.Tensor, repeats: int):
+    decoder.decode_code(codes)  # warm-up
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        audio = decoder.decode_code(codes)
+        timings.append(time.perf_counter() - start)
+    if isinstance(audio, torch.Tensor):
+        audio = audio.detach().float().cpu().numpy()
+    return float(np.median(timings)), np.asarray(audio, dtype=np.float32)
+
+
+def benchmark(frames: int = XCODEC_CHUNK_FRAMES, batch: int = 1, repeats: int = 5):
+    """Median decode time of eager PyTorch vs the exported engine on the same codes"""
+    engine = load_cpu_engine()
+    if engine is None:
+        print("No exported engine found: run `python xcodec_export.py` first")
+        return
+    model = load_eager_cpu()
+    codes = _example_codes(frames, batch)
+    with torch.no_grad():
+        eager_seconds, eager_audio = _time_decode(model, codes, repeats)
+    engine_seconds, engine_audio = _time_decode(engine, codes, repeats)
+
+    audio_seconds = batch * frames / 50
+    print(f"XCodec2 decode, {batch} x {frames} frames ({audio_seconds:.0f}s of audio), "
+          f"{torch.get_num_threads()} torch threads")
+    print(f"  eager PyTorch  {eager_seconds * 1000:8.1f} ms  ({audio_seconds / eager_seconds:6.1f}x realtime)")
+    print(f"  {type(engine).__name__:<14} {engine_seconds * 1000:8.1f} ms  "
+          f"({audio_seconds / engine_seconds:6.1f}x realtime, {eager_seconds / engine_seconds:.2f}x vs eager)")
+    print(f"  max abs difference: {np.abs(eager_audio - engine_audio).max():.2e}")
+    try:
+        verify(engine, model, frames)
+        print(f"  shape check: OK ({', '.join(f'{b}x{n}' for b, n in check_shapes(frames))} frames)")
+    except RuntimeError as e:
+        print(f"  shape check: FAILED, {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the XCodec2 decoder for CPU inference")
+    parser.add_argument("--format", choices=["auto", "onnx", "torchscript"], default="auto")
+    parser.add_argument("--frames", type=int, default=XCODEC_CHUNK_FRAMES,
+                        help="length of the example input used for tracing")
+    parser.add_argument("--benchmark", action="store_true", help="benchmark the existing export")
+    parser.add_argument("--batch", type=int, default=1)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if args.benchmark:
+        benchmark(args.frames, args.batch, args.repeats)
+    else:
+        print(f"Exported: {export(args.format, args.frames)}")
+
+
+if __name__ == "__main__":
+    main()
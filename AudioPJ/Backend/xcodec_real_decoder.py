@@ -3,89 +3,251 @@ Real XCodec Decoder for YuE
 Uses the actual XCodec model from Hugging Face to decode audio tokens
 """
 import logging
+import threading
 import numpy as np
 import torch
-from typing import List, Optional
-import re
+from typing import Iterator, List, Optional
+
+# Re-exported for callers that still hold Stage 1 output as text
+from audio_tokens import extract_audio_tokens, log_token_stats
+from config import (
+    XCODEC_BATCH_BUCKET_FRAMES, XCODEC_BATCH_WINDOW_MS, XCODEC_BATCHING_ENABLED, XCODEC_CHUNK_FRAMES,
+    XCODEC_MAX_BATCH_SIZE, XCODEC_OVERLAP_FRAMES, XCODEC_SIZE_GB
+)
+from metrics import timed
+from model_manager import get_model_manager
+from resampler import resample_blocks
+from tracing import span
+from warmup import maybe_compile
+from stage1_batcher import BatchItem, MicroBatcher
+from xcodec_cpu_engine import load_cpu_engine
 
 logger = logging.getLogger(__name__)
 
-# Global codec model (loaded once)
-_xcodec_model = None
-_xcodec_processor = None
+# XCodec2 decodes at 16kHz
+XCODEC_PROCESSOR = {"sampling_rate": 16000}
 
 
-def load_xcodec_model():
-    """Load the XCodec model from Hugging Face"""
-    global _xcodec_model, _xcodec_processor
+def load_xcodec_eager():
+    """Download and load the XCodec2 model as eager PyTorch"""
+    logger.info("Loading XCodec2 model from Hugging Face (with custom code)...")
 
-    if _xcodec_model is not None:
-        return _xcodec_model, _xcodec_processor
+    # XCodec2 requires loading the custom modeling code
+    # We need to use the model's custom class directly
+    import sys
+    from huggingface_hub import snapshot_download
 
-    try:
-        logger.info("Loading XCodec2 model from Hugging Face (with custom code)...")
+    # Download the model repository
+    model_path = snapshot_download("HKUSTAudio/xcodec2")
+    logger.info(f"Model downloaded to: {model_path}")
 
-        # XCodec2 requires loading the custom modeling code
-        # We need to use the model's custom class directly
-        import sys
-        from pathlib import Path
-        from huggingface_hub import hf_hub_download, snapshot_download
+    # Add to Python path so we can import the custom code
+    if model_path not in sys.path:
+        sys.path.insert(0, model_path)
 
-        # Download the model repository
-        model_path = snapshot_download("HKUSTAudio/xcodec2")
-        logger.info(f"Model downloaded to: {model_path}")
+    # Import the custom XCodec2 model class
+    from modeling_xcodec2 import XCodec2Model
 
-        # Add to Python path so we can import the custom code
-        if model_path not in sys.path:
-            sys.path.insert(0, model_path)
+    # Load the model
+    model = XCodec2Model.from_pretrained(
+        model_path,
+        torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32
+    )
 
-        # Import the custom XCodec2 model class
-        from modeling_xcodec2 import XCodec2Model
+    # Move to GPU if available
+    if torch.cuda.is_available():
+        model = model.cuda()
+
+    model.eval()
+    return model
 
-        # Load the model
-        _xcodec_model = XCodec2Model.from_pretrained(
-            model_path,
-            torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32
-        )
 
-        # Move to GPU if available
-        if torch.cuda.is_available():
-            _xcodec_model = _xcodec_model.cuda()
+def _load_xcodec():
+    """Loader for the model manager: exported CPU engine on CPU-only nodes, else eager"""
+    if not torch.cuda.is_available():
+        engine = load_cpu_engine()
+        if engine is not None:
+            logger.info(f"Using {type(engine).__name__} for XCodec decoding on CPU")
+            return engine
+    return maybe_compile(load_xcodec_eager(), "decode_code")
 
-        _xcodec_model.eval()
 
-        # XCodec2 uses 16kHz sampling rate
-        _xcodec_processor = {"sampling_rate": 16000}
+def load_xcodec_model():
+    """Load the XCodec model from Hugging Face (kept resident by the model manager)"""
+    manager = get_model_manager()
+    if not manager.is_registered("xcodec"):
+        manager.register("xcodec", _load_xcodec, XCODEC_SIZE_GB)
 
-        logger.info("✅ XCodec2 model loaded successfully")
-        return _xcodec_model, _xcodec_processor
+    try:
+        model = manager.acquire("xcodec")
+        logger.info("✅ XCodec2 model ready")
+        return model, XCODEC_PROCESSOR
 
     except Exception as e:
         logger.error(f"Failed to load XCodec2 model: {e}", exc_info=True)
         return None, None
 
 
-def extract_audio_tokens(text: str) -> List[int]:
-    """Extract xcodec tokens from Stage 1 text output"""
-    pattern = r'<xcodec/0/(\d+)>'
-    matches = re.findall(pattern, text)
+def _decode_batch(model, windows: List[np.ndarray]) -> List[np.ndarray]:
+    """
+    Run decode_code once for several windows of codes. Shorter windows are
+    padded by repeating their last code and their padding audio is cut off.
+    Returns float32 samples at the codec rate, one array per window
+    """
+    length = max(len(window) for window in windows)
+    batch = np.stack([np.pad(np.asarray(window, dtype=np.int64), (0, length - len(window)), mode="edge")
+                      for window in windows])
+    # XCodec2 expects tokens in shape (batch, 1, sequence_length)
+    token_tensor = torch.as_tensor(batch, dtype=torch.long).view(len(windows), 1, length)
+    if torch.cuda.is_available():
+        token_tensor = token_tensor.cuda()
+
+    with torch.no_grad(), timed("yue_codec_decode_seconds"):
+        # XCodec2 API: decode_code(vq_code)
+        audio_values = model.decode_code(token_tensor)
+
+    if isinstance(audio_values, torch.Tensor):
+        audio_values = audio_values.float().cpu().numpy()
+    # XCodec2 outputs (batch, 1, samples)
+    audio = np.asarray(audio_values, dtype=np.float32).reshape(len(windows), -1)
+    samples_per_frame = audio.shape[1] // length
+    return [audio[row, :len(window) * samples_per_frame].copy() for row, window in enumerate(windows)]
+
+
+def _run_decode_batch(items: List[BatchItem]):
+    """Micro-batcher callback: items carry (model, codes) and get their waveform back"""
+    model = items[0].payload[0]
+    results = _decode_batch(model, [item.payload[1] for item in items])
+    for item, audio in zip(items, results):
+        item.future.set_result(audio)
+
+
+_decode_batcher: Optional[MicroBatcher] = None
+_decode_batcher_lock = threading.Lock()
+
 
-    if not matches:
-        logger.warning("No xcodec tokens found in output")
-        return []
+def get_decode_batcher() -> MicroBatcher:
+    """
+    Process-wide XCodec decode service: windows submitted by concurrent jobs
+    (final decodes and progressive previews) within XCODEC_BATCH_WINDOW_MS are
+    bucketed by length and decoded in one forward pass
+    """
+    global _decode_batcher
+    with _decode_batcher_lock:
+        if _decode_batcher is None:
+            _decode_batcher = MicroBatcher(
+                _run_decode_batch, XCODEC_MAX_BATCH_SIZE, XCODEC_BATCH_WINDOW_MS,
+                XCODEC_BATCH_BUCKET_FRAMES, name="XCodec"
+            )
+        return _decode_batcher
+
+
+def _decode_chunk(model, codes: np.ndarray) -> np.ndarray:
+    """Decode one window of codes. Returns float32 samples at the codec rate"""
+    if not XCODEC_BATCHING_ENABLED:
+        return _decode_batch(model, [codes])[0]
+    return get_decode_batcher().submit((model, codes), len(codes)).result()
+
+
+class XCodecStreamDecoder:
+    """
+    Incremental windowed decoder: feed codes as they are generated, get back
+    waveform blocks (codec rate) as soon as they are final
+
+    Consecutive windows share overlap_frames frames; their audio is stitched
+    with a raised-cosine crossfade over the shared region (the windows decode
+    the same codes there, so their audio is correlated and the gains sum to
+    one). Peak memory depends on chunk_frames only, not on the song length.
+    """
+
+    def __init__(self, model, chunk_frames: int = XCODEC_CHUNK_FRAMES,
+                 overlap_frames: int = XCODEC_OVERLAP_FRAMES):
+        self.model = model
+        self.chunk_frames = chunk_frames
+        self.overlap_frames = max(0, min(overlap_frames, chunk_frames // 2))
+        self.hop = chunk_frames - self.overlap_frames
+        self._codes = np.zeros(0, dtype=np.int64)  # codes from the start of the next window on
+        self._pending = None  # tail of the previous window, to crossfade into the next one
+        self._started = False
+
+    def _decode_window(self, window: np.ndarray, is_last: bool) -> np.ndarray:
+        audio = _decode_chunk(self.model, window)
+        self._started = True
+        samples_per_frame = len(audio) // len(window)
+        fade = self.overlap_frames * samples_per_frame
+
+        if self._pending is not None and fade > 0:
+            fade = min(fade, len(self._pending), len(audio))
+            t = (np.arange(fade, dtype=np.float32) + 0.5) / fade
+            weight = 0.5 - 0.5 * np.cos(np.pi * t)
+            audio[:fade] = self._pending[:fade] * (1 - weight) + audio[:fade] * weight
+
+        if is_last or fade == 0:
+            self._pending = None
+            return audio
+        self._pending = audio[len(audio) - fade:].copy()
+        return audio[:len(audio) - fade]
+
+    def feed(self, codes: np.ndarray) -> List[np.ndarray]:
+        """Add codes; returns the blocks of every window that is now complete"""
+        self._codes = np.concatenate([self._codes, np.asarray(codes, dtype=np.int64).reshape(-1)])
+        blocks = []
+        while len(self._codes) >= self.chunk_frames:
+            blocks.append(self._decode_window(self._codes[:self.chunk_frames], is_last=False))
+            self._codes = self._codes[self.hop:]
+        return blocks
+
+    def flush(self) -> List[np.ndarray]:
+        """Decode what is left once no more codes will come"""
+        blocks = []
+        # Codes inside the previous window's overlap are already covered by it
+        if len(self._codes) > self.overlap_frames or (not self._started and len(self._codes) > 0):
+            blocks.append(self._decode_window(self._codes, is_last=True))
+        elif self._pending is not None:
+            blocks.append(self._pending)
+        self._codes = self._codes[:0]
+        self._pending = None
+        return blocks
+
+
+def iter_xcodec_blocks(model, tokens: np.ndarray, chunk_frames: int = XCODEC_CHUNK_FRAMES,
+                       overlap_frames: int = XCODEC_OVERLAP_FRAMES) -> Iterator[np.ndarray]:
+    """Decode codes window by window, yielding waveform blocks at the codec rate"""
+    decoder = XCodecStreamDecoder(model, chunk_frames, overlap_frames)
+    codes = np.asarray(tokens)
+    # Feed one window at a time so blocks come out before the whole song is decoded
+    for start in range(0, len(codes), decoder.chunk_frames):
+        yield from decoder.feed(codes[start:start + decoder.chunk_frames])
+    yield from decoder.flush()
+
+
+def fit_duration(audio: np.ndarray, sample_rate: int, duration: float) -> np.ndarray:
+    """Pad with silence or trim to exactly `duration` seconds"""
+    target_samples = int(sample_rate * duration)
+    current_samples = len(audio)
+
+    if current_samples < target_samples:
+        logger.info(f"Padding audio from {current_samples/sample_rate:.2f}s to {duration}s")
+        padding = np.zeros(target_samples - current_samples, dtype=audio.dtype)
+        audio = np.concatenate([audio, padding])
+    elif current_samples > target_samples:
+        logger.info(f"Trimming audio from {current_samples/sample_rate:.2f}s to {duration}s")
+        audio = audio[:target_samples]
+    return audio
 
-    tokens = [int(match) for match in matches]
-    logger.info(f"Extracted {len(tokens)} audio tokens (range: {min(tokens)}-{max(tokens)})")
 
-    return tokens
+def normalize_audio(audio: np.ndarray, peak: float = 0.9) -> np.ndarray:
+    if len(audio) and np.abs(audio).max() > 0:
+        audio = audio / np.abs(audio).max() * peak
+    return audio
 
 
-def decode_with_xcodec(tokens: List[int], sample_rate: int = 44100) -> Optional[np.ndarray]:
+def decode_with_xcodec(tokens: np.ndarray, sample_rate: int = 44100) -> Optional[np.ndarray]:
     """
     Decode audio tokens using the real XCodec model
 
     Args:
-        tokens: List of audio token IDs from Stage 1
+        tokens: Integer array of codec codes from Stage 1
         sample_rate: Target sample rate
 
     Returns:
@@ -98,44 +260,16 @@ def decode_with_xcodec(tokens: List[int], sample_rate: int = 44100) -> Optional[
         return None
 
     try:
-        # Convert tokens to tensor
-        # XCodec2 expects tokens in shape (batch, 1, sequence_length)
-        token_tensor = torch.tensor([tokens], dtype=torch.long).unsqueeze(1)
-
-        if torch.cuda.is_available():
-            token_tensor = token_tensor.cuda()
-
-        logger.info(f"Decoding {len(tokens)} tokens with XCodec2...")
-        logger.info(f"Token tensor shape: {token_tensor.shape}")
-
-        # Decode using XCodec2's decode_code method
-        with torch.no_grad():
-            # XCodec2 API: decode_code(vq_code)
-            audio_values = model.decode_code(token_tensor)
-
-        # Convert to numpy
-        if isinstance(audio_values, torch.Tensor):
-            audio_array = audio_values.cpu().numpy()
-        else:
-            audio_array = np.array(audio_values)
-
-        logger.info(f"Raw audio output shape: {audio_array.shape}")
-
-        # Flatten if needed (XCodec2 outputs (batch, 1, samples))
-        if audio_array.ndim > 1:
-            audio_array = audio_array.squeeze()
-
-        # Resample if needed (XCodec2 outputs at 16kHz)
+        logger.info(
+            f"Decoding {len(tokens)} tokens with XCodec2 "
+            f"(windows of {XCODEC_CHUNK_FRAMES} frames, {XCODEC_OVERLAP_FRAMES} overlap)..."
+        )
+        # Resample block by block as windows come out of the codec (XCodec2 outputs at 16kHz)
         model_sample_rate = processor.get('sampling_rate', 16000)
         if model_sample_rate != sample_rate:
             logger.info(f"Resampling from {model_sample_rate}Hz to {sample_rate}Hz...")
-            from scipy import signal
-            num_samples = int(len(audio_array) * sample_rate / model_sample_rate)
-            audio_array = signal.resample(audio_array, num_samples)
-
-        # Normalize
-        if audio_array.max() > 0:
-            audio_array = audio_array / np.abs(audio_array).max() * 0.9
+        blocks = resample_blocks(iter_xcodec_blocks(model, tokens), model_sample_rate, sample_rate)
+        audio_array = normalize_audio(np.concatenate(list(blocks)))
 
         logger.info(f"✅ Successfully decoded {len(audio_array)} audio samples")
         return audio_array
@@ -145,46 +279,39 @@ def decode_with_xcodec(tokens: List[int], sample_rate: int = 44100) -> Optional[
         return None
 
 
-def decode_stage1_output_real(output_text: str, sample_rate: int = 44100, duration: float = 30.0) -> Optional[np.ndarray]:
+def decode_codes_real(tokens: np.ndarray, sample_rate: int = 44100, duration: float = 30.0) -> Optional[np.ndarray]:
     """
-    Complete pipeline: extract tokens from text and decode with real XCodec
+    Decode XCodec codes (see audio_tokens.codes_from_ids) with real XCodec
 
     Args:
-        output_text: Raw text output from Stage 1 (contains xcodec tokens)
+        tokens: Integer array of codec codes from Stage 1
         sample_rate: Audio sample rate (default 44.1kHz)
         duration: Target duration in seconds (will pad/trim if needed)
 
     Returns:
         Audio array or None if failed
     """
-    # Extract tokens
-    tokens = extract_audio_tokens(output_text)
-
-    if not tokens:
+    if len(tokens) == 0:
         logger.error("No audio tokens found in Stage 1 output")
         return None
 
+    log_token_stats(tokens)
+
     # Decode with real XCodec
-    audio = decode_with_xcodec(tokens, sample_rate)
+    with span("xcodec.decode", frames=len(tokens)):
+        audio = decode_with_xcodec(tokens, sample_rate)
 
     if audio is None:
         logger.error("XCodec decoding failed")
         return None
 
-    # Adjust duration
-    target_samples = int(sample_rate * duration)
-    current_samples = len(audio)
-
-    if current_samples < target_samples:
-        # Pad with silence
-        logger.info(f"Padding audio from {current_samples/sample_rate:.2f}s to {duration}s")
-        padding = np.zeros(target_samples - current_samples)
-        audio = np.concatenate([audio, padding])
-    elif current_samples > target_samples:
-        # Trim
-        logger.info(f"Trimming audio from {current_samples/sample_rate:.2f}s to {duration}s")
-        audio = audio[:target_samples]
+    audio = fit_duration(audio, sample_rate, duration)
 
     logger.info(f"✅ Final audio: {len(audio)} samples, {duration:.2f} seconds")
 
     return audio
+
+
+def decode_stage1_output_real(output_text: str, sample_rate: int = 44100, duration: float = 30.0) -> Optional[np.ndarray]:
+    """Extract codes from Stage 1 text output and decode with real XCodec"""
+    return decode_codes_real(extract_audio_tokens(output_text), sample_rate, duration)
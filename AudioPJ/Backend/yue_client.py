@@ -1,49 +1,39 @@
 import os
-import torch
-import gc
-import sys
-
-# HACK: Add torch's lib directory AND nvidia modules to DLL search path
-try:
-    # 1. Add Torch Lib
-    torch_lib = os.path.join(os.path.dirname(torch.__file__), 'lib')
-    if os.path.exists(torch_lib):
-        if hasattr(os, 'add_dll_directory'):
-            os.add_dll_directory(torch_lib)
-        os.environ['PATH'] = torch_lib + os.pathsep + os.environ['PATH']
-        print(f"🔧 Added Torch Lib to DLL Path: {torch_lib}")
-
-    # 2. Add Nvidia Libs (cublas, cudnn, etc.)
-    site_packages = os.path.dirname(os.path.dirname(torch.__file__))
-    nvidia_path = os.path.join(site_packages, 'nvidia')
-    if os.path.exists(nvidia_path):
-        for root, dirs, files in os.walk(nvidia_path):
-            if 'bin' in dirs:
-                bin_path = os.path.join(root, 'bin')
-                if hasattr(os, 'add_dll_directory'):
-                    os.add_dll_directory(bin_path)
-                os.environ['PATH'] = bin_path + os.pathsep + os.environ['PATH']
-                print(f"🔧 Added Nvidia DLL Path: {bin_path}")
-except Exception as e:
-    print(f"⚠️ Could not add DLL paths: {e}")
-
-from llama_cpp import Llama
-from transformers import AutoModel, AutoTokenizer
-import scipy.io.wavfile
+# The DLL search path for the CUDA libraries is set up by
+# pipeline_factory.prepare_native_libraries before this module is imported
 import numpy as np
 import logging
 
+from audio_output import encode_job, output_filename
+from audio_tokens import (
+    END_OF_AUDIO_TOKEN, allowed_token_mask, codes_from_ids, frames_for_duration, get_llama_lookup, token_budget
+)
+from config import (
+    DEFAULT_DURATION_SECONDS, GENERATION_CACHE_ENABLED, GGUF_MAX_PROMPT_TOKENS, GGUF_N_CTX, LOOP_DETECTION_ACTION,
+    MAX_DURATION_SECONDS,
+    PIPELINE_DECODE_WORKERS, PIPELINE_ENCODE_WORKERS, PROGRESS_TOKEN_INTERVAL, PROGRESSIVE_AUDIO_ENABLED,
+    SAVE_STAGE1_TEXT, STAGE1_CONSTRAINED_DECODING, WARMUP_DURATION_SECONDS
+)
+from generation_cache import cache_key, get_generation_cache
+from gguf_engine import get_engine_cache
+from loop_detector import LoopDetector, loop_settings, loop_stats
+from metrics import GenerationTimer
+from prefix_cache import PrefixCache, prompt_header, stage1_prompt
+from stage_pipeline import Stage, get_staged_pipeline
+from tracing import current_span, span
+
 # Initialize logger BEFORE using it
 logger = logging.getLogger(__name__)
 
 # Try to use real XCodec decoder first, fallback to placeholder
 try:
-    from xcodec_real_decoder import decode_stage1_output_real
+    from xcodec_real_decoder import decode_codes_real, load_xcodec_model
+    from progressive_audio import ProgressiveAudio
     USE_REAL_XCODEC = True
     logger.info("Real XCodec decoder available")
 except ImportError as e:
     logger.warning(f"Real XCodec decoder not available: {e}")
-    from xcodec_decoder import decode_stage1_output
+    from xcodec_decoder import decode_codes
     USE_REAL_XCODEC = False
 
 # CONFIGURAZIONE PERCORSI
@@ -54,150 +44,350 @@ MODEL_STAGE1_PATH = "./models/YuE-s1-7B-anneal-en-cot-Q4_K_S.gguf"
 MODEL_STAGE2_PATH = "./models/yue-s2-1b-general-q8_0.gguf"
 # Use the same output directory that FastAPI serves
 OUTPUT_DIR = os.path.join(os.path.dirname(__file__), "outputs")
+STAGE1_SAMPLING = {"temperature": 1.0}
 
-def run_pipeline(prompt_text, genre, mood):
+# Snapshots of the llama.cpp context right after each prompt header
+_prefix_states = PrefixCache()
+
+def _restore_prefix(llm, header):
     """
-    Esegue la staffetta: Carica S1 -> Genera -> Scarica S1 -> Carica S2 -> Audio
+    Load the context snapshot of the prompt header (creating it on first use).
+    llama.cpp then only evaluates the tokens after the header.
     """
-    logger.info("--- Starting Pipeline ---")
-    if not os.path.exists(OUTPUT_DIR):
-        os.makedirs(OUTPUT_DIR)
+    tokens = llm.tokenize(header.encode("utf-8"), add_bos=True, special=True)
+    # The context size is part of the key: a snapshot only fits the context it came from
+    key = [llm.n_ctx()] + tokens
+    state = _prefix_states.get(key)
+    if state is None:
+        llm.reset()
+        llm.eval(tokens)
+        state = llm.save_state()
+        _prefix_states.put(key, state, state.llama_state_size)
+    else:
+        logger.info(f"Prompt header prefill reused from cache ({len(tokens)} tokens)")
+        llm.load_state(state)
+
+def _save_stage1_text(llm, token_ids):
+    """Save the Stage 1 output as text for debugging (only with SAVE_STAGE1_TEXT)"""
+    txt_filename = f"{OUTPUT_DIR}/output_raw.txt"
+    try:
+        text = llm.detokenize(token_ids, special=True).decode("utf-8", errors="ignore")
+        with open(txt_filename, "w", encoding="utf-8") as f:
+            f.write(text)
+        logger.info(f"Text output saved to {txt_filename}")
+    except Exception as e:
+        logger.error(f"Failed to save text output: {e}", exc_info=True)
+
+# Tokens Stage 1 may not emit after <SOA>, built once per model
+_banned_masks = {}
+
+def _banned_tokens(llm, lookup):
+    """Boolean mask of every vocabulary id that is neither a codec token, <EOA> nor EOS"""
+    key = (MODEL_STAGE1_PATH, llm.n_vocab())
+    banned = _banned_masks.get(key)
+    if banned is None:
+        eoa_tokens = llm.tokenize(END_OF_AUDIO_TOKEN.encode("utf-8"), add_bos=False, special=True)
+        eoa_token = eoa_tokens[0] if len(eoa_tokens) == 1 else None
+        banned = ~allowed_token_mask(lookup, [eoa_token, llm.token_eos()], llm.n_vocab())
+        _banned_masks[key] = banned
+    return banned
+
+def _stage1_logits_processor(llm, lookup, detector, resample):
+    """
+    llama.cpp logits processors of one Stage 1 call: the codec-only vocabulary
+    mask (whole tokens, so frames cannot be spelled out of text pieces) and the
+    ban on the token that would continue a detected loop
+    """
+    from llama_cpp import LogitsProcessorList
+
+    processors = []
+    if STAGE1_CONSTRAINED_DECODING:
+        banned = _banned_tokens(llm, lookup)
+
+        def constrain(input_ids, scores):
+            scores[banned[:len(scores)]] = -np.inf
+            return scores
+        processors.append(constrain)
+    if resample:
+        def ban(input_ids, scores):
+            token = detector.continuation(0)
+            if token is not None:
+                scores[token] = -np.inf
+                loop_stats.record("resampled")
+            return scores
+        processors.append(ban)
+    return LogitsProcessorList(processors) if processors else None
+
+class PromptTooLongError(ValueError):
+    """The Stage 1 prompt does not fit the engine context"""
+
+def stage1_context_size():
+    """
+    The one context size of the Stage 1 engine: the longest accepted prompt
+    plus the budget of the longest duration, so no request reloads the model
+    """
+    needed = GGUF_MAX_PROMPT_TOKENS + token_budget(MAX_DURATION_SECONDS)
+    return max(GGUF_N_CTX, -(-needed // 256) * 256)
 
-    # --- FASE 1: STAGE 1 (GGUF) ---
+def _generate_stage1(full_prompt, header, notify, seed=None, duration=DEFAULT_DURATION_SECONDS, on_codes=None):
+    """
+    Run Stage 1 on the cached GGUF engine. Returns the XCodec codes or None
+    Sampling works on token ids, which map to codes through the vocabulary
+    lookup table without ever detokenizing the generation. Generation stops
+    once the audio frames for `duration` seconds exist
+    on_codes(code) receives every codec code as soon as it is sampled
+    """
     logger.info(f"[1/4] Loading Stage 1 (GGUF) from {MODEL_STAGE1_PATH}...")
     print("[1/4] Caricamento Stage 1 (GGUF)...")
+    notify("loading_stage1", 0.05)
     
     if not os.path.exists(MODEL_STAGE1_PATH):
         logger.error(f"Error: Stage 1 model not found at {MODEL_STAGE1_PATH}")
         print(f"Errore: Modello Stage 1 non trovato in {MODEL_STAGE1_PATH}")
         return None
 
-    try:
-        llm_s1 = Llama(
-            model_path=MODEL_STAGE1_PATH,
-            n_ctx=2048,          # LIMITATO A 30 SECONDI PER EVITARE LOOP
-            n_gpu_layers=-1,     # Usa tutta la GPU possibile
-            verbose=True
-        )
-    except Exception as e:
-        logger.error(f"Failed to load Stage 1 model: {e}", exc_info=True)
-        return None
-
-    full_prompt = f"[Genre] {genre}\n[Mood] {mood}\n[Lyrics]\n{prompt_text}\n"
-    
     logger.info("[2/4] Generating Audio Tokens (Stage 1)...")
     print("[2/4] Generazione Token Audio (Stage 1)...")
     try:
-        output_s1 = llm_s1(
-            full_prompt,
-            max_tokens=2048,
-            temperature=1.0,
-            stop=["[EXIT]"],
-            echo=False
-        )
-        raw_content_s1 = output_s1['choices'][0]['text']
-        logger.info(f"Stage 1 generation complete. Output length: {len(raw_content_s1)}")
+        frames = frames_for_duration(duration)
+        max_tokens = token_budget(duration)
+        generated = []
+        frame_count = 0
+        # The engine stays cached between requests: only the first call pays the load
+        with get_engine_cache().use(MODEL_STAGE1_PATH, n_ctx=stage1_context_size()) as llm_s1:
+            prompt_tokens = llm_s1.tokenize(full_prompt.encode("utf-8"), add_bos=True, special=True)
+            if len(prompt_tokens) > GGUF_MAX_PROMPT_TOKENS:
+                raise PromptTooLongError(
+                    f"Prompt is {len(prompt_tokens)} tokens, the limit is {GGUF_MAX_PROMPT_TOKENS}: shorten the lyrics"
+                )
+            notify("stage1", 0.1, tokens_generated=0)
+            lookup = get_llama_lookup(llm_s1, MODEL_STAGE1_PATH)
+            _restore_prefix(llm_s1, header)
+            exit_tokens = llm_s1.tokenize(b"[EXIT]", add_bos=False, special=True)
+            eos_token = llm_s1.token_eos()
+            budget = min(max_tokens, llm_s1.n_ctx() - len(prompt_tokens))
+            if seed is not None:
+                llm_s1.set_seed(seed)
+            detector = LoopDetector() if LOOP_DETECTION_ACTION != "off" else None
+            resample = detector is not None and LOOP_DETECTION_ACTION == "resample"
+            timer = GenerationTimer("gguf", [current_span()])
+            # generate() skips the prompt tokens already evaluated by the header snapshot
+            for token in llm_s1.generate(
+                prompt_tokens,
+                temp=STAGE1_SAMPLING["temperature"],
+                logits_processor=_stage1_logits_processor(llm_s1, lookup, detector, resample)
+            ):
+                timer.tokens_sampled()
+                if token == eos_token:
+                    break
+                generated.append(token)
+                if exit_tokens and generated[-len(exit_tokens):] == exit_tokens:
+                    del generated[-len(exit_tokens):]
+                    break
+                if detector is not None:
+                    if detector.push([token])[0]:
+                        logger.warning(f"Stage 1 loop detected (period {detector.period[0]})")
+                    if detector.looping[0] and (not resample or detector.exhausted()[0]):
+                        # Keep the first occurrence of the pattern, drop its repeats
+                        drop = detector.repeated_tail(0)
+                        del generated[len(generated) - drop:]
+                        loop_stats.record("stopped")
+                        logger.info(f"Stage 1 stopped on a loop, dropped {drop} repeated tokens")
+                        break
+                if len(generated) % PROGRESS_TOKEN_INTERVAL == 0:
+                    notify("stage1", 0.1 + 0.6 * min(len(generated) / max_tokens, 1.0), tokens_generated=len(generated))
+                if token < len(lookup) and lookup[token] >= 0:
+                    if on_codes is not None:
+                        on_codes(lookup[token])
+                    frame_count += 1
+                    if frame_count >= frames:
+                        break
+                if len(generated) >= budget:
+                    break
+            timer.finish()
+            if SAVE_STAGE1_TEXT:
+                _save_stage1_text(llm_s1, generated)
+        codes = codes_from_ids(generated, lookup)
+        notify("stage1", 0.7, tokens_generated=len(generated))
+        logger.info(f"Stage 1 generation complete. {len(generated)} tokens, {len(codes)} audio codes")
+    except PromptTooLongError:
+        # Fails the job with the reason instead of a generic pipeline error
+        raise
     except Exception as e:
         logger.error(f"Stage 1 generation failed: {e}", exc_info=True)
         return None
-    
-    # PULIZIA MEMORIA STAGE 1
-    del llm_s1
-    gc.collect()
-    torch.cuda.empty_cache()
-    logger.info("Stage 1 memory cleared.")
-    print("Memoria Stage 1 liberata.")
+    return codes
 
-    # --- FASE 2: STAGE 2 (GGUF) ---
-    logger.info(f"[3/4] Loading Stage 2 (GGUF) from {MODEL_STAGE2_PATH}...")
-    print("[3/4] Caricamento Stage 2 (GGUF)...")
-    
-    if os.path.exists(MODEL_STAGE2_PATH):
-        try:
-            llm_s2 = Llama(
-                model_path=MODEL_STAGE2_PATH,
-                n_ctx=2048,
-                n_gpu_layers=-1,
-                verbose=True
+def _stage_generate(job):
+    """Pipeline stage: cache lookup and Stage 1 generation (one job at a time on the GGUF engine)"""
+    logger.info("--- Starting Pipeline ---")
+    notify = job["notify"]
+    duration = job["duration"]
+    frames = frames_for_duration(duration)
+    if not os.path.exists(OUTPUT_DIR):
+        os.makedirs(OUTPUT_DIR)
+
+    header = prompt_header(job["genre"], job["mood"])
+    full_prompt = stage1_prompt(header, job["prompt_text"])
+    audio_filename = output_filename("generated_audio", job["genre"], job["mood"])
+    audio_path = os.path.join(OUTPUT_DIR, audio_filename)
+    job.update(frames=frames, audio_filename=audio_filename, sample_rate=44100, cache_key=None)
+
+    # Only seeded requests are deterministic, so only those are cached
+    seed = job["seed"]
+    cache = get_generation_cache() if seed is not None and GENERATION_CACHE_ENABLED else None
+    codes = None
+    if cache is not None:
+        stage1_key = cache_key(
+            pipeline="gguf", model=os.path.basename(MODEL_STAGE1_PATH), prompt=full_prompt,
+            seed=seed, sampling=STAGE1_SAMPLING, frames=frames, output="codes",
+            constrained=STAGE1_CONSTRAINED_DECODING, loops=loop_settings()
+        )
+        job["cache_key"] = cache_key(
+            stage1=stage1_key, decoder="xcodec2" if USE_REAL_XCODEC else "placeholder",
+            sample_rate=44100, duration=duration
+        )
+        if cache.fetch_audio(job["cache_key"], audio_path):
+            logger.info(f"Finished (cached)! Audio file at {audio_path}")
+            job["result"] = audio_filename
+            return job
+        codes = cache.load_stage1(stage1_key)
+        if codes is not None:
+            notify("stage1", 0.7)
+
+    progressive = None
+    if codes is None:
+        if USE_REAL_XCODEC and PROGRESSIVE_AUDIO_ENABLED:
+            # Decode and publish audio fragments while Stage 1 is still generating
+            progressive = ProgressiveAudio(
+                lambda urls, seconds: notify(None, None, fragments=urls, audio_seconds=round(seconds, 2)),
+                44100
             )
-            logger.info("Stage 2 Loaded successfully (Load Test Passed)")
-            print("Stage 2 Caricato correttamente (Test caricamento superato)")
-            
-            # Per ora non generiamo nulla con Stage 2 perché manca il bridging dei token
-            # Ma dimostriamo che il modello si carica in VRAM
-            
-            del llm_s2
-            gc.collect()
-            torch.cuda.empty_cache()
-            logger.info("Stage 2 memory cleared.")
-            print("Memoria Stage 2 liberata.")
-            
-        except Exception as e:
-            logger.error(f"Stage 2 GGUF load error: {e}", exc_info=True)
-            print(f"Errore caricamento Stage 2 GGUF: {e}")
-    else:
-        logger.warning(f"Stage 2 model not found at {MODEL_STAGE2_PATH}, skipping load test.")
-        print(f"Modello Stage 2 non trovato in {MODEL_STAGE2_PATH}, salto il test di caricamento.")
+        try:
+            with span("stage1.generate", pipeline="gguf", frames=frames):
+                codes = _generate_stage1(
+                    full_prompt, header, notify, seed, duration,
+                    on_codes=progressive.feed if progressive is not None else None
+                )
+        except PromptTooLongError:
+            if progressive is not None:
+                progressive.finish()
+            raise
+        if codes is None:
+            if progressive is not None:
+                progressive.finish()
+            job["result"] = None
+            return job
+        if cache is not None:
+            cache.store_stage1(stage1_key, codes)
 
-    # --- SALVATAGGIO OUTPUT ---
-    logger.info("[4/4] Saving results...")
-    print("[4/4] Salvataggio risultati...")
+    # --- FASE 2: STAGE 2 (GGUF) ---
+    # Stage 2 is not loaded: the token bridging is not implemented yet, so
+    # loading it would only cost time and VRAM
+    logger.info("[3/4] Stage 2 (GGUF) skipped: token bridging not implemented")
+    print("[3/4] Stage 2 (GGUF) saltato: bridging dei token non implementato")
 
-    # Save text output for debugging
-    txt_filename = f"{OUTPUT_DIR}/output_raw.txt"
-    try:
-        with open(txt_filename, "w", encoding="utf-8") as f:
-            f.write(raw_content_s1)
-        logger.info(f"Text output saved to {txt_filename}")
-    except Exception as e:
-        logger.error(f"Failed to save text output: {e}", exc_info=True)
+    # Trim to the requested length before decoding, not after
+    job.update(codes=codes[:frames], progressive=progressive)
+    return job
 
+def _stage_decode(job):
+    """Pipeline stage: XCodec codes -> waveform, while Stage 1 serves the next job"""
     # Decode audio tokens from Stage 1 output
     logger.info("[4/4] Decoding audio tokens...")
     print("[4/4] Decodifica token audio...")
+    job["notify"]("decoding", 0.75)
 
-    audio_filename = f"generated_audio_{genre}_{mood[:10]}.wav"
-    audio_path = os.path.join(OUTPUT_DIR, audio_filename)
+    sample_rate = 44100
+    codes, duration, progressive = job["codes"], job["duration"], job["progressive"]
+    # Decode tokens from Stage 1 output
+    if USE_REAL_XCODEC:
+        logger.info("Using real XCodec decoder...")
+        print("🎵 Using real XCodec decoder for high-quality audio...")
+        audio_data = None
+        if progressive is not None:
+            progressive.finish()
+            audio_data = progressive.song(codes, duration)
+        if audio_data is None:
+            audio_data = decode_codes_real(codes, sample_rate, duration)
+    else:
+        logger.info("Using placeholder decoder...")
+        print("⚠️ Using placeholder decoder (install transformers for real XCodec)")
+        audio_data = decode_codes(codes, sample_rate, duration)
 
-    try:
-        sample_rate = 44100
-        duration = 30.0  # seconds
-
-        # Decode tokens from Stage 1 output
-        if USE_REAL_XCODEC:
-            logger.info("Using real XCodec decoder...")
-            print("🎵 Using real XCodec decoder for high-quality audio...")
-            audio_data = decode_stage1_output_real(raw_content_s1, sample_rate, duration)
-        else:
-            logger.info("Using placeholder decoder...")
-            print("⚠️ Using placeholder decoder (install transformers for real XCodec)")
-            from xcodec_decoder import decode_stage1_output
-            audio_data = decode_stage1_output(raw_content_s1, sample_rate, duration)
+    if audio_data is None:
+        logger.warning("Token decoding failed, using fallback tone")
+        # The fallback tone is never cached
+        job["cache_key"] = None
+        # Fallback to simple tone
+        frequency = 440.0
+        t = np.linspace(0, duration, int(sample_rate * duration), False)
+        audio_data = np.sin(2 * np.pi * frequency * t)
 
-        if audio_data is None:
-            logger.warning("Token decoding failed, using fallback tone")
-            # Fallback to simple tone
-            frequency = 440.0
-            t = np.linspace(0, duration, int(sample_rate * duration), False)
-            audio_data = np.sin(2 * np.pi * frequency * t)
-
-            fade_samples = int(sample_rate * 0.1)
-            audio_data[:fade_samples] *= np.linspace(0, 1, fade_samples)
-            audio_data[-fade_samples:] *= np.linspace(1, 0, fade_samples)
-
-        # Convert to 16-bit PCM
-        audio_data_int16 = np.int16(audio_data * 32767)
-
-        scipy.io.wavfile.write(audio_path, sample_rate, audio_data_int16)
-        logger.info(f"Finished! Audio file saved to {audio_path}")
-        print(f"Finito! File audio salvato in {audio_path}")
-        print(f"✅ Audio generated from real tokens")
-        logger.info("Audio generation from tokens completed")
-
-        return audio_filename  # Return just the filename, not the full path
+        fade_samples = int(sample_rate * 0.1)
+        audio_data[:fade_samples] *= np.linspace(0, 1, fade_samples)
+        audio_data[-fade_samples:] *= np.linspace(1, 0, fade_samples)
+
+    job["audio_data"] = audio_data
+    return job
+
+def _stage_postprocess(job):
+    """Pipeline stage: conversion to 16-bit PCM"""
+    job["notify"]("saving", 0.95)
+    job["audio_int16"] = np.int16(job.pop("audio_data") * 32767)
+    return job
+
+def _build_stages():
+    # Stage 1 has a single worker: one generation at a time on the GGUF engine,
+    # while the other stages work on the jobs generated before it
+    return [
+        Stage("stage1", _stage_generate),
+        Stage("decode", _stage_decode, PIPELINE_DECODE_WORKERS),
+        Stage("postprocess", _stage_postprocess),
+        Stage("encode", encode_job, PIPELINE_ENCODE_WORKERS),
+    ]
+
+def run_pipeline(prompt_text, genre, mood, progress_callback=None, seed=None, duration=None):
+    """
+    Esegue la staffetta: S1 (motore GGUF in cache) -> Genera -> Audio
+    progress_callback(stage, progress, **info) riceve le transizioni di stato
+    Le richieste con seed vengono servite dalla cache quando possibile
+    duration: durata richiesta in secondi (DEFAULT_DURATION_SECONDS se None)
+    Ogni fase gira nel proprio stage (vedi stage_pipeline): job diversi
+    occupano fasi diverse contemporaneamente
+    """
+    job = {
+        "prompt_text": prompt_text, "genre": genre, "mood": mood, "seed": seed,
+        "notify": progress_callback or (lambda stage, progress, **info: None),
+        "duration": duration or DEFAULT_DURATION_SECONDS,
+    }
+    return get_staged_pipeline("gguf", _build_stages).run(job)
+
+def warm_up(dummy_job=False):
+    """
+    Load the Stage 1 engine and the XCodec model before the first job, with
+    the same context real jobs use, so none of them reloads the engine.
+    dummy_job also runs a short Stage 1 generation
+    Returns False if a model failed to load
+    """
+    if not os.path.exists(MODEL_STAGE1_PATH):
+        logger.error(f"Error: Stage 1 model not found at {MODEL_STAGE1_PATH}")
+        return False
+    try:
+        get_engine_cache().get(MODEL_STAGE1_PATH, n_ctx=stage1_context_size())
     except Exception as e:
-        logger.error(f"Failed to save audio file: {e}", exc_info=True)
-        return None
+        logger.error(f"Stage 1 warm-up failed: {e}", exc_info=True)
+        return False
+    if USE_REAL_XCODEC:
+        model, _ = load_xcodec_model()
+        if model is None:
+            return False
+    if dummy_job:
+        header = prompt_header("pop", "warm-up")
+        with span("warmup.stage1", pipeline="gguf"):
+            _generate_stage1(stage1_prompt(header, "la la la"), header, lambda stage, progress, **info: None,
+                             seed=0, duration=WARMUP_DURATION_SECONDS)
+    return True
 
 # Funzione dummy per testare solo l'audio (se avessimo i token giusti)
 def decode_tokens(tokens):
@@ -3,127 +3,512 @@ YuE High-Quality Pipeline using HuggingFace Transformers
 This implementation uses the original YuE models with proper audio decoding
 """
 import os
+import copy
 import torch
 import gc
 import logging
+import threading
 import numpy as np
-import scipy.io.wavfile
 from transformers import AutoModelForCausalLM, AutoTokenizer
-from typing import Optional
+from transformers import LogitsProcessor, LogitsProcessorList, StoppingCriteria, StoppingCriteriaList
+from transformers.generation.streamers import BaseStreamer
+from typing import Callable, List, Optional
+
+from audio_output import encode_job, output_filename
+from audio_tokens import (
+    END_OF_AUDIO_TOKEN, allowed_token_mask, codes_from_ids, frames_for_duration, get_tokenizer_lookup,
+    log_token_stats, token_budget
+)
+from config import (
+    DEFAULT_DURATION_SECONDS, GENERATION_CACHE_ENABLED, LOOP_DETECTION_ACTION, PIPELINE_DECODE_WORKERS,
+    PIPELINE_ENCODE_WORKERS, PROGRESS_TOKEN_INTERVAL, PROGRESSIVE_AUDIO_ENABLED, SAVE_STAGE1_TEXT,
+    STAGE1_BATCHING_ENABLED, STAGE1_CONSTRAINED_DECODING, STAGE1_MAX_BATCH_SIZE, STAGE1_SIZE_GB, STAGE2_SIZE_GB,
+    WARMUP_DURATION_SECONDS
+)
+from generation_cache import cache_key, get_generation_cache
+from loop_detector import LoopDetector, loop_settings, loop_stats
+from metrics import GenerationTimer
+from model_manager import get_model_manager
+from prefix_cache import PrefixCache, prompt_header, stage1_prompt, tensor_bytes
+from stage1_batcher import BatchItem, MicroBatcher
+from stage_pipeline import Stage, get_staged_pipeline
+from tracing import current_span, span
+from warmup import maybe_compile
 
 logger = logging.getLogger(__name__)
 
+try:
+    from xcodec_real_decoder import decode_codes_real, load_xcodec_model
+    from progressive_audio import ProgressiveAudio
+    USE_REAL_XCODEC = True
+except ImportError as e:
+    logger.warning(f"Real XCodec decoder not available: {e}")
+    USE_REAL_XCODEC = False
+
 # Configuration
 MODEL_STAGE1_ID = "m-a-p/YuE-s1-7B-anneal-en-cot"
 MODEL_STAGE2_ID = "m-a-p/YuE-s2-1B-general"
 OUTPUT_DIR = os.path.join(os.path.dirname(__file__), "outputs")
 CACHE_DIR = "./models/huggingface_cache"
+STAGE1_SAMPLING = {
+    "temperature": 1.0,
+    "top_k": 50,
+    "top_p": 0.95,
+    "repetition_penalty": 1.2,
+}
+SAMPLE_RATE = 44100
+
+
+class _ProgressStreamer(BaseStreamer):
+    """
+    Reports the number of generated tokens while `generate` runs and hands
+    each codec code to on_codes (progressive decoding) as it is sampled
+    """
+
+    def __init__(self, progress_callback: Optional[Callable], max_new_tokens: int,
+                 lookup: Optional[np.ndarray] = None, on_codes: Optional[Callable] = None):
+        self.progress_callback = progress_callback
+        self.max_new_tokens = max_new_tokens
+        self.lookup = lookup
+        self.on_codes = on_codes
+        self.tokens = 0
+        self._prompt_seen = False
+        self.timer: Optional[GenerationTimer] = None
+        # Created on the job's thread, so this is the job's Stage 1 span
+        self.span = current_span()
+
+    def put(self, value):
+        # The first call carries the prompt, every later call one new token
+        if not self._prompt_seen:
+            self._prompt_seen = True
+            self.timer = GenerationTimer("huggingface", [self.span])
+            return
+        self.timer.tokens_sampled()
+        self.tokens += 1
+        if self.on_codes is not None:
+            token = int(value.view(-1)[0])
+            if token < len(self.lookup) and self.lookup[token] >= 0:
+                self.on_codes(self.lookup[token])
+        if self.progress_callback and self.tokens % PROGRESS_TOKEN_INTERVAL == 0:
+            self.progress_callback(
+                "stage1",
+                0.1 + 0.6 * min(self.tokens / self.max_new_tokens, 1.0),
+                tokens_generated=self.tokens
+            )
+
+    def end(self):
+        if self.timer is not None:
+            self.timer.finish()
+        if self.progress_callback:
+            self.progress_callback("stage1", 0.7, tokens_generated=self.tokens)
+
+
+class _AudioFrameLimit(StoppingCriteria):
+    """Stops each row of a generate call once it has produced its requested number of audio frames"""
+
+    def __init__(self, lookup: np.ndarray, frame_limits: List[int], device: str):
+        self.is_codec = torch.as_tensor(lookup >= 0, device=device)
+        self.frame_limits = torch.tensor(frame_limits, device=device)
+        self.frames = torch.zeros_like(self.frame_limits)
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        last = input_ids[:, -1]
+        in_vocab = last < len(self.is_codec)
+        self.frames += (self.is_codec[last.clamp(max=len(self.is_codec) - 1)] & in_vocab).long()
+        return self.frames >= self.frame_limits
+
+
+class _LoopGuard(StoppingCriteria):
+    """
+    Feeds every generated token to the loop detector. In "stop" mode looping
+    rows end at once; in "resample" mode only rows that keep looping after
+    LOOP_MAX_RESAMPLES attempts do
+    """
+
+    def __init__(self, detector: LoopDetector, resample: bool):
+        self.detector = detector
+        self.resample = resample
+        self.stopped = np.zeros(len(detector.looping), dtype=bool)
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        started = self.detector.push(input_ids[:, -1].cpu().numpy())
+        for row in np.flatnonzero(started):
+            logger.warning(f"Stage 1 loop detected (row {row}, period {self.detector.period[row]})")
+        stop = self.detector.exhausted() if self.resample else self.detector.looping
+        newly_stopped = stop & ~self.stopped
+        if newly_stopped.any():
+            loop_stats.record("stopped", int(newly_stopped.sum()))
+        self.stopped |= stop
+        return torch.as_tensor(self.stopped, device=input_ids.device)
+
+    def trim(self, row: int) -> int:
+        """Number of trailing tokens to drop from a stopped row (the loop's repeats)"""
+        return self.detector.repeated_tail(row) if self.stopped[row] else 0
+
+
+class _LoopResample(LogitsProcessor):
+    """Bans the token that would continue a detected loop, so the row is resampled"""
+
+    def __init__(self, detector: LoopDetector):
+        self.detector = detector
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
+        for row in np.flatnonzero(self.detector.looping):
+            scores[row, self.detector.continuation(row)] = float("-inf")
+            loop_stats.record("resampled")
+        return scores
+
+
+class _CodecOnlyLogits(LogitsProcessor):
+    """
+    Enforces the Stage 1 output structure: the prompt ends with <SOA>, so only
+    codec tokens, <EOA> and EOS may be sampled; after <EOA> only EOS remains
+    """
+
+    def __init__(self, allowed: torch.Tensor, eoa_token_id: Optional[int], eos_token_id: int):
+        self.blocked = ~allowed
+        self.eoa_token_id = eoa_token_id
+        self.eos_token_id = eos_token_id
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
+        scores = scores.masked_fill(self.blocked[:scores.shape[-1]], float("-inf"))
+        if self.eoa_token_id is not None:
+            closed = input_ids[:, -1] == self.eoa_token_id
+            if closed.any():
+                eos_only = torch.full_like(scores[closed], float("-inf"))
+                eos_only[:, self.eos_token_id] = 0.0
+                scores[closed] = eos_only
+        return scores
+
+
+class _BatchStreamer(BaseStreamer):
+    """
+    Splits a batched generate call back into per-job results: reports progress
+    per row and resolves each job's future as soon as its row emits EOS or
+    reaches its audio frame target
+    """
+
+    def __init__(self, items: List[BatchItem], eos_token_id: int, device: str, lookup: np.ndarray):
+        self.items = items
+        self.eos_token_id = eos_token_id
+        self.device = device
+        self.lookup = lookup
+        self.rows: List[List[int]] = [[] for _ in items]
+        self.frames = [0] * len(items)
+        self.finished = [False] * len(items)
+        self.loop_guard: Optional[_LoopGuard] = None
+        self._prompt_seen = False
+        self.timer: Optional[GenerationTimer] = None
+
+    def put(self, value):
+        # The first call carries the prompts, every later call one token per row
+        if not self._prompt_seen:
+            self._prompt_seen = True
+            self.timer = GenerationTimer("huggingface", [item.payload["span"] for item in self.items])
+            return
+        self.timer.tokens_sampled(self.finished.count(False))
+        for row, token in enumerate(value.view(-1).tolist()):
+            if self.finished[row]:
+                continue
+            # A row stopped for looping only receives padding from here on
+            if token == self.eos_token_id or (self.loop_guard is not None and self.loop_guard.stopped[row]):
+                self._finish(row)
+                continue
+            self.rows[row].append(token)
+            count = len(self.rows[row])
+            payload = self.items[row].payload
+            progress_callback = payload["progress_callback"]
+            if progress_callback and count % PROGRESS_TOKEN_INTERVAL == 0:
+                progress_callback(
+                    "stage1",
+                    0.1 + 0.6 * min(count / payload["max_new_tokens"], 1.0),
+                    tokens_generated=count
+                )
+            if token < len(self.lookup) and self.lookup[token] >= 0:
+                if payload["on_codes"] is not None:
+                    payload["on_codes"](self.lookup[token])
+                self.frames[row] += 1
+                if self.frames[row] >= payload["frames"]:
+                    self._finish(row)
+
+    def _finish(self, row: int):
+        self.finished[row] = True
+        tokens = self.rows[row]
+        if self.loop_guard is not None:
+            tokens = tokens[:len(tokens) - self.loop_guard.trim(row)]
+        tokens = torch.tensor([tokens], dtype=torch.long, device=self.device)
+        self.items[row].future.set_result(tokens)
+
+    def end(self):
+        if self.timer is not None:
+            self.timer.finish()
+        for row, finished in enumerate(self.finished):
+            if not finished:
+                self._finish(row)
+
+
+# Lookup tables built from a tokenizer loaded on its own, once per model id
+_standalone_lookups = {}
+_standalone_lookups_lock = threading.Lock()
+
+
+def _standalone_codec_lookup(model_id: str) -> np.ndarray:
+    """Codec lookup of a model's tokenizer, without loading the model"""
+    with _standalone_lookups_lock:
+        lookup = _standalone_lookups.get(model_id)
+        if lookup is None:
+            tokenizer = AutoTokenizer.from_pretrained(model_id, cache_dir=CACHE_DIR, trust_remote_code=True)
+            lookup = _standalone_lookups[model_id] = get_tokenizer_lookup(tokenizer)
+        return lookup
+
+
+# Stage 2 methods that turn Stage 1 tokens into a waveform, in order of preference
+STAGE2_DECODE_METHODS = ("decode", "generate_audio")
+
+
+def _stage2_decode_method(model) -> Optional[str]:
+    """Name of the audio decode method the Stage 2 model provides, or None"""
+    return next((method for method in STAGE2_DECODE_METHODS if hasattr(model, method)), None)
+
 
 class YuEPipeline:
     """High-quality YuE pipeline with proper audio decoding"""
 
     def __init__(self):
-        self.stage1_model = None
-        self.stage1_tokenizer = None
-        self.stage2_model = None
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        # Models stay resident between jobs; the manager evicts them only
+        # when the memory budget would be exceeded
+        self.models = get_model_manager()
+        self.models.register("stage1", self._load_stage1_weights, STAGE1_SIZE_GB)
+        self.models.register("stage2", self._load_stage2_weights, STAGE2_SIZE_GB)
+        self._batcher = None
+        self._batcher_lock = threading.Lock()
+        # Set when the Stage 2 checkpoint turns out to have no audio decode
+        # method: later jobs go straight to XCodec instead of reloading it
+        self._stage2_unsupported = False
+        # Sampling draws from torch's process-global RNG: Stage 1 generate calls
+        # run one at a time so a seeded call sees only its own draws
+        self._sampling_lock = threading.Lock()
+        # Stage 1 vocabulary masks, built once per (tokenizer, output size)
+        self._allowed_masks = {}
+        # KV state of recently used prompt headers (genre/mood scaffold)
+        self.prefix_cache = PrefixCache()
+
+    def _load_stage1_weights(self):
+        """Load Stage 1 model (7B parameter semantic model) and its tokenizer"""
+        logger.info(f"Loading Stage 1 from {MODEL_STAGE1_ID}...")
+        tokenizer = AutoTokenizer.from_pretrained(
+            MODEL_STAGE1_ID,
+            cache_dir=CACHE_DIR,
+            trust_remote_code=True
+        )
+
+        model = AutoModelForCausalLM.from_pretrained(
+            MODEL_STAGE1_ID,
+            cache_dir=CACHE_DIR,
+            torch_dtype=torch.float16,
+            device_map="auto",
+            trust_remote_code=True,
+            low_cpu_mem_usage=True
+        )
+        return model, tokenizer
+
+    def _load_stage2_weights(self):
+        """Load Stage 2 model (1B parameter acoustic refinement)"""
+        logger.info(f"Loading Stage 2 from {MODEL_STAGE2_ID}...")
+        model = AutoModelForCausalLM.from_pretrained(
+            MODEL_STAGE2_ID,
+            cache_dir=CACHE_DIR,
+            torch_dtype=torch.float16,
+            device_map="auto",
+            trust_remote_code=True,
+            low_cpu_mem_usage=True
+        )
+        method = _stage2_decode_method(model)
+        return maybe_compile(model, method) if method is not None else model
 
     def load_stage1(self):
-        """Load Stage 1 model (7B parameter semantic model)"""
-        logger.info(f"Loading Stage 1 from {MODEL_STAGE1_ID}...")
+        """Make Stage 1 resident (no-op if it is already loaded)"""
         try:
-            self.stage1_tokenizer = AutoTokenizer.from_pretrained(
-                MODEL_STAGE1_ID,
-                cache_dir=CACHE_DIR,
-                trust_remote_code=True
-            )
-
-            self.stage1_model = AutoModelForCausalLM.from_pretrained(
-                MODEL_STAGE1_ID,
-                cache_dir=CACHE_DIR,
-                torch_dtype=torch.float16,
-                device_map="auto",
-                trust_remote_code=True,
-                low_cpu_mem_usage=True
-            )
-
-            logger.info("Stage 1 loaded successfully")
+            self.models.acquire("stage1")
+            logger.info("Stage 1 ready")
             return True
         except Exception as e:
             logger.error(f"Failed to load Stage 1: {e}", exc_info=True)
             return False
 
     def load_stage2(self):
-        """Load Stage 2 model (1B parameter acoustic refinement)"""
-        logger.info(f"Loading Stage 2 from {MODEL_STAGE2_ID}...")
+        """Make Stage 2 resident (no-op if it is already loaded)"""
         try:
-            self.stage2_model = AutoModelForCausalLM.from_pretrained(
-                MODEL_STAGE2_ID,
-                cache_dir=CACHE_DIR,
-                torch_dtype=torch.float16,
-                device_map="auto",
-                trust_remote_code=True,
-                low_cpu_mem_usage=True
-            )
-
-            logger.info("Stage 2 loaded successfully")
+            self.models.acquire("stage2")
+            logger.info("Stage 2 ready")
             return True
         except Exception as e:
             logger.error(f"Failed to load Stage 2: {e}", exc_info=True)
             return False
 
     def unload_stage1(self):
-        """Unload Stage 1 to free VRAM"""
-        if self.stage1_model is not None:
-            del self.stage1_model
-            del self.stage1_tokenizer
-            self.stage1_model = None
-            self.stage1_tokenizer = None
-            gc.collect()
-            torch.cuda.empty_cache()
+        """Force Stage 1 out of memory"""
+        if self.models.evict("stage1"):
             logger.info("Stage 1 unloaded")
 
     def unload_stage2(self):
-        """Unload Stage 2 to free VRAM"""
-        if self.stage2_model is not None:
-            del self.stage2_model
-            self.stage2_model = None
-            gc.collect()
-            torch.cuda.empty_cache()
+        """Force Stage 2 out of memory"""
+        if self.models.evict("stage2"):
             logger.info("Stage 2 unloaded")
 
-    def generate_audio_tokens(self, lyrics: str, genre: str, mood: str) -> Optional[torch.Tensor]:
-        """Generate audio tokens using Stage 1"""
-        if self.stage1_model is None or self.stage1_tokenizer is None:
-            if not self.load_stage1():
-                return None
+    def generate_audio_tokens(self, lyrics: str, genre: str, mood: str,
+                              progress_callback: Optional[Callable] = None,
+                              seed: Optional[int] = None,
+                              duration: float = DEFAULT_DURATION_SECONDS,
+                              on_codes: Optional[Callable] = None) -> Optional[torch.Tensor]:
+        """
+        Generate audio tokens using Stage 1 (reproducible when a seed is given)
+        Generation stops once the audio frames for `duration` seconds exist
+        on_codes(code) receives every codec code as soon as it is sampled
+        """
+        if not self.load_stage1():
+            return None
 
         # Format prompt according to YuE specification
-        prompt = f"[Genre] {genre}\n[Mood] {mood}\n[Lyrics]\n{lyrics}\n<SOA>"
+        header = prompt_header(genre, mood)
+        prompt = stage1_prompt(header, lyrics)
 
         logger.info(f"Generating audio tokens for: {genre} / {mood}")
         logger.info(f"Lyrics length: {len(lyrics)} characters")
+        frames = frames_for_duration(duration)
+        max_new_tokens = token_budget(duration)
+        logger.info(f"Target: {duration:.1f}s = {frames} audio frames (budget {max_new_tokens} tokens)")
+
+        # Seeded requests stay unbatched: batch composition would change their samples
+        if seed is None and STAGE1_BATCHING_ENABLED:
+            return self._generate_batched(prompt, header, progress_callback, frames, max_new_tokens, on_codes)
 
         try:
-            # Tokenize input
-            inputs = self.stage1_tokenizer(prompt, return_tensors="pt").to(self.device)
+            with self.models.use("stage1") as (model, tokenizer):
+                streamer = None
+                if progress_callback or on_codes:
+                    streamer = _ProgressStreamer(
+                        progress_callback, max_new_tokens, get_tokenizer_lookup(tokenizer), on_codes
+                    )
+                generated_tokens = self._generate_one(
+                    model, tokenizer, prompt, header, streamer, frames, max_new_tokens, seed
+                )
+
+            logger.info(f"Generated {generated_tokens.shape[1]} tokens")
+            return generated_tokens
+
+        except Exception as e:
+            logger.error(f"Stage 1 generation failed: {e}", exc_info=True)
+            return None
 
-            # Generate with Stage 1
+    def _prefix_state(self, model, tokenizer, header: str, input_ids: torch.Tensor):
+        """
+        KV state for the prompt header, computed once per distinct header
+        Returns a private copy (generate extends it in place) or None if unusable
+        """
+        header_ids = tokenizer(header, return_tensors="pt")["input_ids"].to(self.device)
+        length = header_ids.shape[1]
+        # Only reusable if the full prompt tokenizes with the header as an exact prefix
+        if length >= input_ids.shape[1] or not torch.equal(input_ids[0, :length], header_ids[0]):
+            return None
+
+        key = header_ids[0].tolist()
+        state = self.prefix_cache.get(key)
+        if state is None:
             with torch.no_grad():
-                outputs = self.stage1_model.generate(
-                    **inputs,
-                    max_new_tokens=2048,
-                    temperature=1.0,
-                    top_k=50,
-                    top_p=0.95,
-                    repetition_penalty=1.2,
-                    do_sample=True,
-                    pad_token_id=self.stage1_tokenizer.eos_token_id,
-                    eos_token_id=self.stage1_tokenizer.eos_token_id,
-                )
+                state = model(header_ids, use_cache=True).past_key_values
+            self.prefix_cache.put(key, state, tensor_bytes(state))
+        else:
+            logger.info(f"Prompt header prefill reused from cache ({length} tokens)")
+        return copy.deepcopy(state)
+
+    def _logits_processors(self, model, tokenizer) -> LogitsProcessorList:
+        """Constrained-decoding processors for Stage 1 (empty if disabled)"""
+        if not STAGE1_CONSTRAINED_DECODING:
+            return LogitsProcessorList()
+
+        eoa_token_id = tokenizer.convert_tokens_to_ids(END_OF_AUDIO_TOKEN)
+        if eoa_token_id is None or eoa_token_id == tokenizer.unk_token_id:
+            eoa_token_id = None
+        size = model.config.vocab_size
+        key = (getattr(tokenizer, "name_or_path", None), len(tokenizer), size)
+        allowed = self._allowed_masks.get(key)
+        if allowed is None:
+            mask = allowed_token_mask(
+                get_tokenizer_lookup(tokenizer), [eoa_token_id, tokenizer.eos_token_id], size
+            )
+            allowed = torch.as_tensor(mask, device=self.device)
+            self._allowed_masks[key] = allowed
+        return LogitsProcessorList([_CodecOnlyLogits(allowed, eoa_token_id, tokenizer.eos_token_id)])
+
+    def _stage1_controls(self, model, tokenizer, frame_limits: List[int]):
+        """Logits processors, stopping criteria and loop guard for one Stage 1 generate call"""
+        processors = self._logits_processors(model, tokenizer)
+        criteria = StoppingCriteriaList([
+            _AudioFrameLimit(get_tokenizer_lookup(tokenizer), frame_limits, self.device)
+        ])
+        guard = None
+        if LOOP_DETECTION_ACTION != "off":
+            detector = LoopDetector(len(frame_limits))
+            guard = _LoopGuard(detector, resample=LOOP_DETECTION_ACTION == "resample")
+            criteria.append(guard)
+            if guard.resample:
+                processors.append(_LoopResample(detector))
+        return processors, criteria, guard
+
+    def _generate_one(self, model, tokenizer, prompt: str, header: str, streamer,
+                      frames: int, max_new_tokens: int, seed: Optional[int] = None) -> torch.Tensor:
+        """Run Stage 1 for a single prompt, reusing the cached header prefill"""
+        inputs = tokenizer(prompt, return_tensors="pt").to(self.device)
+        prefix_state = self._prefix_state(model, tokenizer, header, inputs["input_ids"])
+        processors, criteria, guard = self._stage1_controls(model, tokenizer, [frames])
+        if isinstance(streamer, _BatchStreamer):
+            streamer.loop_guard = guard
+
+        with self._sampling_lock, torch.no_grad():
+            if seed is not None:
+                torch.manual_seed(seed)
+            outputs = model.generate(
+                **inputs,
+                max_new_tokens=max_new_tokens,
+                **STAGE1_SAMPLING,
+                do_sample=True,
+                pad_token_id=tokenizer.eos_token_id,
+                eos_token_id=tokenizer.eos_token_id,
+                streamer=streamer,
+                past_key_values=prefix_state,
+                logits_processor=processors,
+                stopping_criteria=criteria,
+            )
 
-            # Extract generated tokens (remove input tokens)
-            generated_tokens = outputs[:, inputs['input_ids'].shape[1]:]
+        # Extract generated tokens (remove input tokens)
+        generated = outputs[:, inputs["input_ids"].shape[1]:]
+        if guard is not None and guard.stopped[0]:
+            drop = guard.trim(0)
+            logger.info(f"Stage 1 stopped on a loop, dropping {drop} repeated tokens")
+            generated = generated[:, :generated.shape[1] - drop]
+        return generated
+
+    def _generate_batched(self, prompt: str, header: str, progress_callback: Optional[Callable],
+                          frames: int, max_new_tokens: int,
+                          on_codes: Optional[Callable] = None) -> Optional[torch.Tensor]:
+        """Queue the prompt on the Stage 1 micro-batcher and wait for its row"""
+        try:
+            with self.models.use("stage1") as (_, tokenizer):
+                prompt_length = len(tokenizer(prompt)["input_ids"])
+
+            with self._batcher_lock:
+                if self._batcher is None:
+                    self._batcher = MicroBatcher(self._run_stage1_batch)
+
+            future = self._batcher.submit(
+                {"prompt": prompt, "header": header, "progress_callback": progress_callback,
+                 "frames": frames, "max_new_tokens": max_new_tokens, "on_codes": on_codes,
+                 "span": current_span()},
+                prompt_length
+            )
+            generated_tokens = future.result()
 
             logger.info(f"Generated {generated_tokens.shape[1]} tokens")
             return generated_tokens
@@ -132,35 +517,83 @@ class YuEPipeline:
             logger.error(f"Stage 1 generation failed: {e}", exc_info=True)
             return None
 
+    def _run_stage1_batch(self, items: List[BatchItem]):
+        """Run one left-padded, batched Stage 1 generate call for the micro-batcher"""
+        with self.models.use("stage1") as (model, tokenizer):
+            lookup = get_tokenizer_lookup(tokenizer)
+            streamer = _BatchStreamer(items, tokenizer.eos_token_id, self.device, lookup)
+            if len(items) == 1:
+                # Nothing to batch with: take the single-prompt path and its prefix cache
+                payload = items[0].payload
+                self._generate_one(
+                    model, tokenizer, payload["prompt"], payload["header"], streamer,
+                    payload["frames"], payload["max_new_tokens"]
+                )
+                return
+
+            # The tokenizer is shared with the other Stage 1 paths: its padding
+            # settings are only changed for this call and then restored
+            saved_pad_token_id, saved_padding_side = tokenizer.pad_token_id, tokenizer.padding_side
+            pad_token_id = saved_pad_token_id if saved_pad_token_id is not None else tokenizer.eos_token_id
+            try:
+                tokenizer.pad_token_id = pad_token_id
+                # Left padding keeps every prompt adjacent to its first generated token
+                tokenizer.padding_side = "left"
+                inputs = tokenizer(
+                    [item.payload["prompt"] for item in items],
+                    return_tensors="pt",
+                    padding=True
+                ).to(self.device)
+            finally:
+                tokenizer.pad_token_id = saved_pad_token_id
+                tokenizer.padding_side = saved_padding_side
+            # Rows may target different durations: each stops at its own frame count
+            processors, criteria, streamer.loop_guard = self._stage1_controls(
+                model, tokenizer, [item.payload["frames"] for item in items]
+            )
+
+            with self._sampling_lock, torch.no_grad():
+                model.generate(
+                    **inputs,
+                    max_new_tokens=max(item.payload["max_new_tokens"] for item in items),
+                    **STAGE1_SAMPLING,
+                    do_sample=True,
+                    pad_token_id=pad_token_id,
+                    eos_token_id=tokenizer.eos_token_id,
+                    streamer=streamer,
+                    logits_processor=processors,
+                    stopping_criteria=criteria,
+                )
+
+    def _codec_lookup(self) -> np.ndarray:
+        """Stage 1 vocabulary id -> XCodec code table (needs only the tokenizer)"""
+        if self.models.is_resident("stage1"):
+            with self.models.use("stage1") as (_, tokenizer):
+                return get_tokenizer_lookup(tokenizer)
+        # e.g. Stage 1 tokens came from the generation cache: skip loading the 7B weights
+        return _standalone_codec_lookup(MODEL_STAGE1_ID)
+
     def decode_to_audio(self, audio_tokens: torch.Tensor) -> Optional[np.ndarray]:
-        """Decode audio tokens to waveform using Stage 2"""
-        if self.stage2_model is None:
-            if not self.load_stage2():
-                return None
+        """Decode audio tokens to waveform using Stage 2, or None to fall back to XCodec"""
+        if self._stage2_unsupported or not self.load_stage2():
+            return None
 
         logger.info("Decoding audio tokens to waveform...")
 
         try:
-            with torch.no_grad():
-                # Stage 2 decodes the tokens into audio
-                # The model should have a decode method or we process through the vocoder
-                if hasattr(self.stage2_model, 'decode'):
-                    audio_array = self.stage2_model.decode(audio_tokens)
-                elif hasattr(self.stage2_model, 'generate_audio'):
-                    audio_array = self.stage2_model.generate_audio(audio_tokens)
-                else:
-                    # Fallback: process tokens through model
-                    outputs = self.stage2_model.generate(
-                        input_ids=audio_tokens,
-                        max_new_tokens=512,
-                        return_dict_in_generate=True,
-                        output_hidden_states=True
-                    )
-
-                    # Extract audio from hidden states (model-specific)
-                    # This is a placeholder - actual implementation depends on model architecture
-                    logger.warning("Using fallback audio extraction - may not produce real audio")
-                    audio_array = None
+            with self.models.use("stage2") as stage2_model, torch.no_grad():
+                method = _stage2_decode_method(stage2_model)
+                if method is not None:
+                    audio_array = getattr(stage2_model, method)(audio_tokens)
+            if method is None:
+                # A plain LM cannot turn tokens into audio: free its memory for good
+                logger.warning(
+                    f"{MODEL_STAGE2_ID} has no {' or '.join(STAGE2_DECODE_METHODS)} method, "
+                    "Stage 1 codes will be decoded with XCodec"
+                )
+                self._stage2_unsupported = True
+                self.unload_stage2()
+                return None
 
             if audio_array is not None:
                 # Convert to numpy if tensor
@@ -181,59 +614,161 @@ class YuEPipeline:
             logger.error(f"Audio decoding failed: {e}", exc_info=True)
             return None
 
-    def run_pipeline(self, lyrics: str, genre: str, mood: str) -> Optional[str]:
+    def run_pipeline(self, lyrics: str, genre: str, mood: str,
+                     progress_callback: Optional[Callable] = None,
+                     seed: Optional[int] = None,
+                     duration: Optional[float] = None) -> Optional[str]:
         """
         Complete pipeline: lyrics -> audio tokens -> waveform -> file
+        progress_callback(stage, progress, **info) is called on stage transitions
+        Seeded requests are served from the generation cache when possible
+        duration is the target length in seconds (DEFAULT_DURATION_SECONDS if None)
+        Each step runs as a stage of a staged pipeline, so Stage 1 of one job
+        overlaps the decoding and saving of the previous ones
         Returns: filename of generated audio (not full path)
         """
+        job = {
+            "lyrics": lyrics, "genre": genre, "mood": mood, "seed": seed,
+            "progress_callback": progress_callback,
+            "notify": progress_callback or (lambda stage, progress, **info: None),
+            "duration": duration or DEFAULT_DURATION_SECONDS,
+        }
+        return get_staged_pipeline("huggingface", self._build_stages).run(job)
+
+    def _build_stages(self) -> List[Stage]:
+        # Concurrent Stage 1 jobs are what the micro-batcher merges into one generate call
+        stage1_workers = STAGE1_MAX_BATCH_SIZE if STAGE1_BATCHING_ENABLED else 1
+        return [
+            Stage("stage1", self._stage_generate, stage1_workers),
+            Stage("decode", self._stage_decode, PIPELINE_DECODE_WORKERS),
+            Stage("postprocess", self._stage_postprocess),
+            Stage("encode", encode_job, PIPELINE_ENCODE_WORKERS),
+        ]
+
+    def _stage_generate(self, job: dict) -> dict:
+        """Pipeline stage: cache lookup, Stage 1 generation and code extraction"""
         logger.info("=== Starting High-Quality YuE Pipeline ===")
+        notify = job["notify"]
+        lyrics, genre, mood = job["lyrics"], job["genre"], job["mood"]
+        seed, duration = job["seed"], job["duration"]
+        frames = frames_for_duration(duration)
 
         os.makedirs(OUTPUT_DIR, exist_ok=True)
+        filename = output_filename("yue_hq", genre, mood)
+        job.update(audio_filename=filename, sample_rate=SAMPLE_RATE, cache_key=None)
+
+        # Only seeded requests are deterministic, so only those are cached
+        cache = get_generation_cache() if seed is not None and GENERATION_CACHE_ENABLED else None
+        audio_tokens = None
+        if cache is not None:
+            # Keyed on the full prompt, so a change of the prompt layout misses the cache
+            stage1_key = cache_key(
+                pipeline="huggingface", model=MODEL_STAGE1_ID,
+                prompt=stage1_prompt(prompt_header(genre, mood), lyrics), seed=seed, frames=frames,
+                sampling=STAGE1_SAMPLING, constrained=STAGE1_CONSTRAINED_DECODING, loops=loop_settings()
+            )
+            job["cache_key"] = cache_key(
+                stage1=stage1_key, decoder=MODEL_STAGE2_ID, sample_rate=SAMPLE_RATE, duration=duration,
+                fallback_decoder="xcodec2" if USE_REAL_XCODEC else None
+            )
+            if cache.fetch_audio(job["cache_key"], os.path.join(OUTPUT_DIR, filename)):
+                logger.info(f"=== Pipeline Complete (cached): {filename} ===")
+                job["result"] = filename
+                return job
+            cached_tokens = cache.load_stage1(stage1_key)
+            if cached_tokens is not None:
+                audio_tokens = torch.from_numpy(cached_tokens).to(self.device)
 
         # Stage 1: Generate audio tokens
-        logger.info("[1/3] Stage 1: Generating audio tokens...")
-        audio_tokens = self.generate_audio_tokens(lyrics, genre, mood)
-
+        progressive = None
         if audio_tokens is None:
-            logger.error("Stage 1 failed")
-            return None
+            logger.info("[1/3] Stage 1: Generating audio tokens...")
+            notify("stage1", 0.1, tokens_generated=0)
+            if USE_REAL_XCODEC and PROGRESSIVE_AUDIO_ENABLED:
+                # XCodec preview fragments while Stage 1 runs; Stage 2 still makes the final audio
+                progressive = ProgressiveAudio(
+                    lambda urls, seconds: notify(None, None, fragments=urls, audio_seconds=round(seconds, 2)),
+                    SAMPLE_RATE
+                )
+            with span("stage1.generate", pipeline="huggingface", frames=frames):
+                audio_tokens = self.generate_audio_tokens(
+                    lyrics, genre, mood, job["progress_callback"], seed, duration,
+                    on_codes=progressive.feed if progressive is not None else None
+                )
 
-        # Save text representation for debugging
-        try:
-            txt_path = os.path.join(OUTPUT_DIR, "last_generation_tokens.txt")
-            token_text = self.stage1_tokenizer.decode(audio_tokens[0], skip_special_tokens=False)
-            with open(txt_path, "w", encoding="utf-8") as f:
-                f.write(token_text)
-            logger.info(f"Token text saved to {txt_path}")
-        except Exception as e:
-            logger.warning(f"Could not save token text: {e}")
+            if audio_tokens is None:
+                logger.error("Stage 1 failed")
+                if progressive is not None:
+                    progressive.finish()
+                job["result"] = None
+                return job
+
+            if cache is not None:
+                cache.store_stage1(stage1_key, audio_tokens.cpu().numpy())
+            if SAVE_STAGE1_TEXT:
+                self._save_token_text(audio_tokens)
+        else:
+            logger.info("[1/3] Stage 1: Reusing cached audio tokens")
+            notify("stage1", 0.7, tokens_generated=int(audio_tokens.shape[1]))
 
-        # Unload Stage 1 to free VRAM
-        self.unload_stage1()
+        # Codec codes straight from the token ids, no detokenization; trimmed to the
+        # requested length before decoding so no audio is decoded only to be cut
+        codes = codes_from_ids(audio_tokens, self._codec_lookup())[:frames]
+        log_token_stats(codes)
+
+        # Stage 1 stays resident for the next job; the model manager evicts
+        # it only if Stage 2 does not fit in the memory budget
+        job.update(audio_tokens=audio_tokens, codes=codes, progressive=progressive)
+        return job
+
+    def _stage_decode(self, job: dict) -> dict:
+        """Pipeline stage: Stage 2 decode, with XCodec and placeholder fallbacks"""
+        codes, duration, progressive = job["codes"], job["duration"], job["progressive"]
 
         # Stage 2: Decode to audio
         logger.info("[2/3] Stage 2: Decoding tokens to audio...")
-        audio_waveform = self.decode_to_audio(audio_tokens)
+        job["notify"]("decoding", 0.75)
+        with span("stage2.decode"):
+            audio_waveform = self.decode_to_audio(job.pop("audio_tokens"))
+        # Wait for the preview decoder either way, so its thread never outlives the job
+        if progressive is not None:
+            progressive.finish()
+
+        if audio_waveform is None and USE_REAL_XCODEC and len(codes) > 0:
+            logger.warning("Stage 2 produced no audio, decoding Stage 1 codes with XCodec")
+            if progressive is not None:
+                audio_waveform = progressive.song(codes, duration)
+            if audio_waveform is None:
+                audio_waveform = decode_codes_real(codes, SAMPLE_RATE, duration)
 
         if audio_waveform is None:
             logger.error("Stage 2 failed - audio decoding not successful")
+            # The placeholder is never cached
+            job["cache_key"] = None
             # Generate placeholder for now
             logger.warning("Generating placeholder audio for testing")
-            audio_waveform = self._generate_placeholder_audio(30.0)
+            audio_waveform = self._generate_placeholder_audio(duration)
 
-        # Unload Stage 2
-        self.unload_stage2()
+        job["audio_waveform"] = audio_waveform
+        return job
 
-        # Stage 3: Save to file
-        logger.info("[3/3] Saving audio file...")
-        filename = self._save_audio(audio_waveform, genre, mood)
-
-        if filename:
-            logger.info(f"=== Pipeline Complete: {filename} ===")
-        else:
-            logger.error("=== Pipeline Failed ===")
+    def _stage_postprocess(self, job: dict) -> dict:
+        """Pipeline stage: peak normalization and 16-bit PCM conversion"""
+        job["notify"]("saving", 0.95)
+        job["audio_int16"] = self._to_pcm16(job.pop("audio_waveform"))
+        return job
 
-        return filename
+    def _save_token_text(self, audio_tokens: torch.Tensor):
+        """Save text representation for debugging"""
+        try:
+            txt_path = os.path.join(OUTPUT_DIR, "last_generation_tokens.txt")
+            with self.models.use("stage1") as (_, tokenizer):
+                token_text = tokenizer.decode(audio_tokens[0], skip_special_tokens=False)
+            with open(txt_path, "w", encoding="utf-8") as f:
+                f.write(token_text)
+            logger.info(f"Token text saved to {txt_path}")
+        except Exception as e:
+            logger.warning(f"Could not save token text: {e}")
 
     def _generate_placeholder_audio(self, duration: float = 30.0) -> np.ndarray:
         """Generate placeholder audio for testing (melodic tone)"""
@@ -257,45 +792,53 @@ class YuEPipeline:
 
         return audio
 
-    def _save_audio(self, audio_data: np.ndarray, genre: str, mood: str) -> Optional[str]:
-        """Save audio to file"""
-        try:
-            # Sanitize filename
-            safe_genre = "".join(c for c in genre if c.isalnum() or c in (' ', '-', '_'))[:20]
-            safe_mood = "".join(c for c in mood if c.isalnum() or c in (' ', '-', '_'))[:20]
-
-            filename = f"yue_hq_{safe_genre}_{safe_mood}.wav".replace(" ", "_")
-            filepath = os.path.join(OUTPUT_DIR, filename)
+    @staticmethod
+    def _to_pcm16(audio_data: np.ndarray) -> np.ndarray:
+        # Normalize to prevent clipping
+        if audio_data.max() > 0:
+            audio_data = audio_data / np.abs(audio_data).max() * 0.95
 
-            # Normalize to prevent clipping
-            if audio_data.max() > 0:
-                audio_data = audio_data / np.abs(audio_data).max() * 0.95
-
-            # Convert to 16-bit PCM
-            audio_int16 = np.int16(audio_data * 32767)
-
-            # Save
-            scipy.io.wavfile.write(filepath, 44100, audio_int16)
-
-            logger.info(f"Audio saved: {filename}")
-            return filename
-
-        except Exception as e:
-            logger.error(f"Failed to save audio: {e}", exc_info=True)
-            return None
+        # Convert to 16-bit PCM
+        return np.int16(audio_data * 32767)
 
 
 # Global pipeline instance for reuse
 _pipeline = None
 
-def run_pipeline_hq(lyrics: str, genre: str, mood: str) -> Optional[str]:
-    """
-    High-quality pipeline entry point
-    Returns: filename (not full path)
-    """
+def _get_pipeline() -> YuEPipeline:
     global _pipeline
 
     if _pipeline is None:
         _pipeline = YuEPipeline()
+    return _pipeline
+
 
-    return _pipeline.run_pipeline(lyrics, genre, mood)
+def warm_up_hq(dummy_job: bool = False, stage2: bool = False) -> bool:
+    """
+    Make Stage 1 and XCodec resident before the first job. dummy_job also runs
+    a short Stage 1 generation, and stage2 then decodes its output with Stage 2
+    Returns False if a model failed to load
+    """
+    pipeline = _get_pipeline()
+    ok = pipeline.load_stage1()
+    if USE_REAL_XCODEC:
+        model, _ = load_xcodec_model()
+        ok = ok and model is not None
+    if ok and dummy_job:
+        with span("warmup.stage1", pipeline="huggingface"):
+            tokens = pipeline.generate_audio_tokens("la la la", "pop", "warm-up", duration=WARMUP_DURATION_SECONDS)
+        if tokens is not None and stage2:
+            with span("warmup.stage2"):
+                pipeline.decode_to_audio(tokens)
+    return ok
+
+
+def run_pipeline_hq(lyrics: str, genre: str, mood: str,
+                    progress_callback: Optional[Callable] = None,
+                    seed: Optional[int] = None,
+                    duration: Optional[float] = None) -> Optional[str]:
+    """
+    High-quality pipeline entry point
+    Returns: filename (not full path)
+    """
+    return _get_pipeline().run_pipeline(lyrics, genre, mood, progress_callback, seed, duration)
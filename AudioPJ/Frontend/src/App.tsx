@@ -1,7 +1,7 @@
 import { useState, useEffect } from 'react';
 import { GenerationForm } from './components/GenerationForm';
 import { TaskMonitor } from './components/TaskMonitor';
-import { generateMusic, getTaskStatus } from './api';
+import { generateMusic, subscribeTaskStatus } from './api';
 import type { GenerationRequest, TaskStatusResponse } from './api';
 import { Disc3 } from 'lucide-react';
 
@@ -26,20 +26,8 @@ function App() {
   useEffect(() => {
     if (!currentTaskId) return;
 
-    const pollInterval = setInterval(async () => {
-      try {
-        const status = await getTaskStatus(currentTaskId);
-        setTaskStatus(status);
-
-        if (status.status === 'completed' || status.status === 'failed') {
-          clearInterval(pollInterval);
-        }
-      } catch (error) {
-        console.error('Failed to poll status:', error);
-      }
-    }, 1000);
-
-    return () => clearInterval(pollInterval);
+    // Updates are pushed by the server instead of polled every second
+    return subscribeTaskStatus(currentTaskId, setTaskStatus);
   }, [currentTaskId]);
 
   return (
@@ -8,6 +8,9 @@ export interface GenerationRequest {
     lyrics?: string;
     reference_audio_path?: string;
     seed?: number;
+    duration?: number;
+    priority?: 'high' | 'normal' | 'low';
+    client_id?: string;
 }
 
 export interface GenerationResponse {
@@ -24,6 +27,23 @@ export interface TaskStatusResponse {
     stems_url?: Record<string, string>;
     error?: string;
     message?: string;
+    queue_position?: number;
+    eta_seconds?: number;
+    stage?: string;
+    tokens_generated?: number;
+    // Progressive audio: fragment URLs in playback order and the seconds they cover
+    fragments?: string[];
+    audio_seconds?: number;
+    // Tracing: the job's trace ID and time per span name
+    trace_id?: string;
+    trace?: TraceSummary;
+}
+
+export interface TraceSummary {
+    trace_id: string;
+    // null while the job is still running
+    duration_ms: number | null;
+    spans: { name: string; duration_ms: number; count: number }[];
 }
 
 export const generateMusic = async (request: GenerationRequest): Promise<GenerationResponse> => {
@@ -35,3 +55,73 @@ export const getTaskStatus = async (taskId: string): Promise<TaskStatusResponse>
     const response = await axios.get(`${API_URL}/status/${taskId}`);
     return response.data;
 };
+
+const isFinished = (status: TaskStatusResponse) =>
+    status.status === 'completed' || status.status === 'failed';
+
+/**
+ * Long-poll fallback: the server holds the request until the task changes
+ * (ETag / If-None-Match) instead of answering "still processing" every second.
+ */
+const longPollTaskStatus = (taskId: string, onUpdate: (status: TaskStatusResponse) => void) => {
+    let stopped = false;
+    let etag: string | undefined;
+
+    const loop = async () => {
+        while (!stopped) {
+            try {
+                const response = await axios.get(`${API_URL}/status/${taskId}`, {
+                    params: { wait: 25 },
+                    headers: etag ? { 'If-None-Match': etag } : {},
+                    validateStatus: (code) => code === 200 || code === 304,
+                });
+                etag = response.headers['etag'] ?? etag;
+                if (response.status === 200) {
+                    onUpdate(response.data);
+                    if (isFinished(response.data)) return;
+                }
+            } catch (error) {
+                console.error('Failed to poll status:', error);
+                await new Promise((resolve) => setTimeout(resolve, 2000));
+            }
+        }
+    };
+    loop();
+
+    return () => { stopped = true; };
+};
+
+/**
+ * Subscribe to task updates pushed over Server-Sent Events, falling back to
+ * long-polling when the stream cannot be opened. Returns an unsubscribe function.
+ */
+export const subscribeTaskStatus = (taskId: string, onUpdate: (status: TaskStatusResponse) => void) => {
+    if (typeof EventSource === 'undefined') {
+        return longPollTaskStatus(taskId, onUpdate);
+    }
+
+    let stopFallback: (() => void) | null = null;
+    let receivedAny = false;
+    const source = new EventSource(`${API_URL}/events/${taskId}`);
+
+    source.addEventListener('status', (event) => {
+        receivedAny = true;
+        const status: TaskStatusResponse = JSON.parse((event as MessageEvent).data);
+        onUpdate(status);
+        if (isFinished(status)) source.close();
+    });
+
+    source.onerror = () => {
+        // A stream that delivered events reconnects by itself; one that never
+        // opened (proxy, old browser) switches to long-polling
+        if (!receivedAny) {
+            source.close();
+            stopFallback = longPollTaskStatus(taskId, onUpdate);
+        }
+    };
+
+    return () => {
+        source.close();
+        stopFallback?.();
+    };
+};
@@ -1,6 +1,6 @@
 import React, { useState } from 'react';
 import type { GenerationRequest } from '../api';
-import { Music, Mic, FileAudio, Sparkles } from 'lucide-react';
+import { Music, Mic, FileAudio, Sparkles, Clock } from 'lucide-react';
 
 interface Props {
     onSubmit: (data: GenerationRequest) => void;
@@ -11,10 +11,11 @@ export const GenerationForm: React.FC<Props> = ({ onSubmit, isLoading }) => {
     const [prompt, setPrompt] = useState('');
     const [genre, setGenre] = useState('');
     const [lyrics, setLyrics] = useState('');
+    const [duration, setDuration] = useState(30);
 
     const handleSubmit = (e: React.FormEvent) => {
         e.preventDefault();
-        onSubmit({ prompt, genre, lyrics: lyrics || undefined });
+        onSubmit({ prompt, genre, lyrics: lyrics || undefined, duration });
     };
 
     return (
@@ -68,6 +69,22 @@ export const GenerationForm: React.FC<Props> = ({ onSubmit, isLoading }) => {
                     />
                 </div>
 
+                <div>
+                    <label className="block text-sm font-medium text-gray-400 mb-2 flex items-center gap-2">
+                        <Clock className="w-4 h-4" /> Duration (seconds)
+                    </label>
+                    <input
+                        type="number"
+                        min={5}
+                        max={300}
+                        step={5}
+                        value={duration}
+                        onChange={(e) => setDuration(Number(e.target.value))}
+                        className="w-full bg-black/50 border border-white/10 rounded-lg px-4 py-3 focus:ring-2 focus:ring-primary focus:border-transparent outline-none transition-all"
+                        required
+                    />
+                </div>
+
                 <button
                     type="submit"
                     disabled={isLoading}
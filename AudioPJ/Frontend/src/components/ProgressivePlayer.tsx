@@ -0,0 +1,78 @@
+import React, { useEffect, useRef, useState } from 'react';
+import { Play, Radio } from 'lucide-react';
+
+interface Props {
+    fragments: string[];
+    audioSeconds?: number;
+}
+
+/**
+ * Plays the audio fragments published while the song is still generating.
+ * Fragments are decoded with the Web Audio API and scheduled back to back,
+ * so playback is gapless and new fragments join the queue as they arrive.
+ */
+export const ProgressivePlayer: React.FC<Props> = ({ fragments, audioSeconds }) => {
+    const [playing, setPlaying] = useState(false);
+    const contextRef = useRef<AudioContext | null>(null);
+    const scheduledRef = useRef(0);
+    const nextStartRef = useRef(0);
+    const chainRef = useRef<Promise<void>>(Promise.resolve());
+
+    useEffect(() => {
+        const context = contextRef.current;
+        if (!playing || !context) return;
+
+        // Fetch and decode in order: each fragment starts where the previous one ends
+        const pending = fragments.slice(scheduledRef.current);
+        scheduledRef.current = fragments.length;
+        for (const url of pending) {
+            chainRef.current = chainRef.current.then(async () => {
+                try {
+                    const response = await fetch(url);
+                    const buffer = await context.decodeAudioData(await response.arrayBuffer());
+                    const source = context.createBufferSource();
+                    source.buffer = buffer;
+                    source.connect(context.destination);
+                    const start = Math.max(nextStartRef.current, context.currentTime + 0.05);
+                    source.start(start);
+                    nextStartRef.current = start + buffer.duration;
+                } catch (error) {
+                    console.error('Failed to play audio fragment:', error);
+                }
+            });
+        }
+    }, [fragments, playing]);
+
+    useEffect(() => () => { contextRef.current?.close(); }, []);
+
+    const start = () => {
+        // Browsers only allow audio to start from a user gesture
+        contextRef.current = new AudioContext();
+        setPlaying(true);
+    };
+
+    return (
+        <div className="bg-black/30 p-4 rounded-xl border border-white/5 flex items-center justify-between mb-6">
+            <div className="flex items-center gap-3">
+                <div className="w-10 h-10 rounded-full bg-primary/20 flex items-center justify-center">
+                    <Radio className="w-5 h-5 text-primary" />
+                </div>
+                <div className="text-left">
+                    <p className="font-medium text-white">Live Preview</p>
+                    <p className="text-xs text-gray-400">
+                        {audioSeconds !== undefined ? `${audioSeconds.toFixed(0)}s generated so far` : 'Generating...'}
+                    </p>
+                </div>
+            </div>
+            {!playing && (
+                <button
+                    onClick={start}
+                    className="flex items-center gap-2 px-4 py-2 rounded-lg bg-primary/20 text-primary hover:bg-primary/30 transition-colors text-sm"
+                >
+                    <Play className="w-4 h-4" />
+                    Listen
+                </button>
+            )}
+        </div>
+    );
+};
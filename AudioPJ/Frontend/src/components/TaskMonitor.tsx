@@ -1,6 +1,7 @@
 import React from 'react';
 import type { TaskStatusResponse } from '../api';
 import { Loader2, CheckCircle2, AlertCircle, Music } from 'lucide-react';
+import { ProgressivePlayer } from './ProgressivePlayer';
 
 interface Props {
     task: TaskStatusResponse;
@@ -31,6 +32,12 @@ export const TaskMonitor: React.FC<Props> = ({ task }) => {
                     <div className="text-left">
                         <h3 className="text-lg font-semibold text-white">Generation Status</h3>
                         <p className={`text-sm ${getStatusColor()} capitalize`}>{task.status}</p>
+                        {task.status === 'queued' && task.queue_position !== undefined && (
+                            <p className="text-xs text-gray-400">
+                                Position in queue: {task.queue_position + 1}
+                                {task.eta_seconds !== undefined && ` • ETA ~${Math.ceil(task.eta_seconds / 60)} min`}
+                            </p>
+                        )}
                     </div>
                 </div>
                 <span className="text-2xl font-bold text-white/20">
@@ -45,6 +52,10 @@ export const TaskMonitor: React.FC<Props> = ({ task }) => {
                 />
             </div>
 
+            {task.status === 'processing' && task.fragments && task.fragments.length > 0 && (
+                <ProgressivePlayer fragments={task.fragments} audioSeconds={task.audio_seconds} />
+            )}
+
             {task.status === 'completed' && task.result_url && (
                 <div className="animate-in fade-in slide-in-from-bottom-4 duration-500">
                     <div className="bg-black/30 p-4 rounded-xl border border-white/5 flex items-center justify-between">